@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+RAG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "rag")
+sys.path.insert(0, os.path.join(RAG_DIR, "wikipedia"))
+
+from aspect_extractor import ASPECT_PATTERNS, AspectExtractor
+
+
+def legacy_extract_info(patterns, content, aspect):
+    """ChromaInspector.extract_info before the AspectExtractor, verbatim"""
+    info = set()  # Use set to avoid duplicates from the start
+    aspect_patterns = patterns[aspect]['patterns']
+
+    # Try each pattern
+    for pattern in aspect_patterns:
+        matches = re.finditer(pattern, content, re.IGNORECASE)
+        for match in matches:
+            info.add(match.group(1).strip())
+
+    # Find relevant sentences containing keywords
+    keywords = patterns[aspect]['keywords']
+    sentences = [s.strip() for s in content.split('.') if s.strip()]
+    for sentence in sentences:
+        if any(keyword.lower() in sentence.lower() for keyword in keywords):
+            # Don't add full metadata block or repetitive content
+            if not (sentence.startswith('Title:') or
+                sentence.startswith('Chinese Name:') or
+                'pinyin:' in sentence):
+                # Extract just the relevant part if it's a long sentence
+                for keyword in keywords:
+                    if keyword.lower() in sentence.lower():
+                        # Find the relevant clause containing the keyword
+                        clauses = sentence.split(',')
+                        relevant_clauses = [c.strip() for c in clauses
+                                        if keyword.lower() in c.lower()]
+                        if relevant_clauses:
+                            info.add(relevant_clauses[0])
+
+    return list(info)
+
+def run_legacy(documents):
+    return [{aspect: legacy_extract_info(ASPECT_PATTERNS, content, aspect) for aspect in ASPECT_PATTERNS}
+            for content in documents]
+
+def run_extractor(extractor, documents):
+    return [extractor.extract_all(content) for content in documents]
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Time aspect extraction over a recipe dump and check parity")
+    parser.add_argument("--dump", default=os.path.join(RAG_DIR, "wikipedia", "recipe_db_dump.json"))
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.dump, "r", encoding="utf-8") as f:
+        documents = [entry["content"] for entry in json.load(f)]
+
+    extractor = AspectExtractor()
+    legacy_s, legacy = best_of(lambda: run_legacy(documents), args.repeat)
+    new_s, new = best_of(lambda: run_extractor(extractor, documents), args.repeat)
+
+    mismatches = [(i, aspect) for i, (old, cur) in enumerate(zip(legacy, new))
+                  for aspect in ASPECT_PATTERNS if old[aspect] != cur[aspect]]
+    print(f"{len(documents)} documents x {len(ASPECT_PATTERNS)} aspects")
+    print(f"  extract_info per aspect: {legacy_s * 1000:8.2f} ms ({len(documents) / legacy_s:8.0f} docs/sec)")
+    print(f"  AspectExtractor:         {new_s * 1000:8.2f} ms ({len(documents) / new_s:8.0f} docs/sec)")
+    print(f"  speedup:                 {legacy_s / new_s:8.1f}x")
+    print(f"  identical output:        {not mismatches}")
+    for i, aspect in mismatches[:10]:
+        print(f"    mismatch in document {i}, aspect {aspect}")
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+RAG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "rag")
+sys.path.insert(0, os.path.join(RAG_DIR, "baidu"))
+sys.path.insert(0, os.path.join(RAG_DIR, "wikipedia"))
+
+import inspect_db
+import recipe_db
+import sivqa_utils
+
+
+def legacy_get_recipe_db(persist_dir="./recipe_db", collection_name=recipe_db.DEFAULT_COLLECTION):
+    """Old behaviour: a brand new client and embedding function per inspector"""
+    return recipe_db.LocalRecipeDB(persist_dir, collection_name)
+
+def build_prompts(questions, template, lang="zh"):
+    """Build the text prompt for every question and return questions/sec"""
+    start = time.perf_counter()
+    # get_dish_entries prints every match, keep that out of the timing
+    with contextlib.redirect_stdout(io.StringIO()):
+        for question in questions:
+            q, _, choices_str = sivqa_utils.format_question(question, lang=lang)
+            sivqa_utils.format_text_prompt(q, choices_str, template=template, lang=lang,
+                                           food_name=question["food_name"])
+    elapsed = time.perf_counter() - start
+    return len(questions) / elapsed if elapsed > 0 else float("inf")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_dir", default="data_folder")
+    parser.add_argument("--eval_file", default="sivqa_tidy.json")
+    parser.add_argument("--template", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=200,
+                        help="Number of questions to time (0 for all)")
+    args = parser.parse_args()
+
+    questions = sivqa_utils.read_sivqa(args.data_dir, args.eval_file)
+    if args.limit:
+        questions = questions[:args.limit]
+
+    inspect_db.get_recipe_db = legacy_get_recipe_db
+    before = build_prompts(questions, args.template)
+
+    inspect_db.get_recipe_db = recipe_db.get_recipe_db
+    recipe_db.close_all_recipe_dbs()
+    after = build_prompts(questions, args.template)
+
+    print(f"Template {args.template}, {len(questions)} questions")
+    print(f"  per-question LocalRecipeDB: {before:10.1f} questions/sec")
+    print(f"  shared registry handle:     {after:10.1f} questions/sec")
+    print(f"  speedup:                    {after / before:10.1f}x")
+
+if __name__ == "__main__":
+    main()
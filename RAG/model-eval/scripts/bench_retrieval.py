@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import psutil
+from chromadb.utils import embedding_functions
+
+RAG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "rag")
+sys.path.insert(0, RAG_DIR)
+sys.path.insert(0, os.path.join(RAG_DIR, "wikipedia"))
+
+import recipe_db
+from context_retriever import RecipeContextRetriever
+from embedding_cache import CachedEmbeddingFunction
+
+METHODS = ["dense", "hybrid", "chunks"]
+CACHES = {
+    "off": {"query_cache_size": 0, "result_cache_size": 0},
+    "on": {"query_cache_size": 4096, "result_cache_size": 4096}
+}
+
+
+def rss_mb():
+    """Resident memory of this process"""
+    return psutil.Process().memory_info().rss / 2 ** 20
+
+def disk_mb(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names) / 2 ** 20
+
+def dish_names(metadata):
+    """Normalized names a stored entry answers to: dish name, English name, aliases"""
+    metadata = metadata or {}
+    names = {metadata.get("dish_name", ""), metadata.get("english_name", "")}
+    names.update((metadata.get("aliases") or "").split(","))
+    return {name.strip().lower() for name in names if name and name.strip()}
+
+def load_corpus(dumps):
+    """Entries of recipe_db_dump.json style files as add_recipes input"""
+    recipes = []
+    for path in dumps:
+        with open(path, "r", encoding="utf-8") as f:
+            for entry in json.load(f):
+                metadata = dict(entry["metadata"])
+                recipes.append({
+                    "content": entry["content"],
+                    "metadata": metadata,
+                    "source": metadata.pop("source", "wikipedia")
+                })
+    return recipes
+
+def rank_of_dish(results, food_name):
+    """1-based rank of the first result about the question's dish, or 0"""
+    target = food_name.strip().lower()
+    for rank, result in enumerate(results, 1):
+        if target in dish_names(result["metadata"]):
+            return rank
+    return 0
+
+def quality(ranks, ks):
+    ranks = np.array(ranks)
+    found = ranks > 0
+    metrics = {f"recall@{k}": float(np.mean(found & (ranks <= k))) if len(ranks) else 0.0 for k in ks}
+    metrics["mrr"] = float(np.mean(np.where(found, 1.0 / np.maximum(ranks, 1), 0.0))) if len(ranks) else 0.0
+    return metrics
+
+def search_fn(db, method, k):
+    if method == "dense":
+        return lambda query: db.search_recipes(query, n_results=k)
+    if method == "chunks":
+        return lambda query: db.search_chunks(query, n_results=k)
+    return lambda query: db.search(query, n_results=k)
+
+def run_queries(search, queries):
+    """Results and latency in ms of each query, one after another"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.array(latencies)
+
+def throughput(make_search, queries, concurrency):
+    """Queries/sec with `concurrency` threads sharing one fresh handle"""
+    search = make_search()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(search, queries))
+    return len(queries) / (time.perf_counter() - start)
+
+def run_backend(backend, args):
+    """Build the corpus into one backend and measure every method and cache setting"""
+    recipes = load_corpus(args.dumps)
+    known = set().union(*(dish_names(r["metadata"]) for r in recipes)) if recipes else set()
+    questions = read_questions(args)
+    # The queries FoodieQARAG sends: dish name plus question-type terms
+    retriever = RecipeContextRetriever(None)
+    queries = [retriever.search_query(q) for q in questions]
+    max_k = max(args.ks)
+
+    path = os.path.join(args.work_dir, backend)
+    shutil.rmtree(path, ignore_errors=True)
+    base_fn = embedding_functions.DefaultEmbeddingFunction()
+    client = recipe_db.make_client(path, backend)
+    # Load the embedding model before measuring memory
+    base_fn(["warm up"])
+
+    rss_before = rss_mb()
+    db = recipe_db.LocalRecipeDB(path, client=client, backend=backend,
+                                 embedding_fn=CachedEmbeddingFunction(base_fn, os.path.join(path, "embedding_cache")),
+                                 chunk_chars=recipe_db.DEFAULT_CHUNK_CHARS)
+    stats = db.add_recipes(recipes, verbose=False)
+    start = time.perf_counter()
+    db.lexical_index
+    db.chunk_db.lexical_index
+    lexical_s = time.perf_counter() - start
+    build = {
+        "documents": db.collection.count(),
+        "chunks": db.chunk_db.collection.count(),
+        "build_s": stats["seconds"],
+        "docs_per_sec": stats["docs_per_sec"],
+        "lexical_build_s": lexical_s,
+        "rss_mb": rss_mb() - rss_before,
+        "disk_mb": disk_mb(path)
+    }
+
+    configs = []
+    for caches, cache_sizes in CACHES.items():
+        embedding_fn = base_fn if caches == "off" else db.embedding_fn
+
+        def make_db():
+            handle = recipe_db.LocalRecipeDB(path, client=client, backend=backend,
+                                             embedding_fn=embedding_fn, **cache_sizes)
+            # Share the already built BM25 index, its build time is reported once
+            handle._lexical_index = db.lexical_index
+            handle._lexical_checked_at = time.monotonic()
+            handle.chunk_db._lexical_index = db.chunk_db.lexical_index
+            handle.chunk_db._lexical_checked_at = time.monotonic()
+            return handle
+
+        for method in args.methods:
+            handle = make_db()
+            results, latencies = run_queries(search_fn(handle, method, max_k), queries)
+            ranks = [rank_of_dish(r, q["food_name"]) for r, q in zip(results, questions)]
+            answerable = [rank for rank, q in zip(ranks, questions) if q["food_name"].strip().lower() in known]
+            config = {
+                "backend": backend,
+                "method": method,
+                "caches": caches,
+                **quality(answerable, args.ks),
+                "latency_ms": {
+                    "mean": float(latencies.mean()),
+                    "p50": float(np.percentile(latencies, 50)),
+                    "p95": float(np.percentile(latencies, 95)),
+                    "p99": float(np.percentile(latencies, 99))
+                },
+                "throughput_qps": {
+                    str(c): throughput(lambda: search_fn(make_db(), method, max_k), queries, c)
+                    for c in args.concurrency
+                },
+                "cache_stats": handle.cache_stats() if caches == "on" else {}
+            }
+            configs.append(config)
+    return {"build": build, "configs": configs}
+
+def read_questions(args):
+    """sivqa questions, or the first --limit of them"""
+    with open(os.path.join(args.data_dir, args.eval_file), "r", encoding="utf-8") as f:
+        questions = json.load(f)
+    return questions[:args.limit] if args.limit else questions
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def print_comparison(report, baseline_path):
+    """Change of each config's quality and latency against an earlier report"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(c["backend"], c["method"], c["caches"]): c for c in baseline["configs"]}
+    print(f"\nAgainst {baseline_path} (commit {baseline.get('commit')}):")
+    for config in report["configs"]:
+        old = previous.get((config["backend"], config["method"], config["caches"]))
+        if old is None:
+            continue
+        print(f"  {config['backend']:>8} {config['method']:>7} caches {config['caches']:>3}: "
+              f"mrr {config['mrr'] - old['mrr']:+.3f}  "
+              f"p95 {config['latency_ms']['p95'] - old['latency_ms']['p95']:+.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recall, MRR, latency and throughput of dish retrieval on sivqa, per backend and config")
+    parser.add_argument("--data_dir", default="data_folder")
+    parser.add_argument("--eval_file", default="sivqa_tidy.json")
+    parser.add_argument("--dumps", nargs="+", default=[os.path.join(RAG_DIR, "wikipedia", "recipe_db_dump.json")],
+                        help="Recipe dumps (inspect_db.py export) to build the index from")
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy", "numpy16"],
+                        choices=sorted(recipe_db.BACKENDS))
+    parser.add_argument("--methods", nargs="+", default=METHODS, choices=METHODS)
+    parser.add_argument("--ks", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--limit", type=int, default=0, help="Number of questions (0 for all)")
+    parser.add_argument("--work_dir", default=None, help="Where to build the indexes (a temp dir by default)")
+    parser.add_argument("--output", default=os.path.join("output", "retrieval_benchmark.json"))
+    parser.add_argument("--baseline", default=None, help="Earlier report to compare against")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # One backend per process, so memory is measured in isolation
+        print(json.dumps(run_backend(args.worker, args)))
+        return
+
+    corpus = load_corpus(args.dumps)
+    known = set().union(*(dish_names(r["metadata"]) for r in corpus)) if corpus else set()
+    questions = read_questions(args)
+    answerable = sum(q["food_name"].strip().lower() in known for q in questions)
+    print(f"{len(corpus)} documents, {len(questions)} questions, {answerable} about a dish in the corpus")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_retrieval_")
+    report = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "documents": len(corpus),
+        "questions": len(questions),
+        "answerable": answerable,
+        "ks": args.ks,
+        "builds": {},
+        "configs": []
+    }
+    try:
+        for backend in args.backends:
+            argv = [sys.executable, os.path.abspath(__file__), *sys.argv[1:],
+                    "--work_dir", work_dir, "--worker", backend]
+            out = subprocess.run(argv, capture_output=True, text=True, check=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            report["builds"][backend] = result["build"]
+            report["configs"].extend(result["configs"])
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'backend':>8} {'method':>7} {'caches':>6} {'R@1':>6} {'R@' + str(max(args.ks)):>6} {'MRR':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} " + " ".join(f"{'qps@' + str(c):>9}" for c in args.concurrency))
+    for c in report["configs"]:
+        print(f"{c['backend']:>8} {c['method']:>7} {c['caches']:>6} {c.get('recall@1', 0):>6.3f} "
+              f"{c['recall@' + str(max(args.ks))]:>6.3f} {c['mrr']:>6.3f} "
+              f"{c['latency_ms']['p50']:>8.2f} {c['latency_ms']['p95']:>8.2f} {c['latency_ms']['p99']:>8.2f} "
+              + " ".join(f"{c['throughput_qps'][str(n)]:>9.1f}" for n in args.concurrency))
+    for backend, build in report["builds"].items():
+        print(f"{backend:>8}: built {build['documents']} docs ({build['chunks']} chunks) in {build['build_s']:.2f}s "
+              f"(+{build['lexical_build_s']:.2f}s BM25), {build['rss_mb']:.1f} MB resident, {build['disk_mb']:.1f} MB on disk")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Wrote {args.output}")
+    if args.baseline:
+        print_comparison(report, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RAG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "rag")
+sys.path.insert(0, os.path.join(RAG_DIR, "wikipedia"))
+
+import recipe_db
+
+COLLECTION = "bench_recipes"
+
+
+def make_corpus(n_docs, dim, seed=0):
+    """Random unit vectors; the benchmark passes embeddings directly"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n_docs, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def build(backend, path, vectors, batch_size=5000):
+    """Load the corpus into a fresh collection and return the build time"""
+    client = recipe_db.make_client(path, backend)
+    collection = client.get_or_create_collection(name=COLLECTION)
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch_size):
+        chunk = vectors[i:i + batch_size]
+        collection.add(
+            ids=[f"doc_{j}" for j in range(i, i + len(chunk))],
+            embeddings=chunk.tolist(),
+            documents=[f"document {j}" for j in range(i, i + len(chunk))],
+            metadatas=[{"dish_name": f"dish_{j % 1000}"} for j in range(i, i + len(chunk))]
+        )
+    return time.perf_counter() - start
+
+def cold_start(backend, path, dim):
+    """Seconds from opening the client to the first answered query, in a fresh process"""
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--cold_start", backend, path, str(dim)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return float(out.strip().splitlines()[-1])
+
+def _cold_start_child(backend, path, dim):
+    start = time.perf_counter()
+    client = recipe_db.make_client(path, backend)
+    collection = client.get_or_create_collection(name=COLLECTION)
+    collection.query(query_embeddings=[[0.0] * dim], n_results=1)
+    print(time.perf_counter() - start)
+
+def query_latency(collection, queries, k):
+    """Per-query latency in ms and the returned ids"""
+    latencies, ids = [], []
+    for q in queries:
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[q.tolist()], n_results=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append([int(i.split("_")[1]) for i in result["ids"][0]])
+    return np.array(latencies), ids
+
+def exact_top_k(vectors, queries, k):
+    """Ground truth by brute force in memory"""
+    distances = -2 * queries @ vectors.T + (vectors ** 2).sum(1)[None, :]
+    return np.argsort(distances, axis=1)[:, :k]
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--cold_start":
+        _cold_start_child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+
+    parser = argparse.ArgumentParser(description="Compare the Chroma and NumPy recipe_db backends")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 1000000])
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy", "numpy16"],
+                        choices=sorted(recipe_db.BACKENDS))
+    parser.add_argument("--dim", type=int, default=384,
+                        help="Embedding size (all-MiniLM-L6-v2 is 384)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--work_dir", default=None,
+                        help="Where to build the collections (a temp dir by default)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_backends_")
+    print(f"{'docs':>9} {'backend':>8} {'build s':>9} {'cold s':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall@' + str(args.k):>10}")
+    try:
+        for n_docs in args.sizes:
+            vectors = make_corpus(n_docs, args.dim)
+            queries = make_corpus(args.queries, args.dim, seed=1)
+            truth = exact_top_k(vectors, queries, args.k)
+            for backend in args.backends:
+                path = os.path.join(work_dir, f"{backend}_{n_docs}")
+                shutil.rmtree(path, ignore_errors=True)
+                build_s = build(backend, path, vectors)
+                cold_s = cold_start(backend, path, args.dim)
+                collection = recipe_db.make_client(path, backend).get_or_create_collection(name=COLLECTION)
+                latencies, found = query_latency(collection, queries, args.k)
+                print(f"{n_docs:>9} {backend:>8} {build_s:>9.2f} {cold_s:>8.2f} "
+                      f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f} "
+                      f"{recall(found, truth):>10.3f}")
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class ContextStore:
+    """SQLite sidecar holding pre-computed retrieval context per question.
+
+    Written by materialize_contexts.py ahead of an eval run and read by the
+    RAG templates with a primary-key lookup, so retrieval is off the
+    generation critical path. One file holds one (template, source) pair,
+    recorded in the meta table.
+    """
+
+    def __init__(self, path: str, readonly: bool = True):
+        self.path = path
+        self.readonly = readonly
+        self._local = threading.local()
+        if not readonly:
+            conn = self._connect()
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS contexts (
+                    qid TEXT PRIMARY KEY,
+                    food_name TEXT,
+                    context TEXT NOT NULL
+                );
+            """)
+            conn.commit()
+        elif not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.meta = self._read_meta()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.readonly:
+                uri = "file:" + os.path.abspath(self.path) + "?mode=ro"
+                conn = sqlite3.connect(uri, uri=True)
+            else:
+                conn = sqlite3.connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def _read_meta(self) -> Dict:
+        rows = self._connect().execute("SELECT key, value FROM meta").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    @property
+    def template(self) -> Optional[int]:
+        return self.meta.get("template")
+
+    @property
+    def source(self) -> Optional[str]:
+        return self.meta.get("source")
+
+    def set_meta(self, **meta):
+        conn = self._connect()
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value, ensure_ascii=False)) for key, value in meta.items()]
+        )
+        conn.commit()
+        self.meta.update(meta)
+
+    def put_many(self, rows: Iterable[Tuple[str, str, str]]):
+        """Insert (qid, food_name, context) rows"""
+        conn = self._connect()
+        conn.executemany(
+            "INSERT OR REPLACE INTO contexts (qid, food_name, context) VALUES (?, ?, ?)",
+            rows
+        )
+        conn.commit()
+
+    def get(self, qid: str) -> Optional[str]:
+        """Context for a question id, or None if it was not materialized"""
+        row = self._connect().execute(
+            "SELECT context FROM contexts WHERE qid = ?", (str(qid),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM contexts").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -11,6 +11,7 @@ from transformers import AutoProcessor, AutoModelForVision2Seq
 from transformers.image_utils import load_image
 
 import sivqa_utils
+from context_packer import ContextPacker
 import textqa_utils
 import utils
 import argparse
@@ -42,7 +43,8 @@ class Evaluator(object):
             messages = sivqa_utils.get_prompt_idefics(question, data_dir, 
                                                         show_food_name=args.show_food_name, 
                                                         template=args.template,
-                                                        lang=args.lang)
+                                                        lang=args.lang,
+                                                        oracle_dish=args.oracle_dish)
             print(messages)
             if args.use_web_img and "web_file" in question["food_meta"]:
                 img_file = question["food_meta"]["web_file"]
@@ -71,6 +73,11 @@ def main(args):
     evaluator = Evaluator(args)
     
     model, processor = evaluator._load_model()
+    if args.template == 7:
+        sivqa_utils.set_question_types(args.question_types)
+    if args.context_budget:
+        # Cut RAG template contexts to a fixed number of prompt tokens
+        sivqa_utils.set_context_packer(ContextPacker(processor, max_tokens=args.context_budget))
     
 
     # read_data
@@ -111,6 +118,12 @@ if __name__ == "__main__":
     argparser.add_argument("--template", type=int, default=0)
     argparser.add_argument("--lang", type=str, default="zh")
     argparser.add_argument("--use_web_img", action="store_true", default=False)
+    argparser.add_argument("--oracle_dish", action="store_true", default=False,
+                           help="Give RAG templates 5-7 the gold dish name (oracle retrieval)")
+    argparser.add_argument("--question_types", default="output/question_type_analysis.json",
+                           help="Question type analysis, needed by template 7")
+    argparser.add_argument("--context_budget", type=int, default=None,
+                           help="Maximum tokens of retrieved context in RAG templates")
     
     args = argparser.parse_args()
 
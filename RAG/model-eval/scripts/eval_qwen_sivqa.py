@@ -39,7 +39,8 @@ class Evaluator(object):
                                                     show_food_name=args.show_food_name,
                                                     use_web_img=args.use_web_img, 
                                                     template=args.template,
-                                                    lang=args.lang)
+                                                    lang=args.lang,
+                                                    oracle_dish=args.oracle_dish)
         
         query = processor.from_list_format(query_list)
         inputs = processor(query, return_tensors='pt')
@@ -59,6 +60,8 @@ def main(args):
     evaluator = Evaluator(args)
     
     model, processor = evaluator._load_model()
+    if args.template == 7:
+        sivqa_utils.set_question_types(args.question_types)
     
 
     # read_data
@@ -103,6 +106,10 @@ if __name__ == "__main__":
     argparser.add_argument("--template", type=int, default=0)
     argparser.add_argument("--lang", default="zh")
     argparser.add_argument("--use_web_img", action="store_true", default=False)
+    argparser.add_argument("--oracle_dish", action="store_true", default=False,
+                           help="Give RAG templates 5-7 the gold dish name (oracle retrieval)")
+    argparser.add_argument("--question_types", default="output/question_type_analysis.json",
+                           help="Question type analysis, needed by template 7")
     
     args = argparser.parse_args()
 
@@ -33,7 +33,8 @@ class Evaluator(object):
         messages = sivqa_utils.get_prompt_idefics(question, data_dir, 
                                                     show_food_name=args.show_food_name, 
                                                     template=args.template,
-                                                    lang=args.lang)
+                                                    lang=args.lang,
+                                                    oracle_dish=args.oracle_dish)
         images = [load_image(os.path.join(data_dir, question["food_meta"]["food_file"]))]
         prompt = processor.apply_chat_template(messages, add_generation_prompt=True)
         inputs = processor(text=prompt, images=images, return_tensors="pt")
@@ -57,6 +58,8 @@ def main(args):
     evaluator = Evaluator(args)
     
     model, processor = evaluator._load_model()
+    if args.template == 7:
+        sivqa_utils.set_question_types(args.question_types)
     
 
     # read_data
@@ -98,6 +101,10 @@ if __name__ == "__main__":
     argparser.add_argument("--show_food_name", action="store_true", default=False)
     argparser.add_argument("--template", type=int, default=0)
     argparser.add_argument("--lang", default="zh")
+    argparser.add_argument("--oracle_dish", action="store_true", default=False,
+                           help="Give RAG templates 5-7 the gold dish name (oracle retrieval)")
+    argparser.add_argument("--question_types", default="output/question_type_analysis.json",
+                           help="Question type analysis, needed by template 7")
     
     args = argparser.parse_args()
 
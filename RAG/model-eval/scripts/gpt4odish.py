@@ -8,6 +8,7 @@ import argparse
 import re
 import base64
 import datetime
+from dish_resolver import get_dish_resolver
 
 load_dotenv()
 
@@ -15,6 +16,8 @@ class DishIdentifier:
     def __init__(self, api_key=None):
         self.client = openai.OpenAI(api_key=api_key or os.getenv('OPENAI_API_KEY'))
         self.processed_questions = 0
+        # Maps the free-form names in responses to knowledge base keys
+        self.resolver = get_dish_resolver()
 
     def _extract_dishes(self, response):
         """Extract the three most likely dishes from the response"""
@@ -114,8 +117,11 @@ class DishIdentifier:
             print(f"Model's Response:\n{full_response}")
             
             # Extract the predicted dishes
-            predicted_dishes = self._extract_dishes(full_response)
-            print(f"Extracted Dishes: {predicted_dishes}")
+            extracted_dishes = self._extract_dishes(full_response)
+            predicted_dishes = self.resolver.resolve_all(extracted_dishes)
+            print(f"Extracted Dishes: {extracted_dishes}")
+            if predicted_dishes != extracted_dishes:
+                print(f"Resolved Dishes: {predicted_dishes}")
             print("=====================\n")
 
             self.processed_questions += 1
@@ -124,6 +130,7 @@ class DishIdentifier:
                 "question_id": question["question_id"],
                 "actual_dish": question["food_name"],
                 "predicted_dishes": predicted_dishes,
+                "extracted_dishes": extracted_dishes,
                 "full_response": full_response
             }
 
@@ -171,6 +178,8 @@ def main():
     # Load questions and dishes data
     questions = sivqa_utils.read_sivqa(args.data_dir, args.eval_file)
     all_dishes = load_dishes_data(args.data_dir)
+    # The dishes offered to the model are resolver targets too
+    identifier.resolver.add_aliases({dish: [] for dishes in all_dishes['dishes_by_cuisine'].values() for dish in dishes})
 
     # Process all questions
     results = []
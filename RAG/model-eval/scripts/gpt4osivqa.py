@@ -35,16 +35,13 @@ class GPT4oEvaluator:
         question_id = question["question_id"]
         predicted_dish, full_responses = sivqa_utils.find_dish_info(dish_info, question_id)
 
+        q_type = type_data['question_id_mappings'].get(question_id, "")
         if adapt:
-            q_type = ""
-            question_types = type_data['question_id_mappings']
-            if question_id in question_types:
-                q_type = question_types[question_id]      
             if  q_type == "cuisine_type" or q_type == "cooking-skills" or q_type == "region-2":
                 template = 100
             else:
                 template = 11 
-        prompt = sivqa_utils.format_text_prompt(q, choices_str, template=template, lang="zh", food_name = "", predicted_food_names = predicted_dish, full_response = full_responses)
+        prompt = sivqa_utils.format_text_prompt(q, choices_str, template=template, lang="zh", food_name = "", predicted_food_names = predicted_dish, full_response = full_responses, question_id = question_id, question_type = q_type)
     
         # If prompt is a list (for templates 2-4), join with appropriate formatting
         if isinstance(prompt, list):
@@ -163,11 +160,22 @@ def main():
                        default="",
                        help="OpenAI API key (optional if using env var)")
     
+    parser.add_argument("--context_file",
+                        default=None,
+                        help="Context file written by materialize_contexts.py")
+    parser.add_argument("--dish_info",
+                        default="dish_identification_results.jsonl",
+                        help="Dish predictions in output_dir, from gpt4odish.py or image_dish_retriever.py")
     parser.add_argument("--adapt",
                         default=False,
                         help="Use CoT and RAG")
     args = parser.parse_args()
 
+    # Read RAG contexts materialized by materialize_contexts.py instead of
+    # querying the knowledge bases while evaluating
+    if args.context_file:
+        sivqa_utils.set_context_store(args.context_file)
+
     # Create output directory if it doesn't exist
     os.makedirs(args.output_dir, exist_ok=True)
 
@@ -176,7 +184,7 @@ def main():
 
     # Load questions using the specified eval file
     questions = sivqa_utils.read_sivqa(args.data_dir, args.eval_file)
-    dish_info = sivqa_utils.read_dish_info(args.output_dir, "dish_identification_results.jsonl")
+    dish_info = sivqa_utils.read_dish_info(args.output_dir, args.dish_info)
     type_data = sivqa_utils.read_sivqa(args.output_dir, "question_type_analysis.json")
     # Evaluate all questions
     results = []
@@ -210,6 +218,10 @@ def main():
         "accuracy": accuracy,
         "show_food_name": args.show_food_name
     }
+    if sivqa_utils._federated_retriever is not None:
+        # Which knowledge source is the tail of template 100's retrieval
+        summary["source_latency"] = sivqa_utils._federated_retriever.latency_stats()
+        print(f"Source latency: {json.dumps(summary['source_latency'], indent=2)}")
     
     with open(os.path.join(args.output_dir, f'summary_template{args.template}`_verbose.json'), 'w') as f:
         json.dump(summary, f, indent=2)
@@ -0,0 +1,302 @@
+import argparse
+import json
+import os
+import time
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+from tqdm import tqdm
+from transformers import CLIPModel, CLIPProcessor
+
+import sivqa_utils
+
+DEFAULT_MODEL = "openai/clip-vit-base-patch32"
+EMBEDDINGS_FILE = "embeddings.npy"
+META_FILE = "index.json"
+# Evaluation protocols of "identify", recorded in the report
+LEAVE_ENTRY_OUT = ("leave-entry-out: the food photo and web image of a question's own food_meta "
+                   "entry are excluded from its neighbours")
+INCLUDE_SELF = "include-self: a question's own images may be neighbours (only valid for an index built outside the eval set)"
+
+
+def entry_images(question: Dict) -> List[str]:
+    """Image files of a question's food_meta entry, all labelled with its answer"""
+    meta = question["food_meta"]
+    return [file for file in (meta.get("food_file"), meta.get("web_file")) if file]
+
+def labelled_images(questions: List[Dict], use_web_img: bool = True) -> List[Tuple[str, str]]:
+    """(image file, dish) of every distinct FoodieQA food image, food photos
+    and, with use_web_img, the web images of the same dishes"""
+    images = {}
+    for question in questions:
+        meta = question["food_meta"]
+        dish = meta.get("food_name") or question.get("food_name", "")
+        files = [meta.get("food_file")]
+        if use_web_img:
+            files.append(meta.get("web_file"))
+        for file in files:
+            if file and file not in images:
+                images[file] = dish
+    return list(images.items())
+
+
+class ClipImageEncoder:
+    """L2-normalized CLIP image embeddings, one forward pass per batch"""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, cache_dir: Optional[str] = None, device: str = "cpu"):
+        self.model_name = model_name
+        self.device = device
+        self.processor = CLIPProcessor.from_pretrained(model_name, cache_dir=cache_dir)
+        self.model = CLIPModel.from_pretrained(model_name, cache_dir=cache_dir).to(device).eval()
+        self.dim = self.model.config.projection_dim
+
+    def encode(self, paths: List[str]) -> np.ndarray:
+        images = [Image.open(path).convert("RGB") for path in paths]
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+        with torch.inference_mode():
+            features = self.model.get_image_features(**inputs)
+        features = torch.nn.functional.normalize(features, dim=-1)
+        return features.float().cpu().numpy()
+
+    def encode_batched(self, paths: List[str], batch_size: int = 32) -> Iterable[np.ndarray]:
+        for start in tqdm(range(0, len(paths), batch_size), desc="Encoding images"):
+            yield self.encode(paths[start:start + batch_size])
+
+
+class ImageDishIndex:
+    """CLIP embeddings of labelled food images in a memory-mapped matrix.
+
+    The index directory holds embeddings.npy (one L2-normalized row per
+    image, float16 by default) and index.json (model, image files and their
+    dishes). Rows are written batch by batch into the memmap while building
+    and read back with mmap_mode='r', so only the pages that searches touch
+    are resident.
+    """
+
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.model_name = meta["model"]
+        self.files = meta["files"]
+        self.dish_names = sorted(set(meta["dishes"]))
+        codes = {dish: i for i, dish in enumerate(self.dish_names)}
+        self.dish_codes = np.array([codes[dish] for dish in meta["dishes"]], dtype=np.int64)
+        self.positions = {file: i for i, file in enumerate(self.files)}
+        self.embeddings = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+
+    @staticmethod
+    def build(index_dir: str,
+              images: List[Tuple[str, str]],
+              data_dir: str,
+              encoder: ClipImageEncoder,
+              batch_size: int = 32,
+              dtype: str = "float16") -> Dict:
+        """Embed (file, dish) images into index_dir; returns build stats"""
+        os.makedirs(index_dir, exist_ok=True)
+        present = [(file, dish) for file, dish in images if os.path.exists(os.path.join(data_dir, file))]
+        if len(present) < len(images):
+            print(f"Skipping {len(images) - len(present)} missing images")
+        paths = [os.path.join(data_dir, file) for file, _ in present]
+
+        start = time.perf_counter()
+        embeddings = np.lib.format.open_memmap(os.path.join(index_dir, EMBEDDINGS_FILE), mode="w+",
+                                               dtype=dtype, shape=(len(paths), encoder.dim))
+        row = 0
+        for batch in encoder.encode_batched(paths, batch_size=batch_size):
+            embeddings[row:row + len(batch)] = batch
+            row += len(batch)
+        embeddings.flush()
+        del embeddings
+        seconds = time.perf_counter() - start
+
+        with open(os.path.join(index_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "model": encoder.model_name,
+                "dtype": dtype,
+                "files": [file for file, _ in present],
+                "dishes": [dish for _, dish in present]
+            }, f, ensure_ascii=False)
+        return {
+            "images": len(paths),
+            "dishes": len({dish for _, dish in present}),
+            "build_seconds": seconds,
+            "images_per_sec": len(paths) / seconds if seconds > 0 else 0.0
+        }
+
+    def search(self,
+               queries: np.ndarray,
+               k: int = 3,
+               exclude_files: Optional[List[Collection[str]]] = None,
+               chunk_size: int = 8192) -> List[List[Tuple[str, float]]]:
+        """Top-k (dish, similarity) of each query embedding.
+
+        A dish scores its most similar image. The files in
+        ``exclude_files[i]`` are left out of query i's neighbours, so an
+        image in the index is not identified by its own label.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        similarities = np.empty((len(queries), len(self.files)), dtype=np.float32)
+        for start in range(0, len(self.files), chunk_size):
+            block = np.asarray(self.embeddings[start:start + chunk_size], dtype=np.float32)
+            similarities[:, start:start + len(block)] = queries @ block.T
+        if exclude_files:
+            for i, files in enumerate(exclude_files):
+                for file in files:
+                    if file in self.positions:
+                        similarities[i, self.positions[file]] = -np.inf
+
+        dish_scores = np.full((len(queries), len(self.dish_names)), -np.inf, dtype=np.float32)
+        for i in range(len(queries)):
+            np.maximum.at(dish_scores[i], self.dish_codes, similarities[i])
+        k = min(k, len(self.dish_names))
+        top = np.argpartition(-dish_scores, k - 1, axis=1)[:, :k]
+        results = []
+        for i, row in enumerate(top):
+            row = row[np.argsort(-dish_scores[i, row])]
+            results.append([(self.dish_names[j], float(dish_scores[i, j])) for j in row if np.isfinite(dish_scores[i, j])])
+        return results
+
+
+class ImageDishRetriever:
+    """Local stand-in for DishIdentifier: the dishes of the most similar
+    indexed images instead of a GPT-4o call per question"""
+
+    def __init__(self, index: ImageDishIndex, encoder: ClipImageEncoder, batch_size: int = 32):
+        if index.model_name != encoder.model_name:
+            raise ValueError(f"Index was built with {index.model_name}, encoder is {encoder.model_name}")
+        self.index = index
+        self.encoder = encoder
+        self.batch_size = batch_size
+
+    def identify(self,
+                 questions: List[Dict],
+                 data_dir: str,
+                 k: int = 3,
+                 leave_one_out: bool = True) -> Tuple[List[Dict], Dict]:
+        """dish_identification_results.jsonl rows for the questions, and timings.
+
+        Questions about the same photo share one forward pass. With
+        leave_one_out every image of the question's own food_meta entry
+        (the photo and its web image, both labelled with the answer) is
+        excluded from its neighbours (LEAVE_ENTRY_OUT).
+        """
+        excluded: Dict[str, set] = {}
+        for question in questions:
+            excluded.setdefault(question["food_meta"]["food_file"], set()).update(entry_images(question))
+        files = list(excluded)
+        start = time.perf_counter()
+        embeddings = np.concatenate(list(self.encoder.encode_batched(
+            [os.path.join(data_dir, file) for file in files], batch_size=self.batch_size)))
+        encode_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matches = self.index.search(embeddings, k=k,
+                                    exclude_files=[excluded[file] for file in files] if leave_one_out else None)
+        search_seconds = time.perf_counter() - start
+        by_file = dict(zip(files, matches))
+
+        rows = []
+        for question in questions:
+            dishes = by_file[question["food_meta"]["food_file"]]
+            predicted = [dish for dish, _ in dishes]
+            rows.append({
+                "question_id": question["question_id"],
+                "actual_dish": question["food_name"],
+                "predicted_dishes": predicted,
+                "scores": [round(score, 4) for _, score in dishes],
+                # Same shape as the GPT-4o answer that template 100 puts before its context
+                "full_response": f"The three most likely dishes are: [{', '.join(predicted)}]"
+            })
+        timings = {
+            "images": len(files),
+            "encode_seconds": encode_seconds,
+            "search_seconds": search_seconds,
+            "images_per_sec": len(files) / (encode_seconds + search_seconds) if files else 0.0,
+            "questions_per_sec": len(questions) / (encode_seconds + search_seconds) if files else 0.0
+        }
+        return rows, timings
+
+
+def accuracy(rows: List[Dict], question_ids: Optional[set] = None) -> Dict:
+    """Top-1 and top-3 hit rate of predicted_dishes against actual_dish"""
+    rows = [row for row in rows if question_ids is None or row["question_id"] in question_ids]
+    if not rows:
+        return {"questions": 0, "top1": 0.0, "top3": 0.0}
+    top1 = sum(row["predicted_dishes"][:1] == [row["actual_dish"]] for row in rows)
+    top3 = sum(row["actual_dish"] in row["predicted_dishes"][:3] for row in rows)
+    return {"questions": len(rows), "top1": top1 / len(rows), "top3": top3 / len(rows)}
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Identify the dish in each sivqa image with a local CLIP image index instead of GPT-4o")
+    parser.add_argument("command", choices=["build", "identify"])
+    parser.add_argument("--data_dir", default="data_folder")
+    parser.add_argument("--eval_file", default="sivqa_tidy.json")
+    parser.add_argument("--index_dir", default=os.path.join("output", "clip_image_index"))
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--cache_dir", default=None)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    parser.add_argument("--no_web_img", action="store_true", help="Index only the food photos")
+    parser.add_argument("--include_self", action="store_true",
+                        help="Let a question's own photo and web image match it (only for images outside the eval set)")
+    parser.add_argument("--output", default=os.path.join("output", "dish_identification_results_clip.jsonl"),
+                        help="Drop-in replacement for dish_identification_results.jsonl")
+    parser.add_argument("--gpt4o_results", default=os.path.join("output", "dish_identification_results.jsonl"),
+                        help="GPT-4o dish identification results to compare against")
+    parser.add_argument("--report", default=os.path.join("output", "dish_identification_clip_report.json"))
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    questions = sivqa_utils.read_sivqa(args.data_dir, args.eval_file)
+    encoder = ClipImageEncoder(args.model, cache_dir=args.cache_dir)
+
+    if args.command == "build":
+        stats = ImageDishIndex.build(args.index_dir, labelled_images(questions, use_web_img=not args.no_web_img),
+                                     args.data_dir, encoder, batch_size=args.batch_size)
+        print(f"Indexed {stats['images']} images of {stats['dishes']} dishes in {stats['build_seconds']:.1f}s "
+              f"({stats['images_per_sec']:.1f} images/sec)")
+        return
+
+    retriever = ImageDishRetriever(ImageDishIndex(args.index_dir), encoder, batch_size=args.batch_size)
+    rows, timings = retriever.identify(questions, args.data_dir, leave_one_out=not args.include_self)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    print(f"Wrote {len(rows)} predictions to {args.output}")
+
+    report = {
+        "model": args.model,
+        "device": "cpu",
+        "threads": torch.get_num_threads(),
+        "batch_size": args.batch_size,
+        "protocol": INCLUDE_SELF if args.include_self else LEAVE_ENTRY_OUT,
+        "clip": accuracy(rows),
+        "throughput": timings
+    }
+    if args.gpt4o_results and os.path.exists(args.gpt4o_results):
+        gpt4o_rows = sivqa_utils.read_dish_info(os.path.dirname(args.gpt4o_results),
+                                                os.path.basename(args.gpt4o_results))
+        # Compare on the questions both have answered
+        common = {row["question_id"] for row in rows} & {row["question_id"] for row in gpt4o_rows}
+        report["gpt4o"] = accuracy(gpt4o_rows, common)
+        report["clip_on_common"] = accuracy(rows, common)
+
+    print(f"CLIP top-1 {report['clip']['top1']:.1%}, top-3 {report['clip']['top3']:.1%} "
+          f"on {report['clip']['questions']} questions ({report['protocol'].split(':')[0]})")
+    if "gpt4o" in report:
+        print(f"GPT-4o top-1 {report['gpt4o']['top1']:.1%}, top-3 {report['gpt4o']['top3']:.1%}; "
+              f"CLIP on the same {report['gpt4o']['questions']}: top-1 {report['clip_on_common']['top1']:.1%}, "
+              f"top-3 {report['clip_on_common']['top3']:.1%}")
+    print(f"{timings['images']} images in {timings['encode_seconds'] + timings['search_seconds']:.1f}s on CPU "
+          f"({timings['images_per_sec']:.1f} images/sec, {timings['questions_per_sec']:.1f} questions/sec)")
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Wrote {args.report}")
+
+if __name__ == "__main__":
+    main()
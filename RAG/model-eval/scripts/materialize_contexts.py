@@ -0,0 +1,123 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+from tqdm import tqdm
+
+RAG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "rag")
+sys.path.insert(0, RAG_DIR)
+sys.path.insert(0, os.path.join(RAG_DIR, "baidu"))
+sys.path.insert(0, os.path.join(RAG_DIR, "wikipedia"))
+
+import sivqa_utils
+from context_store import ContextStore
+
+SOURCES = ["wiki", "baidu", "xiachufang"]
+
+
+def question_key(question):
+    """sivqa questions use question_id, mivqa questions use qid"""
+    return question["question_id"] if "question_id" in question else question["qid"]
+
+def sivqa_contexts(questions, template, persist_dir, dish_info=None, question_types=None):
+    """Yield (qid, food_name, context) for the sivqa RAG templates"""
+    question_types = question_types or {}
+    predictions = {}
+    for item in dish_info or []:
+        predictions[item.get("question_id")] = (item.get("predicted_dishes", []), item.get("full_response", ""))
+
+    for question in tqdm(questions):
+        qid = question_key(question)
+        predicted_dishes, full_response = predictions.get(qid, ([], ""))
+        # get_dish_entries prints every match
+        with contextlib.redirect_stdout(io.StringIO()):
+            context = sivqa_utils.format_rag_context(
+                template,
+                food_name=question["food_name"],
+                predicted_food_names=predicted_dishes,
+                full_response=full_response,
+                persist_dir=persist_dir,
+                question_type=question_types.get(qid, "")
+            )
+        yield qid, question["food_name"], context
+
+def mivqa_contexts(questions, persist_dir):
+    """Yield (qid, food_name, context) using FoodieQARAG's retrieval"""
+    from recipe_db import get_recipe_db
+    from context_retriever import RecipeContextRetriever
+
+    retriever = RecipeContextRetriever(get_recipe_db(persist_dir))
+    for question, context in zip(questions, retriever.retrieve_bulk(questions)):
+        yield question_key(question), question.get("food_name", ""), context
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write the retrieval context of every question to an indexed sidecar file")
+    parser.add_argument("--data_dir", default="data_folder")
+    parser.add_argument("--eval_file", default="sivqa_tidy.json",
+                        help="sivqa_tidy.json or a mivqa_*.json file")
+    parser.add_argument("--template", type=int, default=5,
+                        help="sivqa RAG template (5, 6, 7 or 100); ignored for mivqa files")
+    parser.add_argument("--source", choices=SOURCES, default="wiki")
+    parser.add_argument("--persist_dir", default="./recipe_db",
+                        help="Chroma directory of the wiki or xiachufang store")
+    parser.add_argument("--dish_info", default="output/dish_identification_results.jsonl",
+                        help="Dish predictions, needed by template 100")
+    parser.add_argument("--question_types", default="output/question_type_analysis.json",
+                        help="Question type analysis, needed by template 7")
+    parser.add_argument("--oracle_dish", action="store_true",
+                        help="Retrieve templates 5-7 with the gold dish name (oracle retrieval)")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    questions = sivqa_utils.read_sivqa(args.data_dir, args.eval_file)
+    is_mivqa = bool(questions) and "question_id" not in questions[0]
+
+    if is_mivqa and args.source == "baidu":
+        parser.error("mivqa retrieval reads a Chroma store; use --source wiki or xiachufang")
+    if not is_mivqa:
+        if args.template in (5, 6, 7) and not args.oracle_dish:
+            parser.error(f"template {args.template} looks contexts up by the gold dish name; "
+                         "pass --oracle_dish to materialize this oracle setting")
+        if args.template == 6 and args.source != "baidu":
+            parser.error("template 6 reads the Baidu knowledge base, use --source baidu")
+        if args.template in (5, 7) and args.source == "baidu":
+            parser.error(f"template {args.template} reads a Chroma store; use --source wiki or xiachufang")
+
+    output = args.output or os.path.join(
+        "output",
+        f"contexts_{args.source}_template{args.template}_{os.path.splitext(args.eval_file)[0]}.sqlite")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+    start = time.perf_counter()
+    if is_mivqa:
+        rows = mivqa_contexts(questions, args.persist_dir)
+    else:
+        dish_info = None
+        if args.template == 100:
+            dish_info = sivqa_utils.read_dish_info(os.path.dirname(args.dish_info), os.path.basename(args.dish_info))
+        question_types = None
+        if args.template == 7:
+            type_data = sivqa_utils.read_sivqa(os.path.dirname(args.question_types), os.path.basename(args.question_types))
+            question_types = type_data['question_id_mappings']
+        rows = sivqa_contexts(questions, args.template, args.persist_dir, dish_info=dish_info,
+                              question_types=question_types)
+
+    store = ContextStore(output, readonly=False)
+    store.put_many(rows)
+    store.set_meta(
+        template=args.template,
+        source=args.source,
+        eval_file=args.eval_file,
+        persist_dir=args.persist_dir,
+        oracle_dish=args.oracle_dish,
+        created=time.strftime("%Y-%m-%dT%H:%M:%S")
+    )
+    print(f"Wrote {len(store)} contexts to {output} in {time.perf_counter() - start:.1f}s")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+RAG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "rag")
+sys.path.insert(0, RAG_DIR)
+sys.path.insert(0, os.path.join(RAG_DIR, "baidu"))
+sys.path.insert(0, os.path.join(RAG_DIR, "wikipedia"))
+
+import sivqa_utils
+from context_packer import ContextPacker
+from context_store import ContextStore
+from materialize_contexts import question_key, sivqa_contexts
+
+
+def stored_contexts(path, questions):
+    """(label, contexts) of a file written by materialize_contexts.py"""
+    store = ContextStore(path)
+    contexts = [store.get(question_key(question)) or "" for question in questions]
+    label = f"template{store.template}_{store.source}"
+    store.close()
+    return label, contexts
+
+def live_contexts(template, questions, args):
+    """(label, contexts) retrieved now, as materialize_contexts.py would"""
+    dish_info = None
+    if template == 100:
+        dish_info = sivqa_utils.read_dish_info(os.path.dirname(args.dish_info), os.path.basename(args.dish_info))
+    question_types = None
+    if template == 7:
+        type_data = sivqa_utils.read_sivqa(os.path.dirname(args.question_types), os.path.basename(args.question_types))
+        question_types = type_data['question_id_mappings']
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = list(sivqa_contexts(questions, template, args.persist_dir, dish_info=dish_info,
+                                   question_types=question_types))
+    return f"template{template}", [context for _, _, context in rows]
+
+def report(tokenizer, contexts, budget):
+    """Context tokens of every question before and after packing to the budget"""
+    packer = ContextPacker(tokenizer, max_tokens=budget)
+    before = np.array([packer.count_tokens(context) for context in contexts], dtype=np.int64)
+
+    sivqa_utils.set_context_packer(packer)
+    start = time.perf_counter()
+    packed = [sivqa_utils.pack_context(context) for context in contexts]
+    seconds = time.perf_counter() - start
+    sivqa_utils.set_context_packer(None)
+
+    after = np.array([packer.count_tokens(context) for context in packed], dtype=np.int64)
+    saved = before - after
+    return {
+        "budget": budget,
+        "questions": len(contexts),
+        "tokens_before": int(before.sum()),
+        "tokens_after": int(after.sum()),
+        "tokens_saved": int(saved.sum()),
+        "saved_pct": float(saved.sum() / before.sum() * 100) if before.sum() else 0.0,
+        "mean_before": float(before.mean()) if len(before) else 0.0,
+        "mean_after": float(after.mean()) if len(after) else 0.0,
+        "p95_before": float(np.percentile(before, 95)) if len(before) else 0.0,
+        "max_after": int(after.max()) if len(after) else 0,
+        "truncated": int((after < before).sum()),
+        "pack_seconds": seconds,
+        "token_cache": packer.cache_stats()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prefill tokens saved per sivqa RAG template by packing contexts to a token budget")
+    parser.add_argument("--data_dir", default="data_folder")
+    parser.add_argument("--eval_file", default="sivqa_tidy.json")
+    parser.add_argument("--context_files", nargs="*", default=[],
+                        help="Files written by materialize_contexts.py; without them contexts are retrieved live")
+    parser.add_argument("--templates", type=int, nargs="+", default=[5, 6, 7, 100],
+                        help="RAG templates to retrieve live when no context files are given")
+    parser.add_argument("--persist_dir", default="./recipe_db")
+    parser.add_argument("--dish_info", default="output/dish_identification_results.jsonl")
+    parser.add_argument("--question_types", default="output/question_type_analysis.json")
+    parser.add_argument("--tokenizer", default="HuggingFaceM4/idefics2-8b")
+    parser.add_argument("--cache_dir", default=None)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[256, 512, 1024])
+    parser.add_argument("--output", default=os.path.join("output", "context_budget_report.json"))
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer, cache_dir=args.cache_dir)
+    questions = sivqa_utils.read_sivqa(args.data_dir, args.eval_file)
+
+    if args.context_files:
+        sources = [stored_contexts(path, questions) for path in args.context_files]
+    else:
+        sources = [live_contexts(template, questions, args) for template in args.templates]
+
+    results = {"tokenizer": args.tokenizer, "eval_file": args.eval_file, "templates": {}}
+    for label, contexts in sources:
+        results["templates"][label] = [report(tokenizer, contexts, budget) for budget in args.budgets]
+        print(f"{label}: {len(contexts)} questions")
+        for row in results["templates"][label]:
+            print(f"  budget {row['budget']:5d}: {row['mean_before']:8.1f} -> {row['mean_after']:8.1f} "
+                  f"context tokens/question, saved {row['tokens_saved']} ({row['saved_pct']:.1f}%), "
+                  f"{row['truncated']} truncated")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,42 @@ import os
 import sys
 sys.path.insert(0,"D:\\cs5787\\final\\dl_project\\FoodieQA\\rag\\wikipedia" )
 sys.path.insert(0,"D:\\cs5787\\final\\dl_project\\FoodieQA\\rag\\baidu" )
+sys.path.insert(0,"D:\\cs5787\\final\\dl_project\\FoodieQA\\rag" )
 print(sys.path)
 from inspect_db import ChromaInspector
-
+from recipe_db import get_recipe_db
+from federated_retriever import FederatedRetriever
+from aspect_extractor import QUESTION_TYPE_ASPECTS
+from baidu_kb import load_recipe_kb, RecipeOffsetIndex
+from context_store import ContextStore
+from dish_resolver import get_dish_resolver
+
+BAIDU_KB_PATH = os.path.join("rag", "baidu", "baidu_recipe_db", "all_recipes.json")
+# Set to True to fetch single recipes through the on-disk offset index instead
+# of holding the whole knowledge base in memory.
+BAIDU_KB_USE_INDEX = False
+_baidu_kb_index = None
+_context_store = None
+# ContextPacker fitting the RAG template contexts to a token budget
+_context_packer = None
+# question_id -> question type (question_type_analysis.json), read by template 7
+_question_types = {}
+
+# Knowledge sources of template 100, queried concurrently
+WIKI_PERSIST_DIR = "./recipe_db"
+XIACHUFANG_PERSIST_DIR = os.path.join("rag", "xiachufang", "recipe_db")
+MULTI_SOURCE_TIMEOUTS = {"wiki": 2.0, "xiachufang": 2.0, "baidu": 1.0}
+MULTI_SOURCE_BUDGET = 3.0
+_federated_retriever = None
+
+def get_baidu_kb():
+    """Dict-like view of the Baidu knowledge base for the RAG templates"""
+    global _baidu_kb_index
+    if BAIDU_KB_USE_INDEX:
+        if _baidu_kb_index is None:
+            _baidu_kb_index = RecipeOffsetIndex(BAIDU_KB_PATH)
+        return _baidu_kb_index
+    return load_recipe_kb(BAIDU_KB_PATH)
 
 
 def read_sivqa(data_dir, file_name="sivqa_tidy.json"):
@@ -54,7 +87,166 @@ def format_question(question, lang="zh", show_food_name=False, use_web_img=False
     
     return q, img, choices_str
 
-def format_text_prompt(q, choices_str, template=0, lang="zh", food_name = "", predicted_food_names = [], full_response= ""):
+def resolve_dish_name(food_name):
+    """Knowledge base key of a dish name: near misses, English names and
+    aliases map to the canonical Chinese name; unknown names are kept"""
+    return get_dish_resolver().resolve(food_name) or food_name
+
+def format_wiki_context(food_name, persist_dir="./recipe_db"):
+    inspector = ChromaInspector(persist_dir)
+    entries = inspector.get_dish_entries(food_name)
+    if not entries:
+        resolved = resolve_dish_name(food_name)
+        if resolved != food_name:
+            entries = inspector.get_dish_entries(resolved)
+    if not entries:
+        return ""
+    return entries[0]["content"]
+
+def format_aspect_context(food_name, question_type, persist_dir="./recipe_db"):
+    """Only the snippets of the aspect the question type asks about"""
+    aspect = QUESTION_TYPE_ASPECTS.get(question_type)
+    if aspect is None:
+        return format_wiki_context(food_name, persist_dir=persist_dir)
+    inspector = ChromaInspector(persist_dir)
+    snippets = inspector.get_dish_aspect(food_name, aspect)
+    if not snippets:
+        resolved = resolve_dish_name(food_name)
+        if resolved != food_name:
+            snippets = inspector.get_dish_aspect(resolved, aspect)
+    if not snippets:
+        return format_wiki_context(food_name, persist_dir=persist_dir)
+    return f"{aspect}: {'; '.join(snippets)}"
+
+def format_baidu_context(food_name, json_db):
+    """
+    Format the context using data from the JSON database.
+    :param food_name: Name of the food item to search for.
+    :param json_db: The JSON database loaded as a dictionary.
+    :return: Formatted context string.
+    """
+    # Attempt to find the dish by its name in the JSON keys
+    entry = json_db.get(food_name) or json_db.get(resolve_dish_name(food_name))
+    
+    if not entry:
+        return "未找到与该食品名称相关的内容。"
+    return format_baidu_entry(entry, food_name)
+
+def format_baidu_entry(entry, food_name):
+    """Context string of one Baidu knowledge base entry"""
+    # Extract relevant fields from the entry
+    dish_name = entry.get("dish_name", food_name)
+    cuisine_type = entry.get("cuisine_type", "未知菜系")
+    description = entry.get("description", "暂无描述。")
+    ingredients = entry.get("ingredients", [])
+    steps = entry.get("steps", [])
+    url = entry.get("url", "无可用链接。")
+
+    # Format the context
+    context = "\n".join([
+        f"菜名: {dish_name}",
+        f"菜系: {cuisine_type}",
+        f"描述: {description if description else 'no descriptions'}",
+        f"配料: {', '.join(ingredients) if ingredients else 'no ingredients'}",
+        "步骤:",
+        "\n".join(steps) if steps else "no steps",
+        f"参考链接: {url}"
+    ])
+    return context
+
+def _chroma_source(persist_dir):
+    """First stored entry of each dish in a Chroma recipe store"""
+    def fetch(food_names):
+        if not os.path.isdir(persist_dir):
+            return []
+        index = get_recipe_db(persist_dir).dish_index
+        documents = []
+        for food_name in food_names:
+            entries = index.lookup(food_name)
+            if entries:
+                documents.append({"id": entries[0]["id"], "content": entries[0]["content"]})
+        return documents
+    return fetch
+
+def _baidu_source(food_names):
+    json_db = get_baidu_kb()
+    documents = []
+    for food_name in food_names:
+        entry = json_db.get(food_name)
+        if entry:
+            documents.append({"id": food_name, "content": format_baidu_entry(entry, food_name)})
+    return documents
+
+def get_federated_retriever():
+    """Shared retriever over the wiki, Xiachufang and Baidu knowledge sources"""
+    global _federated_retriever
+    if _federated_retriever is None:
+        _federated_retriever = FederatedRetriever(
+            {
+                "wiki": _chroma_source(WIKI_PERSIST_DIR),
+                "xiachufang": _chroma_source(XIACHUFANG_PERSIST_DIR),
+                "baidu": _baidu_source
+            },
+            timeouts=MULTI_SOURCE_TIMEOUTS,
+            budget=MULTI_SOURCE_BUDGET
+        )
+    return _federated_retriever
+
+def format_multi_source_context(predicted_food_names, full_response):
+    """The dish identification response followed by the merged context of all sources"""
+    food_names = list(dict.fromkeys(resolve_dish_name(name) for name in predicted_food_names))
+    retrieved = get_federated_retriever().retrieve(food_names)
+    context = FederatedRetriever.format_context(retrieved["results"])
+    if not context:
+        return full_response
+    return f"{full_response}\n\n{context}" if full_response else context
+
+def format_rag_context(template, food_name="", predicted_food_names=[], full_response="", persist_dir="./recipe_db", question_type=""):
+    """Context of a RAG template (5, 6, 7 or 100), computed live"""
+    if template == 5:
+        return format_wiki_context(food_name, persist_dir=persist_dir)
+    if template == 7:
+        return format_aspect_context(food_name, question_type, persist_dir=persist_dir)
+    if template == 6:
+        return format_baidu_context(food_name, get_baidu_kb())
+    if template == 100:
+        return format_multi_source_context(predicted_food_names, full_response)
+    raise ValueError(f"Template {template} does not use retrieved context")
+
+def set_context_store(path):
+    """Serve RAG template contexts from a file written by materialize_contexts.py"""
+    global _context_store
+    _context_store = ContextStore(path) if path else None
+
+def set_context_packer(packer):
+    """Cut every RAG template context to the packer's token budget (None to disable)"""
+    global _context_packer
+    _context_packer = packer
+
+def pack_context(context):
+    """Context fitted to the budget of set_context_packer; blank-line separated
+    parts are kept in order until the budget runs out"""
+    if _context_packer is None or not context:
+        return context
+    return _context_packer.pack_texts(context.split("\n\n"))
+
+def set_question_types(path):
+    """Read the question types template 7 picks aspects by from a
+    question_type_analysis.json file"""
+    global _question_types
+    _question_types = read_sivqa(os.path.dirname(path), os.path.basename(path))['question_id_mappings']
+
+def get_stored_context(question_id, template, food_name=None):
+    """Materialized context for a question, or None to fall back to live retrieval.
+    Templates 5-7 pass food_name: their contexts were materialized with the
+    gold dish name, so they are only served to oracle runs"""
+    if _context_store is None or not question_id or _context_store.template != template:
+        return None
+    if food_name is not None and not food_name:
+        return None
+    return _context_store.get(question_id)
+
+def format_text_prompt(q, choices_str, template=0, lang="zh", food_name = "", predicted_food_names = [], full_response= "", question_id = "", question_type = ""):
     if lang == "zh":
         if template == 0:
             return "{} 选项有: {}, 请根据上图从所提供的选项中选择一个正确答案，为（".format(q, choices_str)
@@ -69,61 +261,24 @@ def format_text_prompt(q, choices_str, template=0, lang="zh", food_name = "", pr
             return ["{} 这是选项: {} 请根据上图从所提供的选项中选择一个正确答案。请保证你的答案清晰简洁并输出字母选项。".format(q, choices_str), "我选择（"]
             # return "用户：{} 这是选项: {} 请根据上图从所提供的选项中选择一个正确答案。智能助手：我选择（".format(q, choices_str)
         if template == 5:  # New RAG template
-            def _format_rag_context(food_name):
-                inspector = ChromaInspector()
-                entries = inspector.get_dish_entries(food_name)
-                if not entries:
-                    return ""
-                entry = entries[0]
-                context = entry["content"]
-                return "\n".join(context)
-                
-            context = _format_rag_context(food_name=food_name)
+            context = get_stored_context(question_id, template, food_name)
+            if context is None:
+                context = format_wiki_context(food_name=food_name)
+            context = pack_context(context)
             return [
                 f"根据以下内容：\n{context}\n问题：{q}\n选项：{choices_str}",
                 "根据上下文和图片，我选择（"
             ]
         
         if template == 6:
-            def _format_rag_context(food_name, json_db):
-                """
-                Format the context using data from the JSON database.
-                :param food_name: Name of the food item to search for.
-                :param json_db: The JSON database loaded as a dictionary.
-                :return: Formatted context string.
-                """
-                # Attempt to find the dish by its name in the JSON keys
-                entry = json_db.get(food_name)
-                
-                if not entry:
-                    return "未找到与该食品名称相关的内容。"
-
-                # Extract relevant fields from the entry
-                dish_name = entry.get("dish_name", food_name)
-                cuisine_type = entry.get("cuisine_type", "未知菜系")
-                description = entry.get("description", "暂无描述。")
-                ingredients = entry.get("ingredients", [])
-                steps = entry.get("steps", [])
-                url = entry.get("url", "无可用链接。")
-
-                # Format the context
-                context = "\n".join([
-                    f"菜名: {dish_name}",
-                    f"菜系: {cuisine_type}",
-                    f"描述: {description if description else 'no descriptions'}",
-                    f"配料: {', '.join(ingredients) if ingredients else 'no ingredients'}",
-                    "步骤:",
-                    "\n".join(steps) if steps else "no steps",
-                    f"参考链接: {url}"
-                ])
-                return context
-
-            # Load the JSON database (assuming it's already in memory or loaded previously)
-            with open("rag\\baidu\\baidu_recipe_db\\all_recipes.json", "r", encoding="utf-8") as f:
-                json_db = json.load(f)
-
-            # Format the context for the given food name
-            context = _format_rag_context(food_name=food_name, json_db=json_db)
+            context = get_stored_context(question_id, template, food_name)
+            if context is None:
+                # Load the JSON database (parsed once per process, reloaded if the file changes)
+                json_db = get_baidu_kb()
+
+                # Format the context for the given food name
+                context = format_baidu_context(food_name=food_name, json_db=json_db)
+            context = pack_context(context)
 
             # Return the prompt for the VQA system
             return [
@@ -131,6 +286,16 @@ def format_text_prompt(q, choices_str, template=0, lang="zh", food_name = "", pr
                 "根据上下文和图片，我选择（"
             ]
         
+        if template == 7:  # Aspect RAG template, context limited to the question type
+            context = get_stored_context(question_id, template, food_name)
+            if context is None:
+                context = format_aspect_context(food_name, question_type)
+            context = pack_context(context)
+            return [
+                f"根据以下内容：\n{context}\n问题：{q}\n选项：{choices_str}",
+                "根据上下文和图片，我选择（"
+            ]
+        
         if template == 11:  # Visual Analysis Template
             return [
                 """You are an AI assistant examining this dish visually. Question: {} 
@@ -158,54 +323,10 @@ def format_text_prompt(q, choices_str, template=0, lang="zh", food_name = "", pr
             ]
         
         if template == 100:
-            def _format_wiki_context(food_name):
-                inspector = ChromaInspector()
-                entries = inspector.get_dish_entries(food_name)
-                if not entries:
-                    return ""
-                entry = entries[0]
-                context = entry["content"]
-                return "\n".join(context)
-            def _format_baidu_context(food_name, json_db):
-                """
-                Format the context using data from the JSON database.
-                :param food_name: Name of the food item to search for.
-                :param json_db: The JSON database loaded as a dictionary.
-                :return: Formatted context string.
-                """
-                # Attempt to find the dish by its name in the JSON keys
-                entry = json_db.get(food_name)
-                
-                if not entry:
-                    return "未找到与该食品名称相关的内容。"
-
-                # Extract relevant fields from the entry
-                dish_name = entry.get("dish_name", food_name)
-                cuisine_type = entry.get("cuisine_type", "未知菜系")
-                description = entry.get("description", "暂无描述。")
-                ingredients = entry.get("ingredients", [])
-                steps = entry.get("steps", [])
-                url = entry.get("url", "无可用链接。")
-
-                # Format the context
-                context = "\n".join([
-                    f"菜名: {dish_name}",
-                    f"菜系: {cuisine_type}",
-                    f"描述: {description if description else 'no descriptions'}",
-                    f"配料: {', '.join(ingredients) if ingredients else 'no ingredients'}",
-                    "步骤:",
-                    "\n".join(steps) if steps else "no steps",
-                    f"参考链接: {url}"
-                ])
-                return context
-            with open("rag\\baidu\\baidu_recipe_db\\all_recipes.json", "r", encoding="utf-8") as f:
-                json_db = json.load(f)
-            context = full_response
-            for food_name in predicted_food_names:
-                wiki_context = _format_wiki_context(food_name=food_name)
-                baidu_context = _format_baidu_context(food_name=food_name, json_db=json_db)
-                context.join(wiki_context)
-                context.join(baidu_context)
+            context = get_stored_context(question_id, template)
+            if context is None:
+                context = format_multi_source_context(predicted_food_names, full_response)
+            context = pack_context(context)
             return [
                 f"根据以下内容：\n{context}\n问题：{q}\n选项：{choices_str}",
                 "根据上下文和图片，我选择（"]
@@ -316,27 +437,37 @@ def format_text_prompt(q, choices_str, template=0, lang="zh", food_name = "", pr
                 "Let me analyze the image and provide my answer..."
             ]
 
-def get_prompt_qwen(question, data_dir, show_food_name=False, use_web_img=False, template=0, lang="zh"):
+def rag_prompt_args(question, oracle_dish=False):
+    """Arguments of format_text_prompt that the RAG templates (5, 6, 7) need.
+    Those templates look the context up by dish name, which they only get
+    with oracle_dish: retrieval with the gold name is an oracle setting, not
+    comparable with gpt4osivqa.py, which gets none"""
+    question_id = question.get("question_id", "")
+    return {"food_name": question.get("food_name", "") if oracle_dish else "",
+            "question_id": question_id,
+            "question_type": _question_types.get(question_id, "")}
+
+def get_prompt_qwen(question, data_dir, show_food_name=False, use_web_img=False, template=0, lang="zh", oracle_dish=False):
     # for qwen model
     q, img, choices_str = format_question(question, lang=lang, show_food_name=show_food_name, use_web_img=use_web_img)
 
     query_list = [{"image": os.path.join(data_dir, img)}]
-    text_prompt = format_text_prompt(q, choices_str, template, lang=lang)
+    text_prompt = format_text_prompt(q, choices_str, template, lang=lang, **rag_prompt_args(question, oracle_dish))
     if isinstance(text_prompt, list):
         if lang == "zh":
             query_list.append({"text": "用户："+ text_prompt[0] + "智能助手："+ text_prompt[1]})
         else:
             query_list.append({"text": "Human: "+ text_prompt[0] + "Assistant: "+ text_prompt[1]})
     else:
-        query_list.append({"text": format_text_prompt(q, choices_str, template, lang=lang)})
+        query_list.append({"text": text_prompt})
 
     return query_list
 
-def get_prompt_phi(question, data_dir, show_food_name=False, template=0, lang="zh"):
+def get_prompt_phi(question, data_dir, show_food_name=False, template=0, lang="zh", oracle_dish=False):
     # for qwen model
     q, img, choices_str = format_question(question, lang=lang, show_food_name=show_food_name)
 
-    text_prompt = format_text_prompt(q, choices_str, template, lang=lang)
+    text_prompt = format_text_prompt(q, choices_str, template, lang=lang, **rag_prompt_args(question, oracle_dish))
     query_list = []
     if isinstance(text_prompt, list):
         query_list.append({"role": "user", "content": "<|image_1|>\n" + text_prompt[0]})
@@ -347,10 +478,10 @@ def get_prompt_phi(question, data_dir, show_food_name=False, template=0, lang="z
     return query_list
 
 
-def get_prompt_idefics(question, data_dir, show_food_name=False, template=0, lang="zh"):
+def get_prompt_idefics(question, data_dir, show_food_name=False, template=0, lang="zh", oracle_dish=False):
     # for both idefics2 and mantis
     q, img, choices_str = format_question(question, lang=lang, show_food_name=show_food_name)
-    text_prompt = format_text_prompt(q, choices_str, template, lang=lang)
+    text_prompt = format_text_prompt(q, choices_str, template, lang=lang, **rag_prompt_args(question, oracle_dish))
     if isinstance(text_prompt, list):
         query_list = [
                     {
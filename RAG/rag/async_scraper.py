@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+from yarl import URL
+
+from http_cache import HttpCache
+
+# Statuses worth retrying: rate limited or a transient server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Header telling the stand-in server which host a rewritten request was for
+ORIGINAL_HOST_HEADER = "X-Original-Host"
+
+
+def page_key(url) -> str:
+    """File name of a recorded page: a digest of its path and query"""
+    return hashlib.sha1(URL(str(url)).path_qs.encode("utf-8")).hexdigest()[:24] + ".html"
+
+def save_page(pages_dir: str, url, text: str):
+    """Record a page for scrape_stand_in_server.py"""
+    url = URL(str(url))
+    host_dir = os.path.join(pages_dir, url.host or "")
+    os.makedirs(host_dir, exist_ok=True)
+    with open(os.path.join(host_dir, page_key(url)), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average and bursts of `burst`.
+
+    Waiters are served in arrival order: the lock is held while waiting
+    for the next token.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            self._refill(loop.time())
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill(loop.time())
+            self.tokens -= 1
+
+
+class AsyncScraper:
+    """Asyncio scraping engine shared by the recipe scrapers.
+
+    ``run(jobs, scrape, store)`` feeds the jobs to ``workers`` coroutines.
+    Each calls ``await scrape(job, fetch)``, where ``await fetch(url,
+    params)`` returns a page's text, and hands the result to
+    ``store(job, result)``. store runs in one background thread, so
+    database writes are serial and do not block the event loop; jobs are
+    drawn from their iterator in another, so it may block too. Error
+    statuses raise aiohttp.ClientResponseError once retries are exhausted.
+
+    Requests go through one aiohttp session (connections are reused) and a
+    token bucket per host (``rate`` requests/sec, ``burst``; overrides per
+    host in ``host_limits`` as {host: (rate, burst)}) instead of fixed
+    sleeps. Connection errors, timeouts and RETRY_STATUSES are retried up
+    to ``max_retries`` times after a full-jitter exponential backoff (at
+    least the server's Retry-After). ``rewrite_hosts`` ({host: base url},
+    "*" for every host) sends requests elsewhere, e.g. to
+    scrape_stand_in_server.py; ``record_dir`` saves every fetched page for
+    that server to replay. With an HttpCache, cached pages are served
+    without a request (or a rate-limit token) and stale ones revalidated.
+    """
+
+    def __init__(self,
+                 workers: int = 8,
+                 rate: float = 1.0,
+                 burst: int = 2,
+                 host_limits: Optional[Dict[str, tuple]] = None,
+                 max_retries: int = 3,
+                 backoff: float = 1.0,
+                 max_backoff: float = 30.0,
+                 timeout: float = 20.0,
+                 headers: Optional[Dict[str, str]] = None,
+                 verify_ssl: bool = True,
+                 rewrite_hosts: Optional[Dict[str, str]] = None,
+                 record_dir: Optional[str] = None,
+                 cache: Optional[HttpCache] = None):
+        self.workers = workers
+        self.rate = rate
+        self.burst = burst
+        self.host_limits = host_limits or {}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.verify_ssl = verify_ssl
+        self.rewrite_hosts = rewrite_hosts or {}
+        self.record_dir = record_dir
+        self.cache = cache
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.stats = {}
+
+    def _bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, burst = self.host_limits.get(host, (self.rate, self.burst))
+            bucket = self._buckets[host] = TokenBucket(rate, burst)
+        return bucket
+
+    def _target(self, url: URL):
+        """URL actually requested, and the extra headers that go with it"""
+        base = self.rewrite_hosts.get(url.host, self.rewrite_hosts.get("*"))
+        if base is None:
+            return url, {}
+        return URL(base).with_path(url.path).with_query(url.query), {ORIGINAL_HOST_HEADER: url.host}
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    async def fetch(self, session: aiohttp.ClientSession, url, params: Optional[Dict] = None) -> str:
+        """Text of a page, after rate limiting and retries"""
+        url = URL(str(url))
+        if params:
+            url = url.update_query(params)
+        target, headers = self._target(url)
+        key = entry = None
+        if self.cache is not None:
+            key, entry = self.cache.before_request(str(url), self.headers)
+            if self.cache.usable(entry):
+                self.stats["cached"] += 1
+                return self.cache.text(entry)
+            headers.update(self.cache.conditional_headers(entry))
+        bucket = self._bucket(url.host)
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            self.stats["requests"] += 1
+            try:
+                async with session.get(target, headers=headers) as response:
+                    if response.status in RETRY_STATUSES:
+                        retry_after = response.headers.get("Retry-After", "")
+                        raise RetryableStatus(response.status,
+                                              float(retry_after) if retry_after.isdigit() else None)
+                    if response.status == 304:
+                        if entry is None:
+                            # Nothing to revalidate: a 304 here has no page to serve
+                            raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                              status=304, message="Not Modified without a cached page",
+                                                              headers=response.headers)
+                        return self.cache.text(self.cache.touch(key, entry))
+                    response.raise_for_status()
+                    body = await response.read()
+                    encoding = response.get_encoding()
+                    text = body.decode(encoding, errors="replace")
+                if self.cache is not None:
+                    self.cache.put(key, url, response.headers, body, encoding)
+                if self.record_dir:
+                    save_page(self.record_dir, url, text)
+                return text
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError, RetryableStatus) as e:
+                if attempt == self.max_retries:
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt, getattr(e, "retry_after", None)))
+
+    async def _run(self,
+                   jobs: Iterable[Any],
+                   scrape: Callable[[Any, Callable[..., Awaitable[str]]], Awaitable[Any]],
+                   store: Callable[[Any, Any], None],
+                   fail: Optional[Callable[[Any, Exception], None]]) -> Dict:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.workers)
+        done = object()
+        connector = aiohttp.TCPConnector(limit=self.workers, ssl=None if self.verify_ssl else False)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        with ThreadPoolExecutor(max_workers=1) as store_executor, ThreadPoolExecutor(max_workers=1) as job_executor:
+            async with aiohttp.ClientSession(connector=connector, headers=self.headers, timeout=timeout) as session:
+                async def fetch(url, params=None):
+                    return await self.fetch(session, url, params)
+
+                async def worker():
+                    while True:
+                        job = await queue.get()
+                        if job is done:
+                            return
+                        try:
+                            result = await scrape(job, fetch)
+                            await loop.run_in_executor(store_executor, store, job, result)
+                            self.stats["succeeded"] += 1
+                        except Exception as e:
+                            self.stats["failed"].append((job, f"{type(e).__name__}: {e}"))
+                            if fail is not None:
+                                await loop.run_in_executor(store_executor, fail, job, e)
+
+                tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+                # Drawn in a thread, as taking a job may block (e.g. WorkQueue.claimed)
+                jobs = iter(jobs)
+                while True:
+                    job = await loop.run_in_executor(job_executor, next, jobs, done)
+                    if job is done:
+                        break
+                    self.stats["jobs"] += 1
+                    await queue.put(job)
+                for _ in tasks:
+                    await queue.put(done)
+                await asyncio.gather(*tasks)
+        return self.stats
+
+    def run(self,
+            jobs: Iterable[Any],
+            scrape: Callable[[Any, Callable[..., Awaitable[str]]], Awaitable[Any]],
+            store: Callable[[Any, Any], None],
+            fail: Optional[Callable[[Any, Exception], None]] = None) -> Dict:
+        """Scrape and store every job; returns counts, failures and timing.
+        fail(job, error) is called (in the store thread) for each failed job."""
+        self._buckets = {}
+        self.stats = {"jobs": 0, "succeeded": 0, "failed": [], "requests": 0, "retries": 0, "cached": 0}
+        start = time.perf_counter()
+        asyncio.run(self._run(jobs, scrape, store, fail))
+        elapsed = time.perf_counter() - start
+        self.stats["seconds"] = elapsed
+        self.stats["jobs_per_sec"] = self.stats["jobs"] / elapsed if elapsed > 0 else 0.0
+        return self.stats
+
+
+def add_engine_args(parser: argparse.ArgumentParser, rate: float, burst: int = 2):
+    """--workers/--rate/... flags of the scraper scripts"""
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Concurrent scraping workers; 0 for the original serial scraper")
+    parser.add_argument("--rate", type=float, default=rate, help="Requests per second per host")
+    parser.add_argument("--burst", type=int, default=burst)
+    parser.add_argument("--max_retries", type=int, default=3)
+    parser.add_argument("--stand_in", default=None,
+                        help="Send every request to this base URL (see scrape_stand_in_server.py)")
+    parser.add_argument("--record_dir", default=None,
+                        help="Save fetched pages here for scrape_stand_in_server.py")
+
+def engine_from_args(args: argparse.Namespace, **kwargs) -> Optional[AsyncScraper]:
+    """AsyncScraper configured by add_engine_args flags, None for the serial scraper"""
+    if args.workers <= 0:
+        return None
+    return AsyncScraper(workers=args.workers, rate=args.rate, burst=args.burst,
+                        max_retries=args.max_retries,
+                        rewrite_hosts={"*": args.stand_in} if args.stand_in else None,
+                        record_dir=args.record_dir, **kwargs)
+
+
+def dish_jobs(dishes_by_cuisine: Dict[str, List[str]]) -> List[tuple]:
+    """(cuisine_type, dish) jobs of a dish list"""
+    return [(cuisine_type, dish) for cuisine_type, dishes in dishes_by_cuisine.items() for dish in dishes]
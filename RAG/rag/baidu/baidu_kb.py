@@ -0,0 +1,198 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from recipe_journal import journal_path_for, read_journal, replay_recipes
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+_kb_lock = threading.Lock()
+_kb_cache: Dict[str, Tuple[tuple, Dict]] = {}
+
+def _stat_key(path: str) -> Tuple[int, int]:
+    """(mtime_ns, size) of a file, used to detect changes"""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def _journal_key(path: str) -> Optional[Tuple[int, int]]:
+    """_stat_key of the journal of all_recipes.json, None if it is empty"""
+    journal_path = journal_path_for(path)
+    if not os.path.exists(journal_path) or os.path.getsize(journal_path) == 0:
+        return None
+    return _stat_key(journal_path)
+
+def load_recipe_kb(path: str) -> Dict[str, Dict]:
+    """Load all_recipes.json and replay its journal (see recipe_journal.py),
+    at most once per (path, mtime, size) of both files.
+
+    The returned dict is shared between callers and must not be modified.
+    """
+    path = os.path.abspath(path)
+    journal_key = _journal_key(path)
+    if journal_key is not None and not os.path.exists(path):
+        key = (None, journal_key)
+    else:
+        key = (_stat_key(path), journal_key)
+    cached = _kb_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with _kb_lock:
+        cached = _kb_cache.get(path)
+        if cached is None or cached[0] != key:
+            if journal_key is None:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            else:
+                data = replay_recipes(path)
+            cached = (key, data)
+            _kb_cache[path] = cached
+    return cached[1]
+
+def clear_recipe_kb_cache():
+    """Forget every knowledge base loaded by load_recipe_kb()"""
+    with _kb_lock:
+        _kb_cache.clear()
+
+def _scan_value_offsets(text: str) -> Dict[str, Tuple[int, int]]:
+    """Character spans of each top-level value in a JSON object"""
+    decoder = json.JSONDecoder()
+    pos = _WHITESPACE.match(text, 0).end()
+    if text[pos:pos + 1] != '{':
+        raise ValueError("Expected a JSON object at the top level")
+    pos = _WHITESPACE.match(text, pos + 1).end()
+
+    spans = {}
+    if text[pos:pos + 1] == '}':
+        return spans
+    while True:
+        key, pos = decoder.raw_decode(text, pos)
+        pos = _WHITESPACE.match(text, pos).end()
+        if text[pos:pos + 1] != ':':
+            raise ValueError(f"Expected ':' at position {pos}")
+        start = _WHITESPACE.match(text, pos + 1).end()
+        _, end = decoder.raw_decode(text, start)
+        spans[key] = (start, end)
+        pos = _WHITESPACE.match(text, end).end()
+        if text[pos:pos + 1] == ',':
+            pos = _WHITESPACE.match(text, pos + 1).end()
+        elif text[pos:pos + 1] == '}':
+            return spans
+        else:
+            raise ValueError(f"Expected ',' or '}}' at position {pos}")
+
+class RecipeOffsetIndex:
+    """On-disk dish name -> (byte offset, length) index into all_recipes.json.
+
+    get() seeks to a single recipe and decodes only that value, so a lookup
+    does not need the whole file in memory. The index is stored next to the
+    source file and rebuilt when the source mtime or size changes. It has the
+    same get() as the dict returned by load_recipe_kb(), so either can be
+    passed where a json_db is expected. Recipes written to the journal since
+    the last compaction are kept in memory on top of the index.
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        self.path = os.path.abspath(path)
+        self.index_path = index_path or self.path + ".idx"
+        self._lock = threading.Lock()
+        self._offsets: Optional[Dict[str, Tuple[int, int]]] = None
+        self._source_key: Optional[Tuple[int, int]] = None
+        # Journal recipes since the last compaction; None marks a deleted dish
+        self._overlay: Dict[str, Optional[Dict]] = {}
+        self._journal_key: Optional[Tuple[int, int]] = None
+
+    def _read_index(self, source_key: Tuple[int, int]) -> Optional[Dict[str, Tuple[int, int]]]:
+        if not os.path.exists(self.index_path):
+            return None
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if (header.get("mtime_ns"), header.get("size")) != source_key:
+                return None
+            offsets = {}
+            for line in f:
+                name, offset, length = line.rstrip("\n").split("\t")
+                offsets[json.loads(name)] = (int(offset), int(length))
+        return offsets
+
+    def build(self) -> Dict[str, Tuple[int, int]]:
+        """Scan the source file once and write the index next to it"""
+        source_key = _stat_key(self.path)
+        with open(self.path, "rb") as f:
+            text = f.read().decode("utf-8")
+
+        offsets = {}
+        char_pos, byte_pos = 0, 0
+        for name, (start, end) in _scan_value_offsets(text).items():
+            # Spans are increasing, so converting to byte offsets is linear
+            byte_start = byte_pos + len(text[char_pos:start].encode("utf-8"))
+            byte_end = byte_start + len(text[start:end].encode("utf-8"))
+            offsets[name] = (byte_start, byte_end - byte_start)
+            char_pos, byte_pos = end, byte_end
+
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"mtime_ns": source_key[0], "size": source_key[1]}) + "\n")
+            for name, (offset, length) in offsets.items():
+                f.write(f"{json.dumps(name, ensure_ascii=False)}\t{offset}\t{length}\n")
+        os.replace(tmp_path, self.index_path)
+
+        self._offsets = offsets
+        self._source_key = source_key
+        return offsets
+
+    def _ensure_loaded(self) -> Dict[str, Tuple[int, int]]:
+        source_key = _stat_key(self.path)
+        if self._offsets is not None and self._source_key == source_key:
+            return self._offsets
+        with self._lock:
+            if self._offsets is None or self._source_key != source_key:
+                offsets = self._read_index(source_key)
+                if offsets is None:
+                    return self.build()
+                self._offsets = offsets
+                self._source_key = source_key
+        return self._offsets
+
+    def _ensure_overlay(self) -> Dict[str, Optional[Dict]]:
+        journal_key = _journal_key(self.path)
+        if journal_key != self._journal_key:
+            with self._lock:
+                overlay = {}
+                for record in read_journal(journal_path_for(self.path)):
+                    overlay[record["dish"]] = record["recipe"] if record["op"] == "put" else None
+                self._overlay, self._journal_key = overlay, journal_key
+        return self._overlay
+
+    def get(self, dish_name: str, default=None) -> Optional[Dict]:
+        """Read a single recipe from disk"""
+        overlay = self._ensure_overlay()
+        if dish_name in overlay:
+            recipe = overlay[dish_name]
+            return default if recipe is None else recipe
+        span = self._ensure_loaded().get(dish_name)
+        if span is None:
+            return default
+        offset, length = span
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            raw = f.read(length)
+        return json.loads(raw.decode("utf-8"))
+
+    def __contains__(self, dish_name: str) -> bool:
+        overlay = self._ensure_overlay()
+        if dish_name in overlay:
+            return overlay[dish_name] is not None
+        return dish_name in self._ensure_loaded()
+
+    def __len__(self) -> int:
+        return len(self.names())
+
+    def names(self) -> List[str]:
+        """All dish names in file order, then those only in the journal"""
+        overlay = self._ensure_overlay()
+        offsets = self._ensure_loaded()
+        names = [name for name in offsets if overlay.get(name, True) is not None]
+        return names + [name for name, recipe in overlay.items() if recipe is not None and name not in offsets]
@@ -1,14 +1,31 @@
 from bs4 import BeautifulSoup
-import requests
-import time
 from typing import Dict, Optional, List
 import re
 from urllib.parse import quote
 import json
 import os
+import sys
+import argparse
+import aiohttp
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from incremental_refresh import DEFAULT_TTL_DAYS, plan_refresh, new_summary, finish_summary
+from async_scraper import AsyncScraper, add_engine_args, engine_from_args, dish_jobs
+from http_cache import HttpCache, add_cache_args, cache_from_args, get_http_cache
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from recipe_journal import RecipeJournal, replay_recipes
+from work_queue import (NothingScraped, WorkItem, WorkQueue, add_queue_args, queue_from_args,
+                        process_queue, process_queue_async)
+from html_extract import DEFAULT_HTML_BACKEND, HTML_BACKENDS, TextSpans, innermost_sections, parse_html
+
+RECIPES_PATH = './baidu_recipe_db/all_recipes.json'
 
 class BaiduRecipeScraper:
-    def __init__(self):
+    def __init__(self, http: Optional[HttpCache] = None, html_backend: str = DEFAULT_HTML_BACKEND):
+        self.http = http or get_http_cache()
+        # See html_extract.py; "bs4" is the original extraction
+        self.html_backend = html_backend
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
@@ -17,34 +34,56 @@ class BaiduRecipeScraper:
         
         # Create directory if it doesn't exist
         os.makedirs('./baidu_recipe_db', exist_ok=True)
+        self.journal = RecipeJournal(RECIPES_PATH)
+
+    def baike_url(self, dish_name: str) -> str:
+        return f"https://baike.baidu.com/item/{quote(dish_name)}"
+
+    def parse_recipe_info(self, dish_name: str, cuisine_type: str, html: Optional[str]) -> Dict:
+        """Recipe information of a Baike page; empty fields if there is no page"""
+        recipe_info = {
+            'dish_name': dish_name,
+            'cuisine_type': cuisine_type,
+            'description': '',
+            'ingredients': [],
+            'steps': [],
+            'url': self.baike_url(dish_name),
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        if html is not None:
+            soup = parse_html(html, self.html_backend)
+            self._extract_basic_info(soup, recipe_info)
+            self._extract_recipe_details(soup, recipe_info)
+        
+        return recipe_info
 
     def search_recipe_info(self, dish_name: str, cuisine_type: str) -> Optional[Dict]:
         """Search for detailed recipe information on Baidu"""
         try:
-            baike_url = f"https://baike.baidu.com/item/{quote(dish_name)}"
-            baike_response = requests.get(baike_url, headers=self.headers)
+            baike_response = self.http.get(self.baike_url(dish_name), headers=self.headers)
             baike_response.encoding = 'utf-8'
-            
-            recipe_info = {
-                'dish_name': dish_name,
-                'cuisine_type': cuisine_type,
-                'description': '',
-                'ingredients': [],
-                'steps': [],
-                'url': baike_url
-            }
-            
-            if baike_response.status_code == 200:
-                soup = BeautifulSoup(baike_response.text, 'html.parser')
-                self._extract_basic_info(soup, recipe_info)
-                self._extract_recipe_details(soup, recipe_info)
-            
-            return recipe_info
+            if baike_response.status_code == 404:
+                html = None  # No Baike page for the dish
+            else:
+                baike_response.raise_for_status()
+                html = baike_response.text
+            return self.parse_recipe_info(dish_name, cuisine_type, html)
             
         except Exception as e:
             print(f"Error processing {dish_name}: {str(e)}")
             return None
 
+    async def search_recipe_info_async(self, dish_name: str, cuisine_type: str, fetch) -> Dict:
+        """search_recipe_info with an AsyncScraper fetch; errors are raised"""
+        try:
+            html = await fetch(self.baike_url(dish_name))
+        except aiohttp.ClientResponseError as e:
+            if e.status != 404:
+                raise
+            html = None  # No Baike page for the dish, as in search_recipe_info
+        return self.parse_recipe_info(dish_name, cuisine_type, html)
+
     def _extract_basic_info(self, soup: BeautifulSoup, recipe_info: Dict):
         """Extract basic information from Baidu Baike"""
         # Description
@@ -67,7 +106,7 @@ class BaiduRecipeScraper:
     def _extract_recipe_details(self, soup: BeautifulSoup, recipe_info: Dict):
         """Extract recipe-specific details from Baidu Baike"""
         # Ingredients
-        ingredients_section = soup.find(text=re.compile('主料|配料|材料'))
+        ingredients_section = soup.find(string=re.compile('主料|配料|材料'))
         if ingredients_section:
             parent = ingredients_section.find_parent('div')
             if parent:
@@ -77,14 +116,24 @@ class BaiduRecipeScraper:
         
         # Cooking steps - updated to handle numbered steps
         steps = []
-        # Look for sections containing cooking steps
-        for section in soup.find_all(['div', 'ol']):
-            text = section.get_text()
-            if any(keyword in text for keyword in ['菜品制作', '制作方法', '做法']):
-                # Find numbered steps
-                step_matches = re.findall(r'[步骤]?\d+[.、．]+(.*?)(?=\d+[.、．]|$)', text)
-                if step_matches:
-                    steps.extend([self.clean_text(step) for step in step_matches if step.strip()])
+        keywords = ['菜品制作', '制作方法', '做法']
+        # Look for sections containing cooking steps. Every section around
+        # one also contains its keyword, so only the innermost is read
+        sections = soup.find_all(['div', 'ol'])
+        if self.html_backend == 'bs4':
+            texts = {id(section): section.get_text() for section in sections}
+            sections = innermost_sections(sections, keywords, lambda section, keyword: keyword in texts[id(section)])
+            section_texts = [texts[id(section)] for section in sections]
+        else:
+            # Nested sections share text, so it is indexed once instead of per section
+            spans = TextSpans(soup)
+            sections = innermost_sections(sections, keywords, spans.contains)
+            section_texts = [spans.get_text(section) for section in sections]
+        for text in section_texts:
+            # Find numbered steps
+            step_matches = re.findall(r'[步骤]?\d+[.、．]+(.*?)(?=\d+[.、．]|$)', text)
+            if step_matches:
+                steps.extend([self.clean_text(step) for step in step_matches if step.strip()])
         
         if steps:
             recipe_info['steps'] = steps
@@ -92,7 +141,7 @@ class BaiduRecipeScraper:
     def _extract_meishi_info(self, url: str, recipe_info: Dict):
         """Extract additional recipe information from Baidu Meishi"""
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self.http.get(url, headers=self.headers)
             response.encoding = 'utf-8'
             
             if response.status_code == 200:
@@ -132,15 +181,108 @@ class BaiduRecipeScraper:
         return text.strip()
 
     def store_recipe(self, recipe_info: Dict):
-        """Store recipe information in both database and JSON"""
+        """Store recipe information in memory and the journal"""
         # Store in memory dictionary
         self.all_recipes[recipe_info['dish_name']] = recipe_info
         
-        # Save to single JSON file
-        with open('./baidu_recipe_db/all_recipes.json', 'w', encoding='utf-8') as f:
-            json.dump(self.all_recipes, f, ensure_ascii=False, indent=2)
+        # Append to the journal; save_recipes() consolidates it into the JSON file
+        self.journal.put(recipe_info)
+
+    def save_recipes(self):
+        """Write all_recipes.json from memory and empty the journal"""
+        self.journal.compact(self.all_recipes)
+
+    def load_recipes(self) -> Dict[str, Optional[str]]:
+        """Load all_recipes.json and its journal into memory and return each dish's
+        timestamp. Entries written before timestamps were recorded get the file's mtime."""
+        self.all_recipes = replay_recipes(RECIPES_PATH, self.journal.journal_path)
+        if not self.all_recipes:
+            return {}
+        source = RECIPES_PATH if os.path.exists(RECIPES_PATH) else self.journal.journal_path
+        file_time = datetime.fromtimestamp(os.path.getmtime(source)).isoformat()
+        return {dish: info.get('timestamp') or file_time for dish, info in self.all_recipes.items()}
+
+    def refresh_recipes(self,
+                        dishes_by_cuisine: Dict[str, List[str]],
+                        ttl_days: float = DEFAULT_TTL_DAYS,
+                        prune: bool = False,
+                        summary_path: Optional[str] = None) -> Dict:
+        """Scrape only dishes that are missing or older than ttl_days.
+        A dish whose scrape fails or finds nothing keeps its stored entry."""
+        stored = self.load_recipes()
+        plan = plan_refresh(dishes_by_cuisine, stored, ttl_days)
+        summary = new_summary('baidu', plan, ttl_days)
+
+        todo = plan['missing'] + plan['stale']
+        print(f"{len(todo)} dishes to scrape ({len(plan['missing'])} missing, {len(plan['stale'])} stale), "
+              f"{len(plan['fresh'])} fresh, {len(plan['removed'])} no longer requested")
+        for i, (cuisine_type, dish) in enumerate(todo):
+            print(f"\n[{i + 1}/{len(todo)}] Refreshing: {dish}")
+            recipe_info = self.search_recipe_info(dish, cuisine_type)
+            if not recipe_info or not (recipe_info['description'] or recipe_info['ingredients'] or recipe_info['steps']):
+                summary['failed'].append(dish)
+                print(f"✗ Nothing scraped for {dish}, keeping stored entry")
+            else:
+                old = self.all_recipes.get(dish)
+                self.store_recipe(recipe_info)
+                summary['documents_written'] += 1
+                if old is None:
+                    summary['added'].append(dish)
+                elif {k: v for k, v in old.items() if k != 'timestamp'} != \
+                        {k: v for k, v in recipe_info.items() if k != 'timestamp'}:
+                    summary['updated'].append(dish)
+                else:
+                    summary['unchanged'].append(dish)
+            if i < len(todo) - 1:
+                self.http.pause(2)  # Be nice to Baidu's servers
+
+        if prune:
+            for dish in plan['removed']:
+                del self.all_recipes[dish]
+                self.journal.delete(dish)
+                summary['removed'].append(dish)
+                summary['documents_deleted'] += 1
+        self.save_recipes()
+        return finish_summary(summary, summary_path)
+
+    def scrape_queue(self, queue: WorkQueue, engine: Optional[AsyncScraper] = None):
+        """Scrape the dishes of a work queue until it has nothing left for this
+        process. A dish is done once its recipe is fsynced to the journal, so an
+        interrupted run resumes where it stopped, and several processes can
+        share the queue. The journal is compacted once the queue is drained."""
+        def store(item: WorkItem, recipe_info: Optional[Dict]):
+            if recipe_info is None:
+                raise NothingScraped(f"Failed to retrieve recipe for {item.dish}")
+            self.store_recipe(recipe_info)
+            self.journal.sync()
+            print(f"✓ Successfully stored recipe for {item.dish}")
+
+        if engine is None:
+            process_queue(queue,
+                          lambda item: store(item, self.search_recipe_info(item.dish, item.cuisine_type)),
+                          pause=lambda: self.http.pause(2))  # Be nice to Baidu's servers
+        else:
+            process_queue_async(queue, engine,
+                                lambda item, fetch: self.search_recipe_info_async(item.dish, item.cuisine_type, fetch),
+                                store)
+        if queue.is_drained():
+            self.journal.compact()
+        queue.print_summary()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape Baidu Baike pages of the dishes into all_recipes.json")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only scrape dishes that are missing or older than --ttl_days")
+    parser.add_argument("--ttl_days", type=float, default=DEFAULT_TTL_DAYS)
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete stored dishes that are no longer in dishes_by_cuisine")
+    parser.add_argument("--summary", default="refresh_summary_baidu.json")
+    add_engine_args(parser, rate=0.5)
+    add_cache_args(parser)
+    parser.add_argument("--html_backend", choices=sorted(HTML_BACKENDS), default=DEFAULT_HTML_BACKEND)
+    add_queue_args(parser)
+    args = parser.parse_args()
+
     dishes_by_cuisine = {
         "新疆菜": [
             "烤羊肉串", "馕", "羊肉抓饭", "过油肉拌面", "菠菜面",
@@ -182,33 +324,13 @@ if __name__ == "__main__":
         "内蒙菜": ["内蒙烤全羊"]
     }
     
-    scraper = BaiduRecipeScraper()
-    
-    # Track progress
-    total_recipes = sum(len(dishes) for dishes in dishes_by_cuisine.values())
-    processed = 0
-    failed = []
-    
-    for cuisine_type, dishes in dishes_by_cuisine.items():
-        print(f"\nProcessing {cuisine_type}...")
-        for dish in dishes:
-            processed += 1
-            print(f"[{processed}/{total_recipes}] Processing: {dish}")
-            recipe_info = scraper.search_recipe_info(dish, cuisine_type)
-            if recipe_info:
-                scraper.store_recipe(recipe_info)
-                print(f"✓ Successfully stored recipe for {dish}")
-            else:
-                failed.append((cuisine_type, dish))
-                print(f"✗ Failed to retrieve recipe for {dish}")
-            time.sleep(2)  # Be nice to Baidu's servers
+    scraper = BaiduRecipeScraper(http=cache_from_args(args), html_backend=args.html_backend)
+    if args.incremental:
+        scraper.refresh_recipes(dishes_by_cuisine, ttl_days=args.ttl_days,
+                                prune=args.prune, summary_path=args.summary)
+        scraper.http.print_stats()
+        sys.exit(0)
     
-    # Print summary
-    print("\n=== Scraping Summary ===")
-    print(f"Total recipes attempted: {total_recipes}")
-    print(f"Successfully scraped: {total_recipes - len(failed)}")
-    print(f"Failed: {len(failed)}")
-    if failed:
-        print("\nFailed recipes:")
-        for cuisine, dish in failed:
-            print(f"- {dish} ({cuisine})")
\ No newline at end of file
+    queue, _ = queue_from_args(args, 'baidu', dish_jobs(dishes_by_cuisine))
+    scraper.scrape_queue(queue, engine=engine_from_args(args, headers=scraper.headers, cache=scraper.http))
+    scraper.http.print_stats()
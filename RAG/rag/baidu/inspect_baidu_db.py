@@ -1,10 +1,10 @@
-from recipe_db import LocalRecipeDB
+from recipe_db import get_recipe_db
 import json
 from typing import Dict, List
 
 class BaiduInspector:
     def __init__(self):
-        self.db = LocalRecipeDB("./baidu_recipe_db")
+        self.db = get_recipe_db("./baidu_recipe_db")
         self.patterns = {
             'cuisine_type': {
                 'keywords': ['菜系', '传统', '起源'],
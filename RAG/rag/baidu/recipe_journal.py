@@ -0,0 +1,132 @@
+import json
+import os
+from typing import Dict, Iterator, List, Optional
+
+# Journal records per fsync
+DEFAULT_SYNC_EVERY = 16
+
+
+def journal_path_for(snapshot_path: str) -> str:
+    """all_recipes.json -> all_recipes.journal.jsonl"""
+    return os.path.splitext(snapshot_path)[0] + ".journal.jsonl"
+
+def read_journal(journal_path: str) -> Iterator[Dict]:
+    """Records of a journal in write order. A torn last line (a crash
+    mid-write) is skipped."""
+    if not os.path.exists(journal_path):
+        return
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                return
+            if line.strip():
+                yield json.loads(line)
+
+def apply_record(recipes: Dict[str, Dict], record: Dict):
+    if record["op"] == "put":
+        recipes[record["dish"]] = record["recipe"]
+    elif record["op"] == "delete":
+        recipes.pop(record["dish"], None)
+
+def replay_recipes(snapshot_path: str, journal_path: Optional[str] = None) -> Dict[str, Dict]:
+    """The recipes of a snapshot with its journal replayed on top"""
+    recipes = {}
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            recipes = json.load(f)
+    for record in read_journal(journal_path or journal_path_for(snapshot_path)):
+        apply_record(recipes, record)
+    return recipes
+
+
+class RecipeJournal:
+    """Append-only JSONL journal of recipe writes next to all_recipes.json.
+
+    put() and delete() append one compact JSON line each, so storing a
+    recipe costs its own size instead of a rewrite of the whole file.
+    Lines are written and fsynced every sync_every records (and by sync()
+    and close()), so a crash loses at most one batch. compact() writes the
+    consolidated snapshot (all_recipes.json, in its usual format)
+    atomically and empties the journal; readers use replay_recipes() or
+    baidu_kb, which apply the journal on top of the snapshot.
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: Optional[str] = None,
+                 sync_every: int = DEFAULT_SYNC_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or journal_path_for(snapshot_path)
+        self.sync_every = sync_every
+        self._pending: List[str] = []
+        self._file = None
+        self.bytes_written = 0
+
+    def _open(self):
+        if self._file is None:
+            self._drop_torn_tail()
+            self._file = open(self.journal_path, "ab")
+        return self._file
+
+    def _drop_torn_tail(self):
+        """Cut a partial last line left by a crash so new records start on a line"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+
+    def _append(self, record: Dict):
+        self._pending.append(json.dumps(record, ensure_ascii=False) + "\n")
+        if len(self._pending) >= self.sync_every:
+            self.sync()
+
+    def put(self, recipe: Dict):
+        self._append({"op": "put", "dish": recipe["dish_name"], "recipe": recipe})
+
+    def delete(self, dish_name: str):
+        self._append({"op": "delete", "dish": dish_name})
+
+    def sync(self):
+        """Write and fsync the pending records"""
+        if not self._pending:
+            return
+        data = "".join(self._pending).encode("utf-8")
+        f = self._open()
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+        self.bytes_written += len(data)
+        self._pending = []
+
+    def close(self):
+        self.sync()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def compact(self, recipes: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict]:
+        """Write the consolidated snapshot and empty the journal.
+
+        recipes defaults to the snapshot with the journal replayed. If the
+        process dies between the snapshot and the truncation, replaying the
+        journal again gives the same recipes.
+        """
+        self.close()
+        if recipes is None:
+            recipes = replay_recipes(self.snapshot_path, self.journal_path)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(recipes, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "wb"):
+                pass
+        return recipes
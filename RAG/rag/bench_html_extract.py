@@ -0,0 +1,145 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from yarl import URL
+
+RAG_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, RAG_DIR)
+sys.path.insert(0, os.path.join(RAG_DIR, "xiachufang"))
+sys.path.insert(0, os.path.join(RAG_DIR, "baidu"))
+from html_extract import available_backends
+from http_cache import DEFAULT_CACHE_DIR, HttpCache
+from baidu_recipe_scraper import BaiduRecipeScraper
+from recipe_scraper import extract_page_text
+
+BAIDU_HOST = "baike.baidu.com"
+XIACHUFANG_HOST = "m.xiachufang.com"
+
+
+def load_corpus(cache_dir: str, pages_dir: str = None) -> List[Tuple[str, str, str]]:
+    """(kind, url, html) of every saved Baike page and Xiachufang recipe page:
+    the HTTP cache plus, optionally, pages recorded with --record_dir"""
+    pages = []
+
+    def add(url: str, html: str):
+        url = URL(url)
+        if url.host == BAIDU_HOST:
+            pages.append(("baidu", str(url), html))
+        elif url.host == XIACHUFANG_HOST and not url.path.startswith("/search"):
+            pages.append(("xiachufang", str(url), html))
+
+    if cache_dir and os.path.isdir(cache_dir):
+        cache = HttpCache(cache_dir, offline=True)
+        for entry in cache.entries():
+            add(entry["url"], cache.text(entry))
+    if pages_dir:
+        for host in os.listdir(pages_dir):
+            for name in sorted(os.listdir(os.path.join(pages_dir, host))):
+                with open(os.path.join(pages_dir, host, name), "r", encoding="utf-8") as f:
+                    add(f"https://{host}/{name}", f.read())
+    return pages
+
+def synthetic_corpus(n_pages: int, depth: int, seed: int = 0) -> List[Tuple[str, str, str]]:
+    """Baike- and Xiachufang-like pages with depth nested divs around the
+    content, the shape that makes per-element get_text() quadratic"""
+    rng = random.Random(seed)
+    words = ["猪肉", "辣椒", "花椒", "酱油", "葱姜", "翻炒", "小火", "收汁", "鲜香", "麻辣"]
+    pages = []
+    for i in range(n_pages):
+        sentences = ["".join(rng.choice(words) for _ in range(8)) + "。" for _ in range(40)]
+        steps = "".join(f"{j}. {sentence}" for j, sentence in enumerate(sentences[:8], 1))
+        body = (f"<div class='lemma-summary'>{sentences[0]}</div>"
+                f"<div class='para-title'><h2>历史</h2></div><div class='para'>{sentences[1]}</div>"
+                f"<div>主料：{'，'.join(words[:5])}</div>"
+                f"<div><h3>制作方法</h3><ol>{steps}</ol></div>"
+                + "".join(f"<p>{sentence}</p><!-- ad --><script>var x = {j};</script>"
+                          for j, sentence in enumerate(sentences[8:])))
+        for _ in range(depth):
+            body = f"<div class='wrap'>{body}<li>{rng.choice(words)}</li></div>"
+        html = f"<html><head><title>菜{i}</title></head><body><h1>菜{i}</h1>{body}</body></html>"
+        pages.append(("baidu", f"https://{BAIDU_HOST}/item/{i}", html))
+        pages.append(("xiachufang", f"https://{XIACHUFANG_HOST}/recipe/{i}/", html))
+    return pages
+
+def extractors(backend: str, baidu: BaiduRecipeScraper) -> Dict[str, Callable[[str], object]]:
+    def baidu_extract(html: str):
+        baidu.html_backend = backend
+        info = baidu.parse_recipe_info("dish", "cuisine", html)
+        info.pop("timestamp")
+        return info
+
+    return {
+        "baidu": baidu_extract,
+        "xiachufang": lambda html: extract_page_text(html, backend),
+    }
+
+def run_backend(backend: str, pages: List[Tuple[str, str, str]], baidu: BaiduRecipeScraper):
+    """Outputs (or raised errors) per page and seconds per page kind"""
+    extract = extractors(backend, baidu)
+    outputs, seconds = [], {}
+    for kind, _, html in pages:
+        start = time.perf_counter()
+        try:
+            output = extract[kind](html)
+        except Exception as e:  # the reference raises on some pages; parity covers that too
+            output = f"{type(e).__name__}: {e}"
+        seconds[kind] = seconds.get(kind, 0.0) + time.perf_counter() - start
+        outputs.append(output)
+    return outputs, seconds
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the HTML extraction backends against the original "
+                                                 "BeautifulSoup extraction and measure pages/sec")
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR, help="HTTP cache to take saved pages from")
+    parser.add_argument("--pages_dir", default=None, help="Pages recorded with --record_dir")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Use this many generated pages of each kind instead")
+    parser.add_argument("--depth", type=int, default=30, help="Nesting depth of the generated pages")
+    parser.add_argument("--backends", nargs="+", default=None)
+    parser.add_argument("--show_mismatches", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        pages = synthetic_corpus(args.synthetic, args.depth)
+    else:
+        pages = load_corpus(args.cache_dir, args.pages_dir)
+    if not pages:
+        print("No saved Baike or Xiachufang pages; scrape with the HTTP cache on, or pass --synthetic N")
+        return
+    kinds = sorted({kind for kind, _, _ in pages})
+    counts = {kind: sum(1 for k, _, _ in pages if k == kind) for kind in kinds}
+    print(f"{len(pages)} pages: " + ", ".join(f"{counts[kind]} {kind}" for kind in kinds))
+
+    backends = args.backends or available_backends()
+    if "bs4" not in backends:
+        backends = ["bs4"] + backends
+    # The Baidu scraper keeps its database in ./baidu_recipe_db; keep it out of the way
+    with tempfile.TemporaryDirectory() as scratch:
+        cwd = os.getcwd()
+        os.chdir(scratch)
+        try:
+            baidu = BaiduRecipeScraper(http=HttpCache(None))
+            results = {backend: run_backend(backend, pages, baidu) for backend in backends}
+        finally:
+            os.chdir(cwd)
+
+    reference, reference_seconds = results["bs4"]
+    print(f"\n{'backend':<8} " + " ".join(f"{kind + ' pages/s':>18}" for kind in kinds)
+          + f" {'speedup':>8} {'parity':>12}")
+    for backend in backends:
+        outputs, seconds = results[backend]
+        same = sum(1 for output, expected in zip(outputs, reference) if output == expected)
+        speedup = sum(reference_seconds.values()) / max(sum(seconds.values()), 1e-9)
+        print(f"{backend:<8} " + " ".join(f"{counts[kind] / max(seconds[kind], 1e-9):>18.1f}" for kind in kinds)
+              + f" {speedup:>7.1f}x {same:>5}/{len(pages):<6}")
+        mismatches = [url for (_, url, _), output, expected in zip(pages, outputs, reference) if output != expected]
+        for url in mismatches[:args.show_mismatches]:
+            print(f"    differs from bs4: {url}")
+
+if __name__ == "__main__":
+    main()
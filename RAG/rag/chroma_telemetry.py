@@ -0,0 +1,16 @@
+from chromadb.telemetry.product import ProductTelemetryClient, ProductTelemetryEvent
+from overrides import override
+
+
+class NoProductTelemetry(ProductTelemetryClient):
+    """Product telemetry client that drops every event.
+
+    Chroma's default client batches events in a plain dict with no lock, so
+    concurrent queries on one client fail at random with a KeyError, even
+    with anonymized_telemetry off. Selected through Settings by module path
+    (see recipe_db.BACKENDS).
+    """
+
+    @override
+    def capture(self, event: ProductTelemetryEvent) -> None:
+        pass
@@ -0,0 +1,124 @@
+import os
+import re
+import sys
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from embedding_cache import LRUCache
+
+# A sentence ends after terminal punctuation (Chinese or Western) or a line
+# break, and takes the whitespace that follows it
+_SENTENCE_END = re.compile(r'(?:[。！？；!?;]+|\.(?=\s)|\n)\s*')
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of a text; joined back together they give the text unchanged"""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        if match.end() > start:
+            sentences.append(text[start:match.end()])
+            start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+class ContextPacker:
+    """Fits retrieved snippets into a token budget of the model's tokenizer.
+
+    Snippets are taken highest score first. One that does not fit whole is
+    cut at the last sentence boundary that fits, and one whose first
+    sentence does not fit is skipped, so the prompt never holds half a
+    sentence. Token counts of each snippet's sentences are cached by
+    content, so a dish retrieved again is not tokenized again.
+
+    ``tokenizer`` is a Hugging Face tokenizer or processor (its .tokenizer is
+    used), or any object with ``encode(text)``.
+    """
+
+    def __init__(self,
+                 tokenizer,
+                 max_tokens: int = 512,
+                 header: str = "",
+                 separator: str = "\n\n",
+                 cache_size: int = 4096):
+        self.tokenizer = getattr(tokenizer, "tokenizer", tokenizer)
+        self.max_tokens = max_tokens
+        self.header = header
+        self.separator = separator
+        self._profiles = LRUCache(cache_size)
+        self._header_tokens = self.count_tokens(header) if header else 0
+        self._separator_tokens = self.count_tokens(separator) if separator else 0
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        if hasattr(self.tokenizer, "batch_encode_plus"):
+            # One batched call of a Hugging Face tokenizer
+            encoded = self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+            return [len(ids) for ids in encoded]
+        return [len(self.tokenizer.encode(text)) for text in texts]
+
+    def count_tokens(self, text: str) -> int:
+        return self._token_lengths([text])[0] if text else 0
+
+    def _profile(self, text: str):
+        """(sentences, cumulative token counts) of a snippet, cached"""
+        profile = self._profiles.get(text)
+        if profile is None:
+            sentences = split_sentences(text)
+            profile = (sentences, list(accumulate(self._token_lengths(sentences))))
+            self._profiles.put(text, profile)
+        return profile
+
+    def _join(self, chosen: List[tuple]) -> str:
+        return self.separator.join(self.header + ''.join(sentences[:take]).rstrip()
+                                   for sentences, take in chosen)
+
+    def pack_texts(self, texts: List[str], scores: Optional[List[float]] = None) -> str:
+        """Context of the snippets that fit the budget, highest score first.
+
+        Without scores the snippets are taken in the given order.
+        """
+        order = list(range(len(texts)))
+        if scores is not None:
+            order.sort(key=lambda i: -scores[i])
+
+        chosen = []
+        remaining = self.max_tokens
+        for i in order:
+            text = (texts[i] or "").strip()
+            if not text:
+                continue
+            overhead = self._header_tokens + (self._separator_tokens if chosen else 0)
+            sentences, cumulative = self._profile(text)
+            take = bisect_right(cumulative, remaining - overhead)
+            if take == 0:
+                continue
+            chosen.append((sentences, take))
+            remaining -= overhead + cumulative[take - 1]
+
+        context = self._join(chosen)
+        # Tokens can merge across the joins, so the sum of the parts is only
+        # close to the count of the whole; trim sentences until that fits too
+        while chosen and self.count_tokens(context) > self.max_tokens:
+            sentences, take = chosen[-1]
+            if take > 1:
+                chosen[-1] = (sentences, take - 1)
+            else:
+                chosen.pop()
+            context = self._join(chosen)
+        return context
+
+    def pack(self, results: List[Dict]) -> str:
+        """Context of search results, each with 'content' and optionally 'score'"""
+        scores = None
+        if results and all('score' in result for result in results):
+            scores = [result['score'] for result in results]
+        return self.pack_texts([result['content'] for result in results], scores)
+
+    def cache_stats(self) -> Dict:
+        return self._profiles.stats()
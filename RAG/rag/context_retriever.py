@@ -0,0 +1,90 @@
+import os
+import sys
+from typing import Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "wikipedia"))
+from aspect_extractor import QUESTION_TYPE_ASPECTS
+
+# Heading put before each retrieved document
+CONTEXT_HEADER = "相关信息 (Related Information):\n"
+
+
+def split_context(context: str) -> List[str]:
+    """The documents of a context built by format_context, in order"""
+    return [part.strip() for part in context.split(CONTEXT_HEADER) if part.strip()]
+
+
+class RecipeContextRetriever:
+    """Question -> recipe context retrieval used by FoodieQARAG.
+
+    Kept free of model imports so that contexts can also be computed ahead of
+    time (see model-eval/scripts/materialize_contexts.py). With a
+    ContextPacker the context is cut to its token budget.
+
+    When the store has chunks, the context is the best chunk_results chunks,
+    preferring those tagged with the question type's aspect; with
+    expand_parents it is the n_results parent documents of the best chunks.
+    Stores without chunks are searched by whole document.
+    """
+
+    def __init__(self, db, n_results: int = 2, packer=None, chunks: bool = True,
+                 chunk_results: int = 3, expand_parents: bool = False):
+        self.db = db
+        self.n_results = n_results
+        self.packer = packer
+        self.chunks = chunks
+        self.chunk_results = chunk_results
+        self.expand_parents = expand_parents
+        self._use_chunks = None
+
+    def search_query(self, question: Dict) -> str:
+        """Search query for a question: the dish name plus type-specific terms.
+
+        The hybrid search matches the dish name lexically, so one query
+        replaces the separate dish-name and type-specific queries.
+        """
+        # Extract dish name and question type
+        dish_name = question.get('food_name', '')
+        question_type = question.get('question_type', '')
+        
+        # Construct search query based on question type
+        if question_type == "cuisine_type":
+            return f"{dish_name} cuisine origin traditional"
+        elif question_type == "flavor":
+            return f"{dish_name} taste flavor characteristics"
+        elif question_type == "cooking-skills":
+            return f"{dish_name} cooking preparation method"
+        elif question_type == "region-2":
+            return f"{dish_name} regional origin location"
+        return dish_name
+
+    def format_context(self, results: List[Dict]) -> str:
+        if self.packer is not None:
+            return self.packer.pack(results)
+        context = ""
+        for result in results:
+            context += f"\n{CONTEXT_HEADER}{result['content']}\n"
+        return context.strip()
+
+    def use_chunks(self) -> bool:
+        if self._use_chunks is None:
+            self._use_chunks = self.chunks and self.db.has_chunks()
+        return self._use_chunks
+
+    def retrieve(self, question: Dict) -> str:
+        """Retrieve relevant context based on the question"""
+        return self.retrieve_bulk([question])[0]
+
+    def retrieve_bulk(self, questions: List[Dict]) -> List[str]:
+        """Retrieve the context of many questions in a few bulk searches"""
+        queries = [self.search_query(question) for question in questions]
+        if self.use_chunks():
+            aspects = [QUESTION_TYPE_ASPECTS.get(question.get('question_type', '')) for question in questions]
+            all_results = self.db.search_chunks_bulk(
+                queries,
+                n_results=self.n_results if self.expand_parents else self.chunk_results,
+                aspects=aspects,
+                expand_parents=self.expand_parents)
+        else:
+            all_results = self.db.search_bulk(queries, n_results=self.n_results)
+        return [self.format_context(results) for results in all_results]
@@ -0,0 +1,102 @@
+# Chinese dish names and the English names and romanizations they go by.
+# Used to search Wikipedia and, through dish_resolver.py, to map predicted
+# dish names to knowledge base keys.
+DISH_TRANSLATIONS = {
+    # Xinjiang cuisine
+    "烤羊肉串": ["Chunar", "Chinese lamb skewers", "Xinjiang kebab", "Yang rou chuan"],
+    "馕": ["Nang bread", "Uyghur naan", "Xinjiang naan"],
+    "羊肉抓饭": ["Uyghur polo", "Xinjiang pilaf", "Lamb pilaf"],
+    "过油肉拌面": ["Yourou banmian", "Oil-mixed noodles with meat", "pulled noodles with fried lamb and vegetables", "Uyghur Laghman"],
+    "菠菜面": ["Spinach noodles", "Xinjiang spinach noodles"],
+    "拉条子": ["Latiaozi", "Hand-pulled noodles", "Laghman"],
+    "大盘鸡": ["Dapanji", "Big plate chicken"],
+    "干煸炒面": ["Ganbian chaomian", "Dry-fried noodles"],
+    "新疆架子肉": ["Jiazi meat", "Xinjiang rack of lamb"], # no related link
+    "丁丁炒面": ["Dingding chaomian", "Chopped noodles"], # no related link
+
+    # Sichuan cuisine
+    "辣子鸡丁": ["Laziji", "Chongqing Chicken", "Sichuan spicy diced chicken"],
+    "青椒肉丝": ["Qingjiao rousi", "Shredded pork with green peppers"], 
+    "啤酒鸭": ["Beer duck", "Pijiu ya"], # no related page
+    "水煮肉片": ["Shuizhu beef", "Water-boiled beef"],
+    "四川火锅": ["Sichuan hotpot", "Sichuan huoguo"],
+    "宫保鸡丁": ["Kung Pao chicken", "Gongbao chicken"],
+    "酸菜鱼": ["Fish with pickled mustard greens"],
+    "辣椒炒肉": ["Stir-fried pork with chili"], # no related page
+    "麻辣烫": ["Malatang"],
+    "毛血旺": ["Mao xue wang"],
+    "冒菜": ["Maocai", "Boiled meat in spicy soup"],
+    "口水鸡": ["Mouth-watering chicken", "Saliva chicken", "Kou shui ji"], # no related link        
+    "回锅肉": ["Twice-cooked pork", "Hui guo rou"],
+    "四川冰粉": ["bingfen"],
+    "重庆火锅": ["Chongqing hotpot"],
+
+    # Northwest cuisine
+    "水煮鱼": ["Shuizhu"],
+    "米皮": ["Liangpi", "Rice skin noodles"],
+    "酿皮": ["Liangpi", "Niang pi", "Cold skin noodles"], 
+    "糖醋丸子": ["Sweet and sour meatballs"], # no related page 
+    "酱牛肉": ["Braised beef", "Jiang niu rou"], # no related page
+    "手抓羊肉": ["Hand-pulled lamb", "Shou zhua yang rou"], # no related page
+    "猪皮冻": ["Pork jelly", "Pork skin jelly"],
+    "面皮/凉皮": ["Liang pi", "Cold rice noodles"],
+
+    # Guizhou cuisine
+    "凯里酸汤鱼": ["Sour soup fish"],
+    "豆腐圆子": ["Tofu balls", "Doufu yuanzi"], # no related page
+    "荷叶粉蒸肉": ["Lotus leaf steamed pork"], # no related page
+    "水城烙锅": ["Shuicheng lao guo", "Water town pot"], # no related page
+    "辣子鸡": ["laziji", "Spicy chicken"],
+    "丝娃娃": ["Si wa wa", "Guizhou lettuce wraps"],
+
+    # Jiangsu cuisine
+    "毛式红烧肉": ["Mao-style red braised pork"],
+    "盐水鸭": ["Nanjing salted duck"],
+    "无锡小笼包": ["Wuxi xiaolongbao", "Wuxi soup dumplings"],
+    "松鼠鱼": ["Squirrel fish", "Song shu yu"],
+    "青团": ["Qingtuan", "Green rice balls"],
+    "太湖银鱼": ["Lake Tai silverfish"], # no related page
+    "响油鳝糊": ["Crispy eel paste"], # no related page
+    "阳春面": ["Yang chun noodles"],
+    "蟹黄汤包": ["Crab roe soup dumplings"], # no related page
+
+    # Cantonese cuisine
+    "鸡蛋肠粉": ["Egg cheung fun", "Rice noodle rolls with egg"],
+    "红米肠粉": ["Red rice cheung fun"], # no related page
+    "叉烧包": ["Char siu bao", "BBQ pork bun"],
+    "黑椒牛仔骨": ["Black pepper short ribs"], # no related page
+    "虾饺": ["Har gow", "Shrimp dumplings"],
+    "煲仔饭": ["Claypot rice", "Bo zai fan"],
+    "咖喱牛腩牛筋面": ["Curry beef brisket noodles"], # no related page
+    "鱼丸粉": ["Fish ball", "Fish ball noodles"],
+    "脆皮烧鹅": ["Roast goose"], #
+    "清蒸鲈鱼": ["Steamed bass"], # no related page
+    "干炒牛河": ["Beef chow fun"],
+    "陈皮牛肉丸": ["Steamed meatballs", "chenpi", "Dried tangerine peel beef balls"], # added steamed meatballs, chenpi, no related page
+
+    # Other regional cuisines
+    "臭鳜鱼": ["Stinky mandarin fish"], # no related page
+    "猪血丸子": ["Pork blood balls"], # no related page
+    "剁椒鱼头": ["Chopped chili fish head"], # no related page
+    "桂花糖藕": ["Osmanthus lotus root"], # no related food
+    "梅菜扣肉": ["Mei cai kou rou", "Preserved vegetable pork"], # no related page
+    "红烧牛肉": ["Red braised beef"], # no related page
+    "荔枝肉": ["Lychee pork"],
+    "姜母鸭": ["Ginger mother duck"], # no related page
+    "同安封肉": ["Tong'an wrapped pork"], 
+    "白切鸡": ["White cut chicken", "Bai qie ji"],
+    "西湖醋鱼": ["West Lake vinegar fish"],
+    "黄鱼烧年糕": ["Yellow croaker with rice cakes"], # no related pages
+    "龙井虾仁": ["Longjing shrimp", "Dragon well shrimp"],
+    "扬州炒饭": ["Yangzhou fried rice"],
+    "椒麻鸡": ["Chinese Pepper chicken"], # no related page
+    "油爆虾": ["chili shrimp", "Deep-fried prawns"],
+    "锅包肉": ["Guo bao rou", "Northeastern sweet and sour pork"],
+    "拉皮": ["Liangpi", "La pi", "Mung bean sheets"],
+    "大碴子粥": ["Da cha zi zhou", "Corn porridge"], # no related page
+    "内蒙烤全羊": ["Khorkhog", "Inner Mongolian whole roasted lamb"],
+    "鸭血粉丝汤": ["Duck blood vermicelli soup"],
+    "酒酿圆子": ["Tangyuan", "Rice wine sweet rice balls"], 
+    "客家酿豆腐": ["Hakka stuffed tofu"],
+    "北京烤鸭": ["Peking duck", "Beijing roast duck"]
+}
@@ -0,0 +1,185 @@
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:  # pinyin keys are skipped; the alias table has romanizations
+    lazy_pinyin = None
+
+from dish_aliases import DISH_TRANSLATIONS
+from embedding_cache import LRUCache
+
+_NOT_NAME = re.compile(r'[\W_]+')
+_CJK = re.compile('[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+
+
+def normalize_name(name: str) -> str:
+    """NFKC-folded, lowercased name without whitespace or punctuation"""
+    return _NOT_NAME.sub('', unicodedata.normalize('NFKC', name).lower())
+
+def name_ngrams(key: str, n: int = 2) -> set:
+    """Character n-grams of a normalized name, padded so short names have some"""
+    padded = f"^{key}$"
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance of a and b, or max_distance + 1 as soon as it is
+    known to be larger. Only a band of 2 * max_distance + 1 cells is filled
+    per row."""
+    too_far = max_distance + 1
+    if abs(len(a) - len(b)) > max_distance:
+        return too_far
+    if len(a) > len(b):
+        a, b = b, a
+    previous = [i if i <= max_distance else too_far for i in range(len(a) + 1)]
+    for j in range(1, len(b) + 1):
+        lo = max(1, j - max_distance)
+        hi = min(len(a), j + max_distance)
+        current = [too_far] * (len(a) + 1)
+        current[0] = j if j <= max_distance else too_far
+        for i in range(lo, hi + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[i] = min(previous[i] + 1, current[i - 1] + 1, previous[i - 1] + cost)
+        if min(current[lo - 1:hi + 1]) > max_distance:
+            return too_far
+        previous = current
+    return min(previous[len(a)], too_far)
+
+
+class DishResolver:
+    """Maps free-form dish names to canonical dish ids (knowledge base keys).
+
+    Every canonical name, its aliases and, when pypinyin is installed, its
+    toneless pinyin are normalized into keys. A name is resolved by exact key
+    lookup first; otherwise candidates sharing character bigrams are pulled
+    from an inverted index and scored by the larger of their bigram Dice
+    coefficient and 1 - edit distance / length, with the edit distance
+    bounded to a third of the length. Keys claimed by several dishes keep
+    the dish whose own name it is, else the first one added.
+    """
+
+    def __init__(self,
+                 aliases: Optional[Dict[str, List[str]]] = None,
+                 ngram_size: int = 2,
+                 min_score: float = 0.6,
+                 max_candidates: int = 32,
+                 cache_size: int = 4096):
+        self.ngram_size = ngram_size
+        self.min_score = min_score
+        self.max_candidates = max_candidates
+        self._keys: List[str] = []
+        self._key_dish: List[str] = []
+        self._key_grams: List[int] = []
+        self._exact: Dict[str, int] = {}
+        self._own_name: set = set()
+        self._postings: Dict[str, List[int]] = {}
+        self._dishes: List[str] = []
+        self._cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self.add_aliases(DISH_TRANSLATIONS if aliases is None else aliases)
+
+    def _add_key(self, name: str, dish: str, own: bool):
+        key = normalize_name(name)
+        if not key:
+            return
+        if key in self._exact:
+            # A dish's own name beats an alias another dish claimed first
+            if own and key not in self._own_name:
+                self._key_dish[self._exact[key]] = dish
+                self._own_name.add(key)
+            return
+        index = len(self._keys)
+        grams = name_ngrams(key, self.ngram_size)
+        self._keys.append(key)
+        self._key_dish.append(dish)
+        self._key_grams.append(len(grams))
+        self._exact[key] = index
+        if own:
+            self._own_name.add(key)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(index)
+
+    def add(self, dish: str, aliases: Iterable[str] = ()):
+        """Register a canonical dish name and the other names it goes by"""
+        with self._lock:
+            if dish not in self._dishes:
+                self._dishes.append(dish)
+            self._add_key(dish, dish, own=True)
+            if lazy_pinyin is not None and _CJK.search(dish):
+                self._add_key(''.join(lazy_pinyin(dish)), dish, own=False)
+            for alias in aliases:
+                self._add_key(alias, dish, own=False)
+            self._cache.clear()
+
+    def add_aliases(self, aliases: Dict[str, List[str]]):
+        """Register a {dish: [aliases]} table; "面皮/凉皮" style keys are two dishes"""
+        for names, dish_aliases in aliases.items():
+            for dish in names.split('/'):
+                if dish.strip():
+                    self.add(dish.strip(), dish_aliases)
+
+    def add_names(self, dishes: Iterable[str]):
+        """Register dish names without aliases, e.g. the keys of a knowledge base"""
+        for dish in dishes:
+            if dish.strip():
+                self.add(dish.strip())
+
+    def dishes(self) -> List[str]:
+        return list(self._dishes)
+
+    def match(self, name: str, limit: int = 3) -> List[Tuple[str, float]]:
+        """Best (dish, score) pairs for a name, score 1.0 for an exact key"""
+        key = normalize_name(name or '')
+        if not key:
+            return []
+        if key in self._exact:
+            return [(self._key_dish[self._exact[key]], 1.0)]
+
+        grams = name_ngrams(key, self.ngram_size)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        best: Dict[str, float] = {}
+        for index, count in shared.most_common(self.max_candidates):
+            other = self._keys[index]
+            length = max(len(key), len(other))
+            max_distance = max(1, length // 3)
+            distance = bounded_edit_distance(key, other, max_distance)
+            edit_score = 1 - distance / length if distance <= max_distance else 0.0
+            dice = 2 * count / (len(grams) + self._key_grams[index])
+            score = max(edit_score, dice)
+            dish = self._key_dish[index]
+            if score >= self.min_score and score > best.get(dish, 0.0):
+                best[dish] = score
+        return sorted(best.items(), key=lambda item: -item[1])[:limit]
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Canonical dish of a name, or None when nothing is close enough"""
+        dish = self._cache.get(name, self)
+        if dish is self:
+            matches = self.match(name, limit=1)
+            dish = matches[0][0] if matches else None
+            self._cache.put(name, dish)
+        return dish
+
+    def resolve_all(self, names: Iterable[str]) -> List[str]:
+        """Each name's canonical dish, or the name itself when unresolved"""
+        return [self.resolve(name) or name for name in names]
+
+    def cache_stats(self) -> Dict:
+        return self._cache.stats()
+
+
+_default_resolver = None
+_default_lock = threading.Lock()
+
+def get_dish_resolver() -> DishResolver:
+    """Process-wide resolver over the dish alias table"""
+    global _default_resolver
+    with _default_lock:
+        if _default_resolver is None:
+            _default_resolver = DishResolver()
+        return _default_resolver
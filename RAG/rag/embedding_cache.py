@@ -0,0 +1,357 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locking on Windows
+    fcntl = None
+
+# Slot log line of a row whose entry was evicted
+TOMBSTONE = "-"
+# Rows of a new vectors file; it doubles from there as entries are added
+INITIAL_ROWS = 1024
+
+
+class LRUCache:
+    """Bounded in-memory mapping that evicts the least recently used key"""
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._data),
+            "max_size": self.max_size
+        }
+
+
+class CachedEmbeddingFunction:
+    """Persistent cache in front of a chromadb embedding function.
+
+    Vectors are keyed by sha256 of the text and stored as float32 rows of a
+    memory-mapped file, one directory per model id. The file starts small and
+    doubles when it fills, up to ``max_entries`` rows; past that the least
+    recently used vector is evicted. Slot assignments are appended to a small
+    log so a crash loses at most the rows of the batch being written.
+
+    Several processes can share a cache directory (e.g. scrapers writing to
+    the same ./recipe_db): reads take a shared and writes an exclusive
+    fcntl lock on its lock file, and each process replays the slot lines
+    other processes appended before it reads or assigns a slot. An evicted
+    slot is tombstoned in the log (and fsynced) before its row is
+    overwritten, so a crash never leaves a key pointing at another text's
+    vector.
+
+    The wrapper is itself a valid embedding function, so it can be handed
+    to ``get_or_create_collection`` in place of the wrapped one.
+    """
+
+    def __init__(self,
+                 embedding_fn,
+                 cache_dir: str,
+                 model_id: Optional[str] = None,
+                 max_entries: int = 200000):
+        self.embedding_fn = embedding_fn
+        self.model_id = model_id or getattr(embedding_fn, "MODEL_NAME", type(embedding_fn).__name__)
+        self.cache_dir = os.path.join(cache_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', self.model_id))
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._slots: "OrderedDict[str, int]" = OrderedDict()  # key -> row, LRU first
+        self._slot_keys: Dict[int, str] = {}
+        self._free: Set[int] = set()  # tombstoned rows below _next_slot
+        self._next_slot = 0
+        self._log_lines = 0
+        # How far this process has replayed slots.log, and the header line of
+        # that log (a new one is written by every compaction)
+        self._log_offset = 0
+        self._log_header = None
+        self._vectors = None
+        self.dim = None
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._meta_path = os.path.join(self.cache_dir, "meta.json")
+        self._vectors_path = os.path.join(self.cache_dir, "vectors.f32")
+        self._log_path = os.path.join(self.cache_dir, "slots.log")
+        self._lock_file = open(os.path.join(self.cache_dir, "lock"), "a+")
+        with self._locked():
+            pass
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _locked(self, exclusive: bool = False):
+        """This process's lock plus the cache directory's file lock, with the
+        slot log replayed up to date"""
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                self._sync()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _open_vectors(self):
+        """Map the vectors file at its current size"""
+        rows = os.path.getsize(self._vectors_path) // (4 * self.dim)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                  shape=(rows, self.dim))
+
+    def _reserve(self, rows: int):
+        """Make room for ``rows`` rows (under the exclusive lock, before their
+        slots are logged), doubling the file when it is full"""
+        if self._vectors.shape[0] >= rows:
+            return
+        capacity = min(self.max_entries, max(rows, 2 * self._vectors.shape[0]))
+        self._vectors.flush()
+        self._vectors = None
+        with open(self._vectors_path, "r+b") as f:
+            # Never shrink a file another process grew and then crashed
+            if os.fstat(f.fileno()).st_size < capacity * 4 * self.dim:
+                f.truncate(capacity * 4 * self.dim)
+        self._open_vectors()
+
+    def _sync(self):
+        """Open the vectors once some process has created them and replay the
+        slot lines appended since the last call"""
+        if self._vectors is None:
+            if not os.path.exists(self._meta_path):
+                return
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            # Every process sharing the file evicts at the same size
+            self.max_entries = meta["max_entries"]
+            self._open_vectors()
+        try:
+            f = open(self._log_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            header = f.readline()
+            if not header.startswith(b"#"):
+                header = b""  # a log written before logs had headers
+            elif not header.endswith(b"\n"):
+                return
+            if header != self._log_header:
+                # First replay, or the log was compacted: start from scratch
+                self._slots.clear()
+                self._slot_keys.clear()
+                self._free.clear()
+                self._next_slot = self._log_lines = 0
+                self._log_header = header
+                self._log_offset = len(header)
+            f.seek(self._log_offset)
+            data = f.read()
+        # A line without its newline is still being written (or torn by a crash)
+        data = data[:data.rfind(b"\n") + 1]
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            parts = line.split()
+            if len(parts) != 2 or not parts[1].isdigit() or len(parts[0]) not in (1, 64):
+                continue  # the remains of a torn write
+            key, slot = parts[0], int(parts[1])
+            if key == TOMBSTONE:
+                self._release(slot)
+            else:
+                self._assign(key, slot)
+            self._next_slot = max(self._next_slot, slot + 1)
+            self._log_lines += 1
+        self._log_offset += len(data)
+        # Another process grew the file before logging rows past our mapping
+        if self._vectors is not None and self._next_slot > self._vectors.shape[0]:
+            self._open_vectors()
+
+    def _assign(self, key: str, slot: int):
+        old_key = self._slot_keys.get(slot)
+        if old_key is not None:
+            self._slots.pop(old_key, None)
+        self._free.discard(slot)
+        self._slot_keys[slot] = key
+        self._slots[key] = slot
+        self._slots.move_to_end(key)
+
+    def _release(self, slot: int):
+        old_key = self._slot_keys.pop(slot, None)
+        if old_key is not None:
+            self._slots.pop(old_key, None)
+        self._free.add(slot)
+
+    @staticmethod
+    def _new_header() -> bytes:
+        return f"# {uuid.uuid4().hex}\n".encode("utf-8")
+
+    def _append_log(self, lines: List[str], fsync: bool = False):
+        """Append slot lines (under the exclusive lock, after _sync)"""
+        with open(self._log_path, "ab") as f:
+            if self._log_header is None:
+                # A new log (any bytes there are a header torn by a crash)
+                f.truncate(0)
+                self._log_header = self._new_header()
+                f.write(self._log_header)
+            elif f.tell() > self._log_offset:
+                f.write(b"\n")  # end a line torn by a crash
+            f.write("".join(lines).encode("utf-8"))
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+            self._log_offset = f.tell()
+        self._log_lines += len(lines)
+
+    def _create(self, dim: int):
+        """Create the vectors file (under the exclusive lock, when no process has)"""
+        self.dim = dim
+        with open(self._vectors_path, "wb") as f:
+            f.truncate(min(INITIAL_ROWS, self.max_entries) * 4 * dim)
+        self._open_vectors()
+        # Lines of a file whose meta.json never got written point at nothing
+        if os.path.exists(self._log_path):
+            os.remove(self._log_path)
+        self._log_offset = 0
+        self._log_header = None
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model_id": self.model_id, "dim": dim, "max_entries": self.max_entries}, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _free_slot(self) -> Tuple[int, bool]:
+        """A row for a new vector, and whether an entry was evicted for it"""
+        if self._free:
+            return self._free.pop(), False
+        if self._next_slot < self.max_entries:
+            slot = self._next_slot
+            self._next_slot += 1
+            return slot, False
+        _, slot = self._slots.popitem(last=False)
+        del self._slot_keys[slot]
+        return slot, True
+
+    def __call__(self, input):
+        texts = list(input)
+        keys = [self._key(text) for text in texts]
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        with self._locked():
+            if self._vectors is not None:
+                for i, key in enumerate(keys):
+                    slot = self._slots.get(key)
+                    if slot is not None:
+                        self._slots.move_to_end(key)
+                        embeddings[i] = np.array(self._vectors[slot])
+            hits = sum(e is not None for e in embeddings)
+            self.hits += hits
+            self.misses += len(texts) - hits
+
+        missing = OrderedDict()
+        for i, key in enumerate(keys):
+            if embeddings[i] is None:
+                missing.setdefault(key, []).append(i)
+        if not missing:
+            return embeddings
+
+        computed = self.embedding_fn([texts[idx[0]] for idx in missing.values()])
+        computed = np.asarray(computed, dtype=np.float32)
+
+        with self._locked(exclusive=True):
+            if self._vectors is None:
+                self._create(computed.shape[1])
+            new = []
+            for (key, indices), vector in zip(missing.items(), computed):
+                for i in indices:
+                    embeddings[i] = vector
+                if key not in self._slots:  # else filled by a concurrent call
+                    new.append((key, vector))
+            # Only the last max_entries of a batch would stay cached anyway
+            new = [(key, vector, *self._free_slot()) for key, vector in new[-self.max_entries:]]
+            if new:
+                self._reserve(self._next_slot)
+                # Tombstone evicted rows on disk before overwriting them
+                tombstones = [f"{TOMBSTONE} {slot}\n" for _, _, slot, evicted in new if evicted]
+                if tombstones:
+                    self._append_log(tombstones, fsync=True)
+                for _, vector, slot, _ in new:
+                    self._vectors[slot] = vector
+                self._vectors.flush()
+                for key, _, slot, _ in new:
+                    self._assign(key, slot)
+                self._append_log([f"{key} {slot}\n" for key, _, slot, _ in new])
+            if self._log_lines > 2 * self.max_entries:
+                self._compact()
+
+        return embeddings
+
+    def _compact(self):
+        tmp_path = self._log_path + ".tmp"
+        header = self._new_header()
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            for slot in sorted(self._free):
+                f.write(f"{TOMBSTONE} {slot}\n".encode("utf-8"))
+            for key, slot in self._slots.items():
+                f.write(f"{key} {slot}\n".encode("utf-8"))
+            self._log_offset = f.tell()
+        os.replace(tmp_path, self._log_path)
+        self._log_header = header
+        self._log_lines = len(self._free) + len(self._slots)
+
+    def compact(self):
+        """Rewrite the slot log with only the live entries, in LRU order"""
+        with self._locked(exclusive=True):
+            self._compact()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters of this process"""
+        total = self.hits + self.misses
+        return {
+            "model_id": self.model_id,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._slots),
+            "max_entries": self.max_entries
+        }
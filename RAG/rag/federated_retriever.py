@@ -0,0 +1,155 @@
+import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# Constant of reciprocal rank fusion, score = sum(1 / (RRF_K + rank))
+RRF_K = 60
+
+
+class FederatedRetriever:
+    """Queries several knowledge sources concurrently and merges the results.
+
+    A source is a callable ``fn(food_names) -> List[Dict]`` returning
+    documents with at least a 'content' key, best first. All enabled sources
+    run in a shared thread pool. Each has its own timeout, and the whole call
+    is capped by ``budget`` seconds; sources that miss their deadline are
+    reported in 'timed_out' and the merge uses whatever finished in time.
+    Documents are deduplicated by content and ranked by reciprocal rank
+    fusion over the sources.
+
+    Latencies of every call, including calls that finished after their
+    deadline, are recorded per source; see latency_stats().
+    """
+
+    def __init__(self,
+                 sources: Dict[str, Callable],
+                 timeouts: Optional[Dict[str, float]] = None,
+                 budget: float = 5.0,
+                 max_workers: Optional[int] = None,
+                 history: int = 1000):
+        self.sources = dict(sources)
+        self.timeouts = timeouts or {}
+        self.budget = budget
+        self.enabled = set(self.sources)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or 2 * len(self.sources),
+                                            thread_name_prefix="federated")
+        self._lock = threading.Lock()
+        self._latencies = {name: deque(maxlen=history) for name in self.sources}
+        self._counts = {name: {'calls': 0, 'timeouts': 0, 'errors': 0} for name in self.sources}
+
+    def _record(self, name: str, seconds: float, error: bool):
+        with self._lock:
+            self._latencies[name].append(seconds)
+            if error:
+                self._counts[name]['errors'] += 1
+
+    def _call(self, name: str, food_names: List[str]) -> List[Dict]:
+        start = time.perf_counter()
+        try:
+            documents = self.sources[name](food_names)
+        except Exception:
+            self._record(name, time.perf_counter() - start, error=True)
+            raise
+        self._record(name, time.perf_counter() - start, error=False)
+        return documents
+
+    def retrieve(self, food_names: List[str], budget: Optional[float] = None) -> Dict:
+        """Query every enabled source for the dishes and merge what arrives in time.
+
+        Returns a dict with the merged 'results', whether they are 'partial',
+        the sources that 'timed_out', per-source 'errors', and the
+        'latency' of each source that answered.
+        """
+        budget = self.budget if budget is None else budget
+        start = time.monotonic()
+        names = [name for name in self.sources if name in self.enabled]
+        futures = {}
+        deadlines = {}
+        for name in names:
+            futures[self._executor.submit(self._call, name, food_names)] = name
+            deadlines[name] = start + min(self.timeouts.get(name, budget), budget)
+            with self._lock:
+                self._counts[name]['calls'] += 1
+
+        rankings, errors, latency, timed_out = {}, {}, {}, []
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            for future in [f for f in pending if deadlines[futures[f]] <= now and not f.done()]:
+                # The thread cannot be stopped; it finishes in the background
+                pending.discard(future)
+                timed_out.append(futures[future])
+            if not pending:
+                break
+            next_deadline = min(deadlines[futures[f]] for f in pending)
+            done, _ = wait(pending, timeout=max(next_deadline - now, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                name = futures[future]
+                latency[name] = time.monotonic() - start
+                try:
+                    rankings[name] = future.result() or []
+                except Exception as e:
+                    errors[name] = str(e)
+
+        with self._lock:
+            for name in timed_out:
+                self._counts[name]['timeouts'] += 1
+
+        return {
+            'results': self.merge([rankings[name] for name in names if name in rankings],
+                                  [name for name in names if name in rankings]),
+            'partial': bool(timed_out or errors),
+            'timed_out': timed_out,
+            'errors': errors,
+            'latency': latency
+        }
+
+    @staticmethod
+    def merge(rankings: List[List[Dict]], source_names: List[str], rrf_k: int = RRF_K) -> List[Dict]:
+        """Dedupe documents by content and order them by reciprocal rank fusion"""
+        fused = {}
+        for source_rank, (name, ranking) in enumerate(zip(source_names, rankings)):
+            for rank, document in enumerate(ranking, 1):
+                content = (document.get('content') or '').strip()
+                if not content:
+                    continue
+                key = hashlib.sha1(content.encode('utf-8')).hexdigest()
+                result = fused.get(key)
+                if result is None:
+                    result = fused[key] = dict(document, content=content, sources=[], score=0.0,
+                                               _order=(rank, source_rank))
+                result['sources'].append(name)
+                result['score'] += 1.0 / (rrf_k + rank)
+        ordered = sorted(fused.values(), key=lambda r: (-r['score'], r['_order']))
+        for result in ordered:
+            del result['_order']
+        return ordered
+
+    @staticmethod
+    def format_context(results: List[Dict]) -> str:
+        return "\n\n".join(result['content'] for result in results)
+
+    def latency_stats(self) -> Dict[str, Dict]:
+        """Call counts and latency percentiles (seconds) of each source"""
+        stats = {}
+        with self._lock:
+            for name, latencies in self._latencies.items():
+                values = np.array(latencies, dtype=np.float64)
+                stats[name] = dict(self._counts[name])
+                if len(values):
+                    stats[name].update({
+                        'p50': float(np.percentile(values, 50)),
+                        'p95': float(np.percentile(values, 95)),
+                        'p99': float(np.percentile(values, 99)),
+                        'max': float(values.max())
+                    })
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=False)
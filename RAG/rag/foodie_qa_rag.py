@@ -8,13 +8,18 @@ import json
 from tqdm import tqdm 
 from transformers import AutoProcessor, AutoModelForVision2Seq
 from transformers.image_utils import load_image
-from FoodieQA.rag.wikipedia.recipe_db import LocalRecipeDB
+from FoodieQA.rag.wikipedia.recipe_db import get_recipe_db
+from FoodieQA.rag.context_retriever import RecipeContextRetriever, CONTEXT_HEADER, split_context
+from FoodieQA.rag.context_packer import ContextPacker
+from context_store import ContextStore
 import utils
 import argparse
 
 class FoodieQARAG:
-    def __init__(self, cache_dir="/scratch/project/dd-23-107/wenyan/cache"):
-        self.db = LocalRecipeDB()
+    def __init__(self, cache_dir="/scratch/project/dd-23-107/wenyan/cache", persist_dir="./recipe_db", context_file=None, context_budget=None, chunks=True, expand_parents=False):
+        self.db = get_recipe_db(persist_dir)
+        # Contexts materialized ahead of time by materialize_contexts.py
+        self.context_store = ContextStore(context_file) if context_file else None
         self.processor = AutoProcessor.from_pretrained("HuggingFaceM4/idefics2-8b", 
                                                      cache_dir=cache_dir, 
                                                      do_image_splitting=False)
@@ -24,35 +29,36 @@ class FoodieQARAG:
             device_map="auto", 
             torch_dtype=torch.float16
         )
+        # Cuts retrieved context to context_budget tokens of the idefics2 tokenizer
+        self.packer = None
+        if context_budget:
+            self.packer = ContextPacker(self.processor, max_tokens=context_budget, header=CONTEXT_HEADER)
+        # Retrieve sentence chunks instead of whole documents when the store has them
+        self.chunks = chunks
+        self.expand_parents = expand_parents
+        # qid -> context filled by prefetch_contexts()
+        self.contexts = {}
+
+    def context_retriever(self, n_results=2):
+        # Unpacked: build_input packs the contexts of every source
+        return RecipeContextRetriever(self.db, n_results=n_results,
+                                      chunks=self.chunks, expand_parents=self.expand_parents)
+
+    def pack_context(self, context):
+        """Context cut to context_budget tokens, whichever source it came from"""
+        if self.packer is None or not context:
+            return context
+        return self.packer.pack_texts(split_context(context))
 
     def retrieve_context(self, question, n_results=2):
         """Retrieve relevant context based on the question"""
-        # Extract dish name and question type
-        dish_name = question.get('food_name', '')
-        question_type = question.get('question_type', '')
-        
-        # Construct search query based on question type
-        search_queries = []
-        if dish_name:
-            search_queries.append(dish_name)
-            
-        if question_type == "cuisine_type":
-            search_queries.append(f"{dish_name} cuisine origin traditional")
-        elif question_type == "flavor":
-            search_queries.append(f"{dish_name} taste flavor characteristics")
-        elif question_type == "cooking-skills":
-            search_queries.append(f"{dish_name} cooking preparation method")
-        elif question_type == "region-2":
-            search_queries.append(f"{dish_name} regional origin location")
-            
-        # Get results
-        context = ""
-        for query in search_queries:
-            results = self.db.search_recipes(query, n_results=n_results)
-            for result in results:
-                context += f"\n相关信息 (Related Information):\n{result['content']}\n"
-                
-        return context.strip()
+        return self.context_retriever(n_results).retrieve(question)
+
+    def prefetch_contexts(self, mivqa, n_results=2):
+        """Retrieve the context of every question in a few bulk searches"""
+        retriever = self.context_retriever(n_results)
+        for question, context in zip(mivqa, retriever.retrieve_bulk(mivqa)):
+            self.contexts[question["qid"]] = context
 
     def format_image_input(self, img_idx, template=0):
         idx2choice = {0: "A", 1: "B", 2: "C", 3: "D"}
@@ -106,8 +112,15 @@ class FoodieQARAG:
         question = mivqa[idx]
         images = [load_image(os.path.join(data_dir, img)) for img in question["images"]]
         
-        # Retrieve relevant context
-        context = self.retrieve_context(question)
+        # Retrieve relevant context: materialized file, prefetched, then live
+        context = None
+        if self.context_store is not None:
+            context = self.context_store.get(question["qid"])
+        if context is None:
+            context = self.contexts.get(question["qid"])
+        if context is None:
+            context = self.retrieve_context(question)
+        context = self.pack_context(context)
         
         if prompt == 0 or prompt == 1:
             for i in range(4):
@@ -140,10 +153,20 @@ def main():
     argparser.add_argument("--eval_file", default="mivqa_filtered.json")
     argparser.add_argument("--prompt", type=int, default=3)
     argparser.add_argument("--out_dir", default="/scratch/project/dd-23-107/wenyan/data/foodie/results")
+    argparser.add_argument("--context_file", default=None,
+                           help="Context file written by materialize_contexts.py")
+    argparser.add_argument("--context_budget", type=int, default=None,
+                           help="Maximum tokens of retrieved context in the prompt")
+    argparser.add_argument("--whole_documents", action="store_true",
+                           help="Retrieve whole documents instead of sentence chunks")
+    argparser.add_argument("--expand_parents", action="store_true",
+                           help="Put the parent documents of the best chunks in the context")
     args = argparser.parse_args()
 
     # Initialize the RAG-enhanced QA system
-    qa_system = FoodieQARAG(cache_dir=args.cache_dir)
+    qa_system = FoodieQARAG(cache_dir=args.cache_dir, context_file=args.context_file,
+                            context_budget=args.context_budget, chunks=not args.whole_documents,
+                            expand_parents=args.expand_parents)
     
     # Read data
     data_dir = args.data_dir
@@ -153,6 +176,9 @@ def main():
     out_file_name = f"mivqa_idefics2-8b_rag_prompt{args.prompt}.jsonl"
     os.makedirs(args.out_dir, exist_ok=True)
     
+    if qa_system.context_store is None:
+        qa_system.prefetch_contexts(mivqa)
+    
     print(f"Evaluating model on {len(mivqa)} questions")
     with open(os.path.join(args.out_dir, out_file_name), "w") as f:
         for i in tqdm(range(len(mivqa))):
@@ -0,0 +1,121 @@
+import bisect
+from typing import Callable, Dict, List
+
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+
+# BeautifulSoup tree builder of each extraction backend. "bs4" is the original
+# per-element get_text() extraction, kept as the reference; the others index
+# the tree's text once (TextSpans). "lxml" also parses with lxml (in
+# requirements.txt), which is faster than html.parser; it is optional here.
+HTML_BACKENDS = {
+    "bs4": "html.parser",
+    "spans": "html.parser",
+    "lxml": "lxml",
+}
+DEFAULT_HTML_BACKEND = "spans"
+# String types Tag.get_text() returns for ordinary (non script/style/template) tags
+TEXT_STRING_TYPES = frozenset([NavigableString, CData])
+
+
+def available_backends() -> List[str]:
+    backends = ["bs4", "spans"]
+    try:
+        import lxml  # noqa: F401
+        backends.append("lxml")
+    except ImportError:
+        pass
+    return backends
+
+def parse_html(html: str, backend: str = DEFAULT_HTML_BACKEND) -> BeautifulSoup:
+    if backend not in HTML_BACKENDS:
+        raise ValueError(f"Unknown HTML backend {backend!r}, expected one of {sorted(HTML_BACKENDS)}")
+    return BeautifulSoup(html, HTML_BACKENDS[backend])
+
+def innermost_sections(sections: List[Tag], keywords: List[str],
+                       contains: Callable[[Tag, str], bool]) -> List[Tag]:
+    """The sections (in document order, as find_all returns them) containing
+    a keyword that no section nested in them contains as well.
+
+    The sections around a matching one match too, so reading all of them
+    costs size x depth and repeats the same text once per level. In document
+    order a section's descendants directly follow it, so a matching section
+    is innermost unless the next matching one lies inside it.
+    """
+    keep = set()
+    for keyword in keywords:
+        matching = [section for section in sections if contains(section, keyword)]
+        for section, following in zip(matching, matching[1:] + [None]):
+            if following is None or not any(parent is section for parent in following.parents):
+                keep.add(id(section))
+    return [section for section in sections if id(section) in keep]
+
+
+class TextSpans:
+    """The text of every element of a parsed page, from one walk of the tree.
+
+    Tag.get_text() walks the element's whole subtree, so calling it on every
+    (nested) div costs size x depth. The text of an element is a contiguous
+    run of the page's strings, so one walk records each tag's run and the
+    text of any tag is then a slice. With strip=True the strings are
+    stripped and empty ones dropped, as in Tag.stripped_strings.
+    """
+
+    def __init__(self, root: Tag, strip: bool = False):
+        self.strip = strip
+        self.pieces: List[str] = []
+        self._spans: Dict[int, tuple] = {}
+        starts: Dict[int, int] = {}
+        stack = [(root, False)]
+        while stack:
+            node, closing = stack.pop()
+            if closing:
+                self._spans[id(node)] = (starts[id(node)], len(self.pieces))
+            elif isinstance(node, Tag):
+                starts[id(node)] = len(self.pieces)
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.contents))
+            elif type(node) in TEXT_STRING_TYPES:
+                piece = node.strip() if strip else str(node)
+                if piece:
+                    self.pieces.append(piece)
+        self.offsets = [0]
+        for piece in self.pieces:
+            self.offsets.append(self.offsets[-1] + len(piece))
+        self.text = "".join(self.pieces)
+        self._needles: Dict[str, List[int]] = {}
+
+    def _plain(self, tag: Tag) -> bool:
+        # Script, style and template tags have their own string types
+        types = tag.interesting_string_types
+        return (set(types) if isinstance(types, (set, frozenset)) else {types}) == TEXT_STRING_TYPES
+
+    def get_text(self, tag: Tag) -> str:
+        """tag.get_text()"""
+        if not self._plain(tag):
+            return tag.get_text()
+        start, end = self._spans[id(tag)]
+        return self.text[self.offsets[start]:self.offsets[end]]
+
+    def join(self, tag: Tag, separator: str = " ") -> str:
+        """separator.join(tag.stripped_strings) (with strip=True)"""
+        if not self._plain(tag):
+            return separator.join(tag.stripped_strings)
+        start, end = self._spans[id(tag)]
+        return separator.join(self.pieces[start:end])
+
+    def contains(self, tag: Tag, needle: str) -> bool:
+        """needle in tag.get_text(), by binary search over the needle's
+        positions in the page text"""
+        if not self._plain(tag):
+            return needle in tag.get_text()
+        positions = self._needles.get(needle)
+        if positions is None:
+            positions = []
+            pos = self.text.find(needle)
+            while pos != -1:
+                positions.append(pos)
+                pos = self.text.find(needle, pos + 1)
+            self._needles[needle] = positions
+        start, end = self._spans[id(tag)]
+        i = bisect.bisect_left(positions, self.offsets[start])
+        return i < len(positions) and positions[i] + len(needle) <= self.offsets[end]
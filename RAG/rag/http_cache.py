@@ -0,0 +1,271 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+import zstandard
+from requests.structures import CaseInsensitiveDict
+from yarl import URL
+
+# Shared by all scrapers, whatever directory they are run from
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "http_cache")
+DEFAULT_CACHE_TTL_DAYS = 7.0
+# Request headers that change the page returned, and so are part of the key
+KEY_HEADERS = ("accept", "accept-language")
+
+
+class OfflineCacheMiss(requests.exceptions.ConnectionError):
+    """Raised in offline mode for a page that is not in the cache"""
+
+
+class HttpCache:
+    """Content-addressed on-disk cache of GET responses shared by the scrapers.
+
+    Entries are keyed by a hash of the normalized URL and the KEY_HEADERS
+    sent, and live in entries/<key>.json with the response's status,
+    ETag, Last-Modified, encoding and fetch time. Bodies are stored once
+    per content hash, zstd-compressed, in bodies/<sha256>.zst.
+
+    An entry younger than ttl_days is served without a request. An older
+    one is revalidated with If-None-Match / If-Modified-Since and kept on
+    a 304. In offline mode cached entries are always served, whatever
+    their age, and anything else raises OfflineCacheMiss, so parsing can
+    be re-run over the whole corpus without touching the network. Only
+    200 responses are cached. With cache_dir None the cache is disabled
+    and get() is a plain requests.get.
+    """
+
+    def __init__(self,
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 ttl_days: float = DEFAULT_CACHE_TTL_DAYS,
+                 offline: bool = False,
+                 compression_level: int = 10):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_days * 86400
+        self.offline = offline
+        self.compression_level = compression_level
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "stored": 0, "offline_misses": 0}
+        # Network requests made so far; pause() only waits after one
+        self.network_requests = 0
+        self._paused_at = 0
+        self._local = threading.local()
+        if cache_dir is not None:
+            os.makedirs(os.path.join(cache_dir, "entries"), exist_ok=True)
+            os.makedirs(os.path.join(cache_dir, "bodies"), exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache_dir is not None
+
+    # zstd contexts are not thread-safe, so each thread gets its own
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstandard.ZstdCompressor(level=self.compression_level)
+        return self._local.compressor
+
+    def _decompressor(self) -> zstandard.ZstdDecompressor:
+        if not hasattr(self._local, "decompressor"):
+            self._local.decompressor = zstandard.ZstdDecompressor()
+        return self._local.decompressor
+
+    def key(self, url: str, headers: Optional[Dict[str, str]] = None) -> str:
+        """Cache key of a GET of url with these request headers"""
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        parts = [str(URL(str(url)))] + [f"{name}:{headers[name]}" for name in KEY_HEADERS if name in headers]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, "entries", key[:2], key + ".json")
+
+    def _body_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "bodies", digest[:2], digest + ".zst")
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """Entry of a key, None if it is not cached (or the cache is disabled)"""
+        if not self.enabled:
+            return None
+        try:
+            with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if os.path.exists(self._body_path(entry["body"])) else None
+
+    def is_fresh(self, entry: Dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl_seconds
+
+    def usable(self, entry: Optional[Dict]) -> bool:
+        """Whether an entry can be served without a request"""
+        return entry is not None and (self.offline or self.is_fresh(entry))
+
+    def body(self, entry: Dict) -> bytes:
+        with open(self._body_path(entry["body"]), "rb") as f:
+            return self._decompressor().decompress(f.read())
+
+    def text(self, entry: Dict) -> str:
+        return self.body(entry).decode(entry.get("encoding") or "utf-8", errors="replace")
+
+    def conditional_headers(self, entry: Optional[Dict]) -> Dict[str, str]:
+        """Revalidation headers for a stale entry"""
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, key: str, url: str, response_headers, body: bytes, encoding: Optional[str]) -> Dict:
+        """Store a 200 response; returns its entry"""
+        digest = hashlib.sha256(body).hexdigest()
+        entry = {
+            "url": str(url),
+            "status": 200,
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+            "content_type": response_headers.get("Content-Type"),
+            "encoding": encoding,
+            "body": digest,
+            "fetched_at": time.time(),
+        }
+        if not self.enabled:
+            return entry
+        if not os.path.exists(self._body_path(digest)):
+            self._write(self._body_path(digest), self._compressor().compress(body))
+        self._write(self._entry_path(key), json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+        self.stats["stored"] += 1
+        return entry
+
+    def touch(self, key: str, entry: Dict) -> Dict:
+        """Mark a revalidated (304) entry as fresh again"""
+        entry = dict(entry, fetched_at=time.time())
+        self._write(self._entry_path(key), json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+        self.stats["revalidated"] += 1
+        return entry
+
+    def before_request(self, url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[str, Optional[Dict]]:
+        """(key, entry) of a GET about to be made. A usable entry is counted as
+        a hit and should be served; in offline mode a miss raises."""
+        key = self.key(url, headers)
+        entry = self.lookup(key)
+        if self.usable(entry):
+            self.stats["hits"] += 1
+        elif self.offline:
+            self.stats["offline_misses"] += 1
+            raise OfflineCacheMiss(f"Not in the HTTP cache (offline mode): {url}")
+        else:
+            self.stats["misses"] += 1
+            self.network_requests += 1
+        return key, entry
+
+    def _response(self, entry: Dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry["url"]
+        response._content = self.body(entry)
+        response.encoding = entry.get("encoding")
+        response.headers = CaseInsensitiveDict({
+            name: entry[field] for name, field in
+            [("ETag", "etag"), ("Last-Modified", "last_modified"), ("Content-Type", "content_type")]
+            if entry.get(field)})
+        response.from_cache = True
+        return response
+
+    def get(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict[str, str]] = None,
+            **kwargs) -> requests.Response:
+        """requests.get through the cache; cached pages come back as a
+        requests.Response with from_cache set"""
+        url = requests.Request("GET", url, params=params).prepare().url
+        key, entry = self.before_request(url, headers)
+        if self.usable(entry):
+            return self._response(entry)
+
+        request_headers = dict(headers or {})
+        request_headers.update(self.conditional_headers(entry))
+        response = requests.get(url, headers=request_headers, **kwargs)
+        if response.status_code == 304:
+            if entry is None:
+                raise requests.HTTPError(f"304 Not Modified without a cached page: {url}", response=response)
+            return self._response(self.touch(key, entry))
+        if response.status_code == 200:
+            self.put(key, url, response.headers, response.content, response.encoding)
+        response.from_cache = False
+        return response
+
+    def pause(self, seconds: float):
+        """Politeness delay between scrapes, skipped when everything since the
+        last pause came from the cache"""
+        if self.network_requests != self._paused_at:
+            self._paused_at = self.network_requests
+            time.sleep(seconds)
+
+    def entries(self) -> Iterator[Dict]:
+        """Every cached entry, e.g. to re-run parsers over the saved corpus"""
+        if not self.enabled:
+            return
+        for root, _, files in os.walk(os.path.join(self.cache_dir, "entries")):
+            for name in sorted(files):
+                if name.endswith(".json"):
+                    with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+                        yield json.load(f)
+
+    def print_stats(self):
+        if self.enabled:
+            stats = self.stats
+            print(f"HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated, "
+                  f"{stats['misses']} fetched, {stats['offline_misses']} offline misses")
+
+
+def add_cache_args(parser: argparse.ArgumentParser):
+    """HTTP cache flags of the scraper scripts"""
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cache_ttl_days", type=float, default=DEFAULT_CACHE_TTL_DAYS,
+                        help="Cached pages older than this are revalidated")
+    parser.add_argument("--offline", action="store_true",
+                        help="Only use cached pages, never the network")
+    parser.add_argument("--no_cache", action="store_true")
+
+def cache_from_args(args: argparse.Namespace) -> HttpCache:
+    return HttpCache(None if args.no_cache else args.cache_dir,
+                     ttl_days=args.cache_ttl_days, offline=args.offline)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_http_cache() -> HttpCache:
+    """Process-wide cache in DEFAULT_CACHE_DIR"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = HttpCache()
+        return _default_cache
+
+def install_wikipedia_cache(cache: HttpCache):
+    """Route the wikipedia package's API calls through the cache.
+
+    Every call of the package goes through wikipedia.wikipedia._wiki_request,
+    which is replaced by an equivalent that uses cache.get (the package's
+    optional rate limiting is left out: the scraper already pauses).
+    """
+    import wikipedia.wikipedia as wiki_module
+
+    def _wiki_request(params):
+        params['format'] = 'json'
+        if 'action' not in params:
+            params['action'] = 'query'
+        headers = {'User-Agent': wiki_module.USER_AGENT}
+        return cache.get(wiki_module.API_URL, params=params, headers=headers).json()
+
+    wiki_module._wiki_request = _wiki_request
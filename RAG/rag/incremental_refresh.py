@@ -0,0 +1,129 @@
+import json
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_TTL_DAYS = 30.0
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def plan_refresh(dishes_by_cuisine: Dict[str, List[str]],
+                 stored: Dict[str, Optional[str]],
+                 ttl_days: float = DEFAULT_TTL_DAYS,
+                 now: Optional[datetime] = None) -> Dict[str, List]:
+    """Compare the requested dishes with the stored ones.
+
+    ``stored`` maps each stored dish name to the ISO timestamp of its oldest
+    entry. Requested dishes are 'missing', 'stale' (older than the TTL or
+    without a readable timestamp) or 'fresh', as (cuisine_type, dish)
+    pairs; stored dishes that are no longer requested are 'removed'.
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=ttl_days)
+    plan = {'missing': [], 'stale': [], 'fresh': [], 'removed': []}
+    requested = set()
+    for cuisine_type, dishes in dishes_by_cuisine.items():
+        for dish in dishes:
+            if dish in requested:
+                continue
+            requested.add(dish)
+            if dish not in stored:
+                plan['missing'].append((cuisine_type, dish))
+                continue
+            timestamp = parse_timestamp(stored[dish])
+            if timestamp is None or timestamp < cutoff:
+                plan['stale'].append((cuisine_type, dish))
+            else:
+                plan['fresh'].append((cuisine_type, dish))
+    plan['removed'] = sorted(dish for dish in stored if dish not in requested)
+    return plan
+
+def new_summary(source: str, plan: Dict[str, List], ttl_days: float) -> Dict:
+    return {
+        'source': source,
+        'started': datetime.now().isoformat(),
+        'ttl_days': ttl_days,
+        'skipped_fresh': [dish for _, dish in plan['fresh']],
+        'added': [],
+        'updated': [],
+        'unchanged': [],
+        'failed': [],
+        'removed': [],
+        'documents_written': 0,
+        'documents_deleted': 0
+    }
+
+def finish_summary(summary: Dict, summary_path: Optional[str] = None) -> Dict:
+    """Print the counts of a refresh and write the full summary as JSON"""
+    summary['finished'] = datetime.now().isoformat()
+    print(f"\n=== Incremental refresh of {summary['source']} ===")
+    for key in ('skipped_fresh', 'added', 'updated', 'unchanged', 'failed', 'removed'):
+        print(f"{key}: {len(summary[key])}")
+    print(f"Documents written: {summary['documents_written']}, deleted: {summary['documents_deleted']}")
+    if summary_path:
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"Summary written to {summary_path}")
+    return summary
+
+def refresh_recipe_db(db,
+                      dishes_by_cuisine: Dict[str, List[str]],
+                      scrape_dish: Callable[[str, str], List[Dict]],
+                      source: str,
+                      ttl_days: float = DEFAULT_TTL_DAYS,
+                      prune: bool = False,
+                      pause: Optional[Callable[[], None]] = None,
+                      summary_path: Optional[str] = None) -> Dict:
+    """Bring a LocalRecipeDB up to date with the requested dishes.
+
+    Only missing and stale dishes are scraped, with ``scrape_dish(dish,
+    cuisine_type)`` returning add_recipes items. Ids derive from the content,
+    so an unchanged document is only re-stamped, and a dish's documents that
+    the new scrape no longer produces are deleted. A dish whose scrape comes
+    back empty keeps its old documents. With ``prune``, dishes that are no
+    longer requested are deleted. ``pause`` runs between two scrapes.
+
+    Only the documents of ``source`` are compared, replaced or pruned:
+    other scrapers' documents of the same dishes in a shared store are
+    left alone.
+    """
+    entries = db.dish_entries(source=source)
+    stored = {dish: min(timestamp for _, timestamp in items) for dish, items in entries.items() if dish}
+    plan = plan_refresh(dishes_by_cuisine, stored, ttl_days)
+    summary = new_summary(source, plan, ttl_days)
+
+    todo = plan['missing'] + plan['stale']
+    print(f"{len(todo)} dishes to scrape ({len(plan['missing'])} missing, {len(plan['stale'])} stale), "
+          f"{len(plan['fresh'])} fresh, {len(plan['removed'])} no longer requested")
+    for i, (cuisine_type, dish) in enumerate(todo):
+        print(f"\n[{i + 1}/{len(todo)}] Refreshing: {dish}")
+        recipes = scrape_dish(dish, cuisine_type)
+        if not recipes:
+            summary['failed'].append(dish)
+            print(f"✗ Nothing scraped for {dish}, keeping stored entries")
+        else:
+            new_ids = set(db.add_recipes(recipes, verbose=False)['ids'])
+            old_ids = {doc_id for doc_id, _ in entries.get(dish, [])}
+            obsolete = sorted(old_ids - new_ids)
+            db.delete_recipes(obsolete)
+            summary['documents_written'] += len(new_ids)
+            summary['documents_deleted'] += len(obsolete)
+            if dish not in stored:
+                summary['added'].append(dish)
+            elif obsolete or new_ids - old_ids:
+                summary['updated'].append(dish)
+            else:
+                summary['unchanged'].append(dish)
+        if pause is not None and i < len(todo) - 1:
+            pause()
+
+    if prune:
+        for dish in plan['removed']:
+            ids = [doc_id for doc_id, _ in entries[dish]]
+            db.delete_recipes(ids)
+            summary['removed'].append(dish)
+            summary['documents_deleted'] += len(ids)
+    return finish_summary(summary, summary_path)
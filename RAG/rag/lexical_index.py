@@ -0,0 +1,148 @@
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+# A run of CJK characters, or a word in any other script
+_SEGMENT = re.compile(f'([{_CJK}]+)|([^\\W_{_CJK}]+)')
+_MAX_TF = 65535
+
+
+def ngram_terms(text: str, sizes: Tuple[int, ...] = (2, 3)) -> List[str]:
+    """Index terms of a text: character n-grams of CJK runs, whole other words.
+
+    Chinese has no word boundaries, so overlapping character bigrams and
+    trigrams stand in for words. CJK runs shorter than the smallest size are
+    kept whole so that single characters can still match. Words in other
+    scripts are lowercased and used as they are.
+    """
+    grams = []
+    for cjk, word in _SEGMENT.findall(text.lower()):
+        if word:
+            grams.append(word)
+        elif len(cjk) < min(sizes):
+            grams.append(cjk)
+        else:
+            for n in sizes:
+                grams.extend(cjk[i:i + n] for i in range(len(cjk) - n + 1))
+    return grams
+
+
+class NgramBM25Index:
+    """In-memory BM25 index over character n-gram postings.
+
+    Each term's posting list is a pair of compact arrays (document numbers as
+    uint32, term frequencies as uint16), appended to as documents arrive, so
+    the index can be updated one chunk at a time. Re-adding an id or removing
+    it leaves a tombstone; the postings are compacted once tombstones make up
+    a quarter of the documents. Document frequencies count tombstoned
+    postings until then, which slightly understates idf in the meantime.
+    """
+
+    def __init__(self, ngram_sizes: Tuple[int, ...] = (2, 3), k1: float = 1.2, b: float = 0.75):
+        self.ngram_sizes = ngram_sizes
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._term_ids: Dict[str, int] = {}
+        self._post_docs: List[array] = []
+        self._post_tfs: List[array] = []
+        self._doc_ids: List[str] = []      # document number -> external id
+        self._doc_lens = array('I')
+        self._live = bytearray()
+        self._number_of: Dict[str, int] = {}  # external id -> live document number
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._number_of)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._number_of
+
+    def add(self, ids: Iterable[str], documents: Iterable[str]):
+        """Index documents, replacing any earlier version of the same id"""
+        with self._lock:
+            for doc_id, document in zip(ids, documents):
+                self._remove(doc_id)
+                grams = ngram_terms(document or "", self.ngram_sizes)
+                number = len(self._doc_ids)
+                self._doc_ids.append(doc_id)
+                self._doc_lens.append(len(grams))
+                self._live.append(1)
+                self._number_of[doc_id] = number
+                self._total_len += len(grams)
+                for term, tf in Counter(grams).items():
+                    term_id = self._term_ids.get(term)
+                    if term_id is None:
+                        term_id = self._term_ids[term] = len(self._post_docs)
+                        self._post_docs.append(array('I'))
+                        self._post_tfs.append(array('H'))
+                    self._post_docs[term_id].append(number)
+                    self._post_tfs[term_id].append(min(tf, _MAX_TF))
+            self._maybe_compact()
+
+    def _remove(self, doc_id: str):
+        number = self._number_of.pop(doc_id, None)
+        if number is not None:
+            self._live[number] = 0
+            self._total_len -= self._doc_lens[number]
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = len(self._doc_ids) - len(self._number_of)
+        if dead and dead * 4 >= len(self._doc_ids):
+            self.compact()
+
+    def compact(self):
+        """Drop tombstoned documents from every posting list and renumber"""
+        with self._lock:
+            live = np.frombuffer(bytes(self._live), dtype=np.uint8).astype(bool)
+            renumber = np.cumsum(live, dtype=np.int64) - 1
+            for term_id in range(len(self._post_docs)):
+                docs = np.frombuffer(self._post_docs[term_id], dtype=np.uint32)
+                keep = live[docs]
+                self._post_docs[term_id] = array('I', renumber[docs[keep]].astype(np.uint32).tobytes())
+                self._post_tfs[term_id] = array('H', np.frombuffer(self._post_tfs[term_id], dtype=np.uint16)[keep].tobytes())
+            self._doc_ids = [d for d, alive in zip(self._doc_ids, live) if alive]
+            self._doc_lens = array('I', np.frombuffer(self._doc_lens, dtype=np.uint32)[live].tobytes())
+            self._live = bytearray(b'\x01' * len(self._doc_ids))
+            self._number_of = {doc_id: i for i, doc_id in enumerate(self._doc_ids)}
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """Top documents by BM25 score as (id, score), best first"""
+        terms = set(ngram_terms(query, self.ngram_sizes))
+        with self._lock:
+            n_docs = len(self._number_of)
+            if not n_docs or not terms:
+                return []
+            doc_lens = np.frombuffer(self._doc_lens, dtype=np.uint32).astype(np.float32)
+            avgdl = self._total_len / n_docs or 1.0
+            norm = self.k1 * (1 - self.b + self.b * doc_lens / avgdl)
+            scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+            for term in terms:
+                term_id = self._term_ids.get(term)
+                if term_id is None:
+                    continue
+                docs = np.frombuffer(self._post_docs[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self._post_tfs[term_id], dtype=np.uint16).astype(np.float32)
+                df = min(len(docs), n_docs)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                # A document appears at most once per posting list
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+            scores *= np.frombuffer(bytes(self._live), dtype=np.uint8)
+
+            hits = np.flatnonzero(scores)
+            if len(hits) > n_results:
+                hits = hits[np.argpartition(-scores[hits], n_results - 1)[:n_results]]
+            hits = hits[np.argsort(-scores[hits], kind="stable")]
+            return [(self._doc_ids[i], float(scores[i])) for i in hits]
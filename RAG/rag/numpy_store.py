@@ -0,0 +1,519 @@
+import json
+import os
+import re
+import shutil
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Rows scored per matrix product, bounds the float32 copy of a float16 index
+SCORE_BLOCK = 65536
+# The records log is compacted once it holds more entries than this and
+# than the collection
+COMPACT_MIN_RECORDS = 4096
+
+
+class NumpyCollection:
+    """Exact-search collection backed by a memory-mapped ``.npy`` matrix.
+
+    Implements the subset of the Chroma collection API that LocalRecipeDB and
+    its helpers use (add, upsert, update, get, query, count, peek, delete), so
+    it can stand in for a Chroma collection. Embeddings are rows of a
+    memory-mapped ``vectors.npy`` (float32 or float16); ids, documents and
+    metadata are held column-wise in memory and stored as a ``records.json``
+    snapshot plus an append-only ``records.<generation>.log`` of the
+    entries written since. A query is one matrix product against the
+    whole matrix followed by ``argpartition``; distances are squared L2,
+    the same as Chroma's default space.
+
+    A row the stored records point at is never overwritten: new and
+    replaced vectors go to fresh rows past the end, which are flushed
+    before the write's log lines are appended and fsynced, and a delete
+    only logs the ids. A write therefore costs the size of its batch, and
+    a crash at any point leaves the last completed write readable. Once
+    the log outgrows the collection, compaction copies the live rows to
+    the next generation's vectors file and atomically replaces
+    ``records.json`` to point at it.
+    """
+
+    def __init__(self,
+                 path: str,
+                 name: str,
+                 embedding_function=None,
+                 metadata: Optional[Dict] = None,
+                 dtype: str = "float32"):
+        self.path = path
+        self.name = name
+        self.embedding_function = embedding_function
+        self.metadata = metadata or {}
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.RLock()
+        self._records_path = os.path.join(path, "records.json")
+        self._generation = 0
+
+        self._ids: List[str] = []
+        self._documents: List[Optional[str]] = []
+        self._columns: Dict[str, List] = {}
+        # Vector row of each entry (rows of replaced vectors are left behind
+        # until the next compaction)
+        self._rows: List[int] = []
+        self._row_of: Dict[str, int] = {}
+        self._next_row = 0
+        self._log_records = 0
+        self._vectors = None
+        self._norms = None
+        self._row_array = None
+        self._contiguous = False
+        self._column_arrays: Dict[str, np.ndarray] = {}
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # -- storage --------------------------------------------------------
+
+    def _vectors_path(self, generation: Optional[int] = None) -> str:
+        generation = self._generation if generation is None else generation
+        # Generation 0 keeps the name of stores written before the log
+        return os.path.join(self.path, "vectors.npy" if generation == 0 else f"vectors.{generation}.npy")
+
+    def _log_path(self, generation: Optional[int] = None) -> str:
+        generation = self._generation if generation is None else generation
+        return os.path.join(self.path, f"records.{generation}.log")
+
+    def _load(self):
+        if not os.path.exists(self._records_path):
+            return
+        with open(self._records_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self.metadata = records.get("metadata", self.metadata)
+        self.dtype = np.dtype(records.get("dtype", self.dtype.name))
+        self._generation = records.get("generation", 0)
+        n = records["count"]
+        self._ids = records["ids"][:n]
+        self._documents = records["documents"][:n]
+        self._columns = {k: v[:n] for k, v in records["columns"].items()}
+        self._rows = records.get("rows", list(range(n)))[:n]
+        self._row_of = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        for record in self._read_log():
+            self._apply(record)
+            self._log_records += 1
+        self._next_row = max(self._rows) + 1 if self._rows else 0
+        if os.path.exists(self._vectors_path()):
+            self._vectors = np.lib.format.open_memmap(self._vectors_path(), mode="r+")
+        self._remove_stale_files()
+
+    def _read_log(self):
+        """Records of the current log; a torn last line (a crash mid-append) is cut off"""
+        if not os.path.exists(self._log_path()):
+            return
+        with open(self._log_path(), "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                f.truncate(end)
+        for line in data[:end].decode("utf-8").splitlines():
+            if line.strip():
+                yield json.loads(line)
+
+    def _remove_stale_files(self):
+        """Files of other generations, left by a crash during compaction"""
+        current = {os.path.basename(self._vectors_path()), os.path.basename(self._log_path()), "records.json"}
+        for name in os.listdir(self.path):
+            if name not in current and (name.endswith(".tmp") or re.fullmatch(r"(vectors(\.\d+)?\.npy|records\.\d+\.log)", name)):
+                os.remove(os.path.join(self.path, name))
+
+    def _apply(self, record: Dict):
+        """Apply one log record to the in-memory entries"""
+        if record["op"] == "put":
+            i = self._row_of.get(record["id"])
+            if i is None:
+                i = len(self._ids)
+                self._ids.append(record["id"])
+                self._documents.append(None)
+                self._rows.append(None)
+                for column in self._columns.values():
+                    column.append(None)
+                self._row_of[record["id"]] = i
+            self._rows[i] = record["row"]
+            self._documents[i] = record["document"]
+            self._set_metadata(i, record["metadata"])
+        elif record["op"] == "delete":
+            doomed = {self._row_of[doc_id] for doc_id in record["ids"] if doc_id in self._row_of}
+            keep = [i for i in range(len(self._ids)) if i not in doomed]
+            self._ids = [self._ids[i] for i in keep]
+            self._documents = [self._documents[i] for i in keep]
+            self._rows = [self._rows[i] for i in keep]
+            self._columns = {k: [v[i] for i in keep] for k, v in self._columns.items()}
+            self._row_of = {doc_id: i for i, doc_id in enumerate(self._ids)}
+
+    def _commit(self, records: List[Dict]):
+        """Make applied records durable: append them to the log (the vector
+        rows they point at are already flushed), compacting when it is long"""
+        if not os.path.exists(self._records_path):
+            self._save_snapshot(self._generation)
+        else:
+            data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+            with open(self._log_path(), "ab") as f:
+                f.write(data.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            self._log_records += len(records)
+        if self._log_records > max(COMPACT_MIN_RECORDS, len(self._ids)):
+            self.compact()
+
+    def _save_snapshot(self, generation: int):
+        tmp_path = self._records_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "name": self.name,
+                "metadata": self.metadata,
+                "dtype": self.dtype.name,
+                "generation": generation,
+                "count": len(self._ids),
+                "ids": self._ids,
+                "rows": self._rows,
+                "documents": self._documents,
+                "columns": self._columns
+            }, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._records_path)
+
+    def compact(self):
+        """Copy the live vectors to a new file in entry order, write a new
+        records.json pointing at it and start an empty log"""
+        with self._lock:
+            generation = self._generation + 1
+            n = len(self._ids)
+            if self._vectors is not None:
+                tmp_path = self._vectors_path(generation) + ".tmp"
+                compacted = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype,
+                                                      shape=(max(n, 1024), self._vectors.shape[1]))
+                for start in range(0, n, SCORE_BLOCK):
+                    stop = min(start + SCORE_BLOCK, n)
+                    compacted[start:stop] = self._vectors[self._rows[start:stop]]
+                compacted.flush()
+                del compacted
+                os.replace(tmp_path, self._vectors_path(generation))
+            rows = self._rows
+            self._rows = list(range(n))
+            try:
+                self._save_snapshot(generation)
+            except BaseException:
+                self._rows = rows
+                raise
+            old_vectors, old_log = self._vectors_path(), self._log_path()
+            self._generation = generation
+            self._next_row = n
+            self._log_records = 0
+            self._vectors = None
+            if os.path.exists(self._vectors_path()):
+                self._vectors = np.lib.format.open_memmap(self._vectors_path(), mode="r+")
+            for path in (old_vectors, old_log):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._invalidate()
+
+    def _reserve(self, rows: int, dim: int):
+        """Make room for ``rows`` rows, doubling the file when it is full"""
+        if self._vectors is not None:
+            if self._vectors.shape[1] != dim:
+                raise ValueError(f"Embedding dimension {dim} does not match collection dimension {self._vectors.shape[1]}")
+            if self._vectors.shape[0] >= rows:
+                return
+        capacity = max(rows, 1024, 2 * (self._vectors.shape[0] if self._vectors is not None else 0))
+        tmp_path = self._vectors_path() + ".tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(capacity, dim))
+        if self._next_row:
+            grown[:self._next_row] = self._vectors[:self._next_row]
+        grown.flush()
+        del grown
+        self._vectors = None
+        os.replace(tmp_path, self._vectors_path())
+        self._vectors = np.lib.format.open_memmap(self._vectors_path(), mode="r+")
+
+    def _invalidate(self):
+        self._norms = None
+        self._row_array = None
+        self._column_arrays = {}
+
+    def _embed(self, documents: List[str]) -> np.ndarray:
+        if self.embedding_function is None:
+            raise ValueError("No embeddings given and the collection has no embedding function")
+        return np.asarray(self.embedding_function(input=documents), dtype=np.float32)
+
+    def _set_metadata(self, i: int, meta: Optional[Dict]):
+        for column in self._columns.values():
+            column[i] = None
+        for key, value in (meta or {}).items():
+            if key not in self._columns:
+                self._columns[key] = [None] * len(self._ids)
+            self._columns[key][i] = value
+
+    def _row_metadata(self, i: int) -> Optional[Dict]:
+        meta = {k: v[i] for k, v in self._columns.items() if v[i] is not None}
+        return meta or None
+
+    def _write(self, ids, embeddings, documents, metadatas, existing: str):
+        """existing is "error", "replace" or "skip" for ids already stored"""
+        ids = list(ids)
+        if len(set(ids)) != len(ids):
+            raise ValueError("Expected IDs to be unique")
+        if embeddings is None and documents is not None:
+            embeddings = self._embed(list(documents))
+
+        with self._lock:
+            if existing == "error":
+                duplicates = [i for i in ids if i in self._row_of]
+                if duplicates:
+                    raise ValueError(f"IDs already exist: {duplicates[:5]}")
+            vectors = None
+            if embeddings is not None:
+                vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+
+            records, new_vectors = [], []
+            for j, doc_id in enumerate(ids):
+                i = self._row_of.get(doc_id)
+                if i is None:
+                    if existing == "skip":
+                        continue
+                    if vectors is None:
+                        raise ValueError(f"No embedding for new id {doc_id}")
+                row = self._rows[i] if i is not None else None
+                if vectors is not None:
+                    # A fresh row: the stored one stays valid until the log says otherwise
+                    row = self._next_row + len(new_vectors)
+                    new_vectors.append(vectors[j])
+                document = documents[j] if documents is not None else self._documents[i]
+                metadata = self._row_metadata(i) if i is not None else None
+                if metadatas is not None:
+                    if existing == "skip":
+                        # update() merges like Chroma
+                        metadata = dict(metadata or {}, **(metadatas[j] or {}))
+                    else:
+                        metadata = metadatas[j]
+                records.append({"op": "put", "id": doc_id, "row": row, "document": document, "metadata": metadata})
+            if not records:
+                return
+
+            if new_vectors:
+                self._reserve(self._next_row + len(new_vectors), vectors.shape[1])
+                self._vectors[self._next_row:self._next_row + len(new_vectors)] = np.stack(new_vectors)
+                self._vectors.flush()
+                self._next_row += len(new_vectors)
+            for record in records:
+                self._apply(record)
+            self._invalidate()
+            self._commit(records)
+
+    # -- filtering --------------------------------------------------------
+
+    def _column_array(self, key: str) -> np.ndarray:
+        array = self._column_arrays.get(key)
+        if array is None:
+            values = self._columns.get(key, [None] * len(self._ids))
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+            self._column_arrays[key] = array
+        return array
+
+    def _mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Boolean row mask of a Chroma ``where`` filter"""
+        if not where:
+            return None
+        mask = np.ones(len(self._ids), dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(len(self._ids), dtype=bool)
+                for clause in condition:
+                    any_mask |= self._mask(clause)
+                mask &= any_mask
+            else:
+                column = self._column_array(key)
+                if not isinstance(condition, dict):
+                    condition = {"$eq": condition}
+                for op, value in condition.items():
+                    if op == "$eq":
+                        mask &= column == value
+                    elif op == "$ne":
+                        mask &= column != value
+                    elif op == "$in":
+                        mask &= np.isin(column, list(value))
+                    elif op == "$nin":
+                        mask &= ~np.isin(column, list(value))
+                    else:
+                        raise ValueError(f"Unsupported where operator: {op}")
+        return mask
+
+    def _entries(self, ids=None, where=None) -> List[int]:
+        if ids is not None:
+            rows = [self._row_of[i] for i in ids if i in self._row_of]
+        else:
+            rows = list(range(len(self._ids)))
+        mask = self._mask(where)
+        if mask is not None:
+            rows = [r for r in rows if mask[r]]
+        return rows
+
+    # -- Chroma collection API -------------------------------------------
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs):
+        self._write(ids, embeddings, documents, metadatas, existing="error")
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs):
+        self._write(ids, embeddings, documents, metadatas, existing="replace")
+
+    def update(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs):
+        self._write(ids, embeddings, documents, metadatas, existing="skip")
+
+    def get(self,
+            ids=None,
+            where=None,
+            limit: Optional[int] = None,
+            offset: Optional[int] = None,
+            include=("metadatas", "documents"),
+            **kwargs) -> Dict:
+        if isinstance(ids, str):
+            ids = [ids]
+        with self._lock:
+            rows = self._entries(ids, where)
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            result = {"ids": [self._ids[r] for r in rows]}
+            result["documents"] = [self._documents[r] for r in rows] if "documents" in include else None
+            result["metadatas"] = [self._row_metadata(r) for r in rows] if "metadatas" in include else None
+            result["embeddings"] = (np.asarray(self._vectors[[self._rows[r] for r in rows]], dtype=np.float32)
+                                    if "embeddings" in include and rows else None)
+        return result
+
+    def peek(self, limit: int = 10) -> Dict:
+        return self.get(limit=limit, include=("metadatas", "documents", "embeddings"))
+
+    def _block(self, start: int, stop: int) -> np.ndarray:
+        """float32 vectors of entries start:stop"""
+        if self._row_array is None:
+            self._row_array = np.asarray(self._rows, dtype=np.int64)
+            # Right after a compaction entries are rows 0..n-1, and a slice needs no gather
+            self._contiguous = bool(np.array_equal(self._row_array, np.arange(len(self._rows))))
+        if self._contiguous:
+            return np.asarray(self._vectors[start:stop], dtype=np.float32)
+        return np.asarray(self._vectors[self._row_array[start:stop]], dtype=np.float32)
+
+    def _squared_norms(self) -> np.ndarray:
+        if self._norms is None:
+            n = len(self._ids)
+            norms = np.empty(n, dtype=np.float32)
+            for start in range(0, n, SCORE_BLOCK):
+                block = self._block(start, min(start + SCORE_BLOCK, n))
+                norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+            self._norms = norms
+        return self._norms
+
+    def query(self,
+              query_embeddings=None,
+              query_texts=None,
+              n_results: int = 10,
+              where=None,
+              include=("metadatas", "documents", "distances"),
+              **kwargs) -> Dict:
+        if query_embeddings is None:
+            query_embeddings = self._embed(list(query_texts))
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                for key in result:
+                    result[key] = [[] for _ in queries]
+                return result
+
+            # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2, in row blocks
+            distances = np.empty((n, len(queries)), dtype=np.float32)
+            for start in range(0, n, SCORE_BLOCK):
+                block = self._block(start, min(start + SCORE_BLOCK, n))
+                distances[start:start + len(block)] = -2.0 * (block @ queries.T)
+            distances += self._squared_norms()[:, None]
+            distances += np.einsum("ij,ij->i", queries, queries)[None, :]
+            np.maximum(distances, 0.0, out=distances)
+
+            mask = self._mask(where)
+            candidates = np.arange(n) if mask is None else np.flatnonzero(mask)
+            k = min(n_results, len(candidates))
+            for qi in range(len(queries)):
+                column = distances[candidates, qi] if mask is not None else distances[:, qi]
+                if k < len(column):
+                    top = np.argpartition(column, k - 1)[:k]
+                else:
+                    top = np.arange(len(column))
+                top = top[np.argsort(column[top], kind="stable")]
+                rows = candidates[top]
+                result["ids"].append([self._ids[r] for r in rows])
+                result["documents"].append([self._documents[r] for r in rows])
+                result["metadatas"].append([self._row_metadata(r) for r in rows])
+                result["distances"].append([float(column[t]) for t in top])
+        return result
+
+    def delete(self, ids=None, where=None, **kwargs):
+        with self._lock:
+            doomed = [self._ids[i] for i in self._entries(ids, where)]
+            if not doomed:
+                return
+            record = {"op": "delete", "ids": doomed}
+            self._apply(record)
+            self._invalidate()
+            self._commit([record])
+
+
+class NumpyClient:
+    """Client with the collection-management calls of chromadb.PersistentClient.
+
+    Each collection is a directory under ``path/numpy_index``.
+    """
+
+    def __init__(self, path: str, dtype: str = "float32"):
+        self.path = os.path.join(path, "numpy_index")
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._collections: Dict[str, NumpyCollection] = {}
+        os.makedirs(self.path, exist_ok=True)
+
+    def _collection_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def get_or_create_collection(self, name: str, embedding_function=None, metadata: Optional[Dict] = None, **kwargs):
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = NumpyCollection(self._collection_path(name), name,
+                                             embedding_function=embedding_function,
+                                             metadata=metadata, dtype=self.dtype)
+                self._collections[name] = collection
+            elif embedding_function is not None:
+                collection.embedding_function = embedding_function
+        return collection
+
+    def get_collection(self, name: str, embedding_function=None, **kwargs):
+        if name not in self._collections and not os.path.exists(self._collection_path(name)):
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name, embedding_function=embedding_function)
+
+    def create_collection(self, name: str, embedding_function=None, metadata: Optional[Dict] = None, **kwargs):
+        if name in self._collections or os.path.exists(os.path.join(self._collection_path(name), "records.json")):
+            raise ValueError(f"Collection {name} already exists.")
+        return self.get_or_create_collection(name, embedding_function=embedding_function, metadata=metadata)
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            self._collections.pop(name, None)
+            shutil.rmtree(self._collection_path(name), ignore_errors=True)
+
+    def list_collections(self) -> List[str]:
+        return sorted(os.listdir(self.path))
@@ -0,0 +1,82 @@
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Appended, so a script's own inspect_db / recipe_db still take precedence
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "wikipedia"))
+from context_packer import split_sentences
+from aspect_extractor import ASPECT_METADATA_PREFIX, AspectExtractor, get_aspect_extractor
+
+# Chunks hold at most this many characters of the parent document
+DEFAULT_CHUNK_CHARS = 300
+# Chunks of collection X are stored in collection X + CHUNK_COLLECTION_SUFFIX
+CHUNK_COLLECTION_SUFFIX = "_chunks"
+
+
+def chunk_text(text: str, max_chars: int = DEFAULT_CHUNK_CHARS) -> List[str]:
+    """Consecutive sentences packed into chunks of at most max_chars.
+    A sentence longer than that is cut into max_chars pieces."""
+    chunks = []
+    current = ""
+    for sentence in split_sentences(text):
+        while len(sentence) > max_chars:
+            chunks.append(current)
+            chunks.append(sentence[:max_chars])
+            current, sentence = "", sentence[max_chars:]
+        if len(current) + len(sentence) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += sentence
+    chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+def chunk_heading(metadata: Optional[Dict]) -> str:
+    """Dish name (and English name) put before each chunk so it can be found by name"""
+    metadata = metadata or {}
+    dish_name = metadata.get("dish_name", "")
+    english_name = metadata.get("english_name", "")
+    if dish_name and english_name and english_name != dish_name:
+        return f"{dish_name} ({english_name})"
+    return dish_name or english_name
+
+def chunk_aspects(metadata: Optional[Dict]) -> List[str]:
+    """Aspects a chunk was tagged with, best match first"""
+    value = (metadata or {}).get("aspects", "")
+    return [aspect.strip() for aspect in value.split(",") if aspect.strip()]
+
+
+class RecipeChunker:
+    """Splits recipe documents into bounded sentence chunks tagged with aspects.
+
+    Each chunk keeps its parent's metadata (except the per-aspect snippets,
+    which describe the whole document) plus parent_id, chunk_index,
+    chunk_count and 'aspects': the aspects with snippets in the chunk, most
+    snippets first. Chunk ids are the parent id plus the chunk number; the
+    parent id derives from the content, so re-ingesting an unchanged
+    document yields the same chunks.
+    """
+
+    def __init__(self, max_chars: int = DEFAULT_CHUNK_CHARS, extractor: Optional[AspectExtractor] = None):
+        self.max_chars = max_chars
+        self.extractor = extractor or get_aspect_extractor()
+
+    def chunk(self, parent_id: str, content: str, metadata: Optional[Dict] = None) -> List[Tuple[str, str, Dict]]:
+        """(id, document, metadata) of each chunk of one parent document"""
+        pieces = chunk_text(content or "", self.max_chars)
+        heading = chunk_heading(metadata)
+        base = {key: value for key, value in (metadata or {}).items()
+                if not key.startswith(ASPECT_METADATA_PREFIX)}
+        chunks = []
+        for i, piece in enumerate(pieces):
+            snippets = self.extractor.extract_all(piece)
+            aspects = sorted((aspect for aspect in snippets if snippets[aspect]),
+                             key=lambda aspect: -len(snippets[aspect]))
+            chunk_metadata = dict(base,
+                                  parent_id=parent_id,
+                                  chunk_index=str(i),
+                                  chunk_count=str(len(pieces)),
+                                  aspects=", ".join(aspects))
+            document = f"{heading}\n{piece}" if heading and not piece.startswith(heading) else piece
+            chunks.append((f"{parent_id}#{i}", document, chunk_metadata))
+        return chunks
@@ -0,0 +1,940 @@
+import chromadb
+from chromadb.config import Settings
+from chromadb.errors import ChromaError
+from chromadb.utils import embedding_functions
+import hashlib
+import json
+import numpy as np
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import List, Dict, Iterable, Optional, Tuple
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from embedding_cache import CachedEmbeddingFunction, LRUCache
+from lexical_index import NgramBM25Index
+from numpy_store import NumpyClient
+from recipe_chunks import CHUNK_COLLECTION_SUFFIX, DEFAULT_CHUNK_CHARS, RecipeChunker, chunk_aspects
+
+DEFAULT_COLLECTION = "chinese_recipes"
+# Constant of reciprocal rank fusion, score = sum(1 / (RRF_K + rank))
+RRF_K = 60
+
+# Storage backends, each a factory persist_dir -> client exposing
+# get_or_create_collection / create_collection / delete_collection
+BACKENDS = {
+    # Telemetry off: Chroma's event batching is not thread-safe and makes
+    # concurrent queries fail with a KeyError
+    "chroma": lambda persist_dir: chromadb.PersistentClient(
+        path=persist_dir,
+        settings=Settings(anonymized_telemetry=False,
+                          chroma_product_telemetry_impl="chroma_telemetry.NoProductTelemetry")),
+    "numpy": NumpyClient,
+    "numpy16": lambda persist_dir: NumpyClient(persist_dir, dtype="float16"),
+}
+DEFAULT_BACKEND = os.environ.get("RECIPE_DB_BACKEND", "chroma")
+
+def make_client(persist_dir: str, backend: str = DEFAULT_BACKEND):
+    """Create the storage client of a backend"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend](persist_dir)
+
+class LocalRecipeDB:
+    def __init__(self,
+                 persist_dir: str = "./recipe_db",
+                 collection_name: str = DEFAULT_COLLECTION,
+                 client=None,
+                 embedding_fn=None,
+                 query_cache_size: int = 4096,
+                 result_cache_size: int = 4096,
+                 backend: str = DEFAULT_BACKEND,
+                 chunk_chars: Optional[int] = None):
+        """Initialize the local recipe database
+
+        Prefer get_recipe_db() over constructing this directly so that the
+        client and embedding model are shared across the process. backend
+        picks the storage used when no client is given (see BACKENDS).
+        With chunk_chars, add_recipes also writes sentence chunks of at most
+        chunk_chars characters to the <collection>_chunks collection, which
+        embeds every recipe a second time (about 3x the model calls of the
+        documents alone). Once a store has chunks (see chunk_recipes.py),
+        add_recipes keeps them up to date whatever chunk_chars is.
+        """
+        os.makedirs(persist_dir, exist_ok=True)
+        self.persist_dir = persist_dir
+        self.collection_name = collection_name
+        self.backend = backend
+        self.client = client or make_client(persist_dir, backend)
+        # Documents and queries are embedded through a persistent cache, so
+        # re-ingesting unchanged text does not run the model again
+        self.embedding_fn = embedding_fn or CachedEmbeddingFunction(
+            embedding_functions.DefaultEmbeddingFunction(),
+            os.path.join(persist_dir, "embedding_cache")
+        )
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=self.embedding_fn,
+            metadata={"description": "Chinese recipe database"}
+        )
+        # Bumped on every write through this handle; caches built on top of
+        # the collection compare against it to know when to rebuild.
+        self.version = 0
+        # Every write, from any process, also leaves a new token in this file;
+        # caches compare it to the token they were built at to notice writes
+        # made through other handles
+        self.marker_path = os.path.join(persist_dir, collection_name + ".changed")
+        self._dish_index = None
+        # Many questions share a dish, so the same query strings come back
+        # over and over; keep their embeddings and (while the collection is
+        # unchanged) their results in memory.
+        self._query_embeddings = LRUCache(query_cache_size)
+        self._results = LRUCache(result_cache_size) if result_cache_size else None
+        self._results_marker = None
+        self._results_checked_at = 0.0
+        self._lexical_index = None
+        self._lexical_marker = None
+        self._lexical_checked_at = 0.0
+        self._lexical_lock = threading.Lock()
+        self.is_chunk_collection = collection_name.endswith(CHUNK_COLLECTION_SUFFIX)
+        self.chunker = RecipeChunker(chunk_chars) if chunk_chars and not self.is_chunk_collection else None
+        self._chunk_db = None
+    
+    @property
+    def chunk_db(self) -> "LocalRecipeDB":
+        """Handle on the collection holding the chunks of this one's documents,
+        created on first use; readers go through existing_chunk_db()"""
+        if self._chunk_db is None:
+            self._chunk_db = LocalRecipeDB(
+                self.persist_dir,
+                collection_name=self.collection_name + CHUNK_COLLECTION_SUFFIX,
+                client=self.client,
+                embedding_fn=self.embedding_fn,
+                backend=self.backend,
+                chunk_chars=None
+            )
+        return self._chunk_db
+    
+    def existing_chunk_db(self) -> Optional["LocalRecipeDB"]:
+        """chunk_db if the chunk collection exists, else None (without creating it)"""
+        if self.is_chunk_collection:
+            return None
+        if self._chunk_db is None:
+            try:
+                self.client.get_collection(self.collection_name + CHUNK_COLLECTION_SUFFIX,
+                                           embedding_function=self.embedding_fn)
+            except (ValueError, ChromaError):
+                return None
+        return self.chunk_db
+    
+    @property
+    def dish_index(self) -> "DishIndex":
+        """Lazily created dish-name index shared by everyone using this handle"""
+        if self._dish_index is None:
+            self._dish_index = DishIndex(self)
+        return self._dish_index
+    
+    @property
+    def lexical_index(self) -> NgramBM25Index:
+        """BM25 index over the collection's documents, built on first use.
+
+        Writes through this handle update it incrementally; it is rebuilt if
+        the change marker moved under it (another handle or process wrote).
+        """
+        with self._lexical_lock:
+            index = self._lexical_index
+            now = time.monotonic()
+            if index is not None and now - self._lexical_checked_at >= 5.0:
+                if self.read_change_marker() != self._lexical_marker:
+                    index = None
+                self._lexical_checked_at = now
+            if index is None:
+                # Read before loading, so writes made during the load show up
+                # as a change on the next check
+                self._lexical_marker = self.read_change_marker()
+                index = NgramBM25Index()
+                offset, page_size = 0, 5000
+                while True:
+                    result = self.collection.get(limit=page_size, offset=offset, include=["documents"])
+                    index.add(result['ids'], result['documents'])
+                    if len(result['ids']) < page_size:
+                        break
+                    offset += page_size
+                self._lexical_index = index
+                self._lexical_checked_at = now
+        return index
+    
+    def read_change_marker(self) -> Optional[str]:
+        """Token of the last write to the collection by any handle, None if
+        it was never written through a LocalRecipeDB"""
+        try:
+            with open(self.marker_path, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    
+    def _mark_changed(self):
+        self.version += 1
+        if self._results is not None:
+            self._results.clear()
+        previous = self.read_change_marker()
+        token = uuid.uuid4().hex
+        # Written in place rather than renamed over, which fails on Windows
+        # while a reader has the file open; a torn read only costs a refresh
+        with open(self.marker_path, "w", encoding="utf-8") as f:
+            f.write(token)
+        # Caches that were current before this write stay current (the results
+        # were just cleared, the lexical index is updated by the caller); if
+        # someone else wrote in between they keep the old token and refresh
+        if self._results_marker == previous:
+            self._results_marker = token
+        if self._lexical_marker == previous:
+            self._lexical_marker = token
+    
+    def _check_results_fresh(self):
+        """Drop cached results if another handle or process wrote to the
+        collection (our own writes clear them in _mark_changed)"""
+        now = time.monotonic()
+        if now - self._results_checked_at < 5.0:
+            return
+        marker = self.read_change_marker()
+        if marker != self._results_marker:
+            self._results.clear()
+            self._results_marker = marker
+        self._results_checked_at = now
+    
+    def _embed_queries(self, queries: List[str]) -> List:
+        """Embed queries through the in-memory LRU, one model call for the misses"""
+        embeddings = [self._query_embeddings.get(q) for q in queries]
+        missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+        if missing:
+            computed = dict(zip(missing, self.embedding_fn(missing)))
+            for q, e in computed.items():
+                self._query_embeddings.put(q, e)
+            embeddings = [e if e is not None else computed[q] for q, e in zip(queries, embeddings)]
+        return embeddings
+    
+    def update_metadata(self, ids: List[str], metadatas: List[Dict]):
+        """Merge metadata fields into existing entries without re-embedding"""
+        self.collection.update(ids=ids, metadatas=[self._prepare_metadata(m) for m in metadatas])
+        self._mark_changed()
+    
+    @staticmethod
+    def _copy_results(results: List[Dict]) -> List[Dict]:
+        return [dict(r, metadata=dict(r['metadata'] or {})) for r in results]
+    
+    def clear(self):
+        """Delete and recreate the collection"""
+        self.client.delete_collection(self.collection_name)
+        self.collection = self.client.create_collection(
+            name=self.collection_name,
+            embedding_function=self.embedding_fn,
+            metadata={"description": "Chinese recipe database"}
+        )
+        self._lexical_index = None
+        chunk_db = self.existing_chunk_db()
+        if chunk_db is not None:
+            chunk_db.clear()
+        self._mark_changed()
+    
+    def _prepare_metadata(self, metadata: Dict) -> Dict:
+        """Convert metadata to Chroma-compatible format"""
+        processed_metadata = {}
+        for key, value in metadata.items():
+            # Convert lists to comma-separated strings
+            if isinstance(value, list):
+                processed_metadata[key] = ", ".join(str(v) for v in value)
+            # Convert all other values to strings
+            else:
+                processed_metadata[key] = str(value)
+        return processed_metadata
+    
+    @staticmethod
+    def recipe_id(content: str, source: Optional[str] = None) -> str:
+        """Deterministic id derived from the source and the document text"""
+        digest = hashlib.sha1(f"{source or 'unknown'}\n{content}".encode("utf-8")).hexdigest()
+        return f"recipe_{digest[:24]}"
+    
+    def add_recipe(self, 
+                   content: str, 
+                   metadata: Optional[Dict] = None,
+                   source: Optional[str] = None) -> str:
+        """Add a single recipe to the database"""
+        stats = self.add_recipes([{"content": content, "metadata": metadata, "source": source}],
+                                 verbose=False)
+        return stats["ids"][0]
+    
+    def add_recipes(self,
+                    recipes: Iterable[Dict],
+                    batch_size: int = 64,
+                    verbose: bool = True) -> Dict:
+        """Upsert recipes in chunks, embedding each chunk in one model call
+
+        Each item is a dict with "content" and optional "metadata" and
+        "source". Ids are derived from the content, so ingesting the same
+        recipe again updates it instead of adding a duplicate, and concurrent
+        writers of the same recipe agree on its id.
+        """
+        ids = []
+        chunks = 0
+        start = time.perf_counter()
+        chunking = self.chunker is not None or self.existing_chunk_db() is not None
+        
+        def flush(chunk: Dict[str, Tuple[str, Dict]]):
+            documents = [content for content, _ in chunk.values()]
+            metadatas = [meta for _, meta in chunk.values()]
+            self.upsert_embedded(list(chunk), documents, metadatas, self.embedding_fn(documents))
+            if chunking:
+                self.add_chunks(list(chunk), documents, metadatas)
+        
+        chunk: Dict[str, Tuple[str, Dict]] = {}
+        for recipe in recipes:
+            content = recipe["content"]
+            source = recipe.get("source")
+            meta = {
+                "timestamp": datetime.now().isoformat(),
+                "source": source or "unknown"
+            }
+            if recipe.get("metadata"):
+                meta.update(self._prepare_metadata(recipe["metadata"]))
+            
+            doc_id = self.recipe_id(content, source)
+            ids.append(doc_id)
+            # Chroma rejects duplicate ids within one upsert; the last one wins
+            chunk[doc_id] = (content, meta)
+            if len(chunk) >= batch_size:
+                flush(chunk)
+                chunks += 1
+                chunk = {}
+        if chunk:
+            flush(chunk)
+            chunks += 1
+        
+        elapsed = time.perf_counter() - start
+        stats = {
+            "ids": ids,
+            "documents": len(ids),
+            "chunks": chunks,
+            "seconds": elapsed,
+            "docs_per_sec": len(ids) / elapsed if elapsed > 0 else 0.0
+        }
+        if verbose:
+            print(f"Upserted {stats['documents']} documents in {chunks} chunks "
+                  f"({elapsed:.1f}s, {stats['docs_per_sec']:.1f} docs/sec)")
+        return stats
+    
+    def upsert_embedded(self,
+                        ids: List[str],
+                        documents: List[str],
+                        metadatas: List[Dict],
+                        embeddings: List) -> None:
+        """Upsert entries whose embeddings are already computed, e.g. from a snapshot"""
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+        if self._lexical_index is not None:
+            self._lexical_index.add(ids, documents)
+        self._mark_changed()
+    
+    def delete_recipes(self, ids: List[str]) -> None:
+        """Delete entries by id, and their chunks"""
+        if not ids:
+            return
+        self.collection.delete(ids=ids)
+        if self._lexical_index is not None:
+            self._lexical_index.remove(ids)
+        chunk_db = self.existing_chunk_db()
+        if chunk_db is not None:
+            chunk_db.delete_recipes(self._chunk_ids(ids))
+        self._mark_changed()
+    
+    def _chunk_ids(self, parent_ids: List[str]) -> List[str]:
+        chunk_db = self.existing_chunk_db()
+        if chunk_db is None or not parent_ids:
+            return []
+        result = chunk_db.collection.get(where={"parent_id": {"$in": list(parent_ids)}}, include=["metadatas"])
+        return result['ids']
+    
+    def add_chunks(self, ids: List[str], documents: List[str], metadatas: List[Dict]) -> int:
+        """Chunk documents already stored under ids into the chunk collection.
+
+        Chunks left over from an earlier chunking of the same parents (e.g.
+        with another chunk size) are deleted. Returns the number written.
+        """
+        chunker = self.chunker or RecipeChunker()
+        chunk_ids, chunk_documents, chunk_metadatas = [], [], []
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            for chunk_id, chunk_document, chunk_metadata in chunker.chunk(doc_id, document, metadata):
+                chunk_ids.append(chunk_id)
+                chunk_documents.append(chunk_document)
+                chunk_metadatas.append(chunk_metadata)
+        stale = sorted(set(self._chunk_ids(ids)) - set(chunk_ids))
+        self.chunk_db.delete_recipes(stale)
+        if chunk_ids:
+            self.chunk_db.upsert_embedded(chunk_ids, chunk_documents, chunk_metadatas,
+                                          self.embedding_fn(chunk_documents))
+        return len(chunk_ids)
+    
+    def rebuild_chunks(self, page_size: int = 256, force: bool = False) -> Dict:
+        """Chunk every stored document whose chunks are missing (all with force),
+        e.g. after importing a snapshot or for a store built before chunking"""
+        chunked = set()
+        if not force and self.existing_chunk_db() is not None:
+            offset = 0
+            while True:
+                result = self.chunk_db.collection.get(limit=5000, offset=offset, include=["metadatas"])
+                chunked.update((m or {}).get('parent_id') for m in result['metadatas'])
+                if len(result['ids']) < 5000:
+                    break
+                offset += 5000
+        
+        # Read every page before writing so the offsets do not shift
+        entries = []
+        offset = 0
+        while True:
+            result = self.collection.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+            entries.extend(zip(result['ids'], result['documents'], result['metadatas']))
+            if len(result['ids']) < page_size:
+                break
+            offset += page_size
+        
+        todo = [entry for entry in entries if entry[0] not in chunked]
+        chunks = 0
+        for start in range(0, len(todo), page_size):
+            batch = todo[start:start + page_size]
+            chunks += self.add_chunks([e[0] for e in batch], [e[1] or "" for e in batch], [e[2] or {} for e in batch])
+        return {'documents': len(todo), 'chunks': chunks, 'skipped': len(entries) - len(todo)}
+    
+    def has_chunks(self) -> bool:
+        chunk_db = self.existing_chunk_db()
+        return chunk_db is not None and chunk_db.collection.count() > 0
+    
+    def dish_entries(self, source: Optional[str] = None,
+                     page_size: int = 5000) -> Dict[str, List[Tuple[str, str]]]:
+        """Map each stored dish_name to the (id, timestamp) of its entries,
+        only those written by source if given (the scrapers share a store)"""
+        dishes: Dict[str, List[Tuple[str, str]]] = {}
+        where = {"source": source} if source else None
+        offset = 0
+        while True:
+            result = self.collection.get(where=where, limit=page_size, offset=offset, include=["metadatas"])
+            for doc_id, metadata in zip(result['ids'], result['metadatas']):
+                metadata = metadata or {}
+                dishes.setdefault(metadata.get('dish_name', ''), []).append(
+                    (doc_id, metadata.get('timestamp', '')))
+            if len(result['ids']) < page_size:
+                break
+            offset += page_size
+        return dishes
+    
+    def search_recipes(self, 
+                      query: str, 
+                      n_results: int = 3) -> List[Dict]:
+        """Search for recipes similar to the query"""
+        cache_key = (query, n_results, self.version)
+        if self._results is not None:
+            self._check_results_fresh()
+            cached = self._results.get(cache_key)
+            if cached is not None:
+                return self._copy_results(cached)
+        
+        results = self.collection.query(
+            query_embeddings=self._embed_queries([query]),
+            n_results=n_results
+        )
+        
+        formatted_results = []
+        for i in range(len(results['documents'][0])):
+            formatted_results.append({
+                'content': results['documents'][0][i],
+                'metadata': self._format_metadata(results['metadatas'][0][i]),
+                'distance': results['distances'][0][i]
+            })
+        
+        if self._results is not None:
+            self._results.put(cache_key, self._copy_results(formatted_results))
+        return formatted_results
+    
+    def _format_metadata(self, metadata: Dict) -> Dict:
+        """Convert string back to list for main_ingredients"""
+        if metadata and 'main_ingredients' in metadata:
+            metadata['main_ingredients'] = [
+                ing.strip() 
+                for ing in metadata['main_ingredients'].split(',')
+            ]
+        return metadata
+    
+    def search_recipes_batch(self,
+                             queries: List[str],
+                             n_results: int = 3,
+                             rrf_k: int = RRF_K) -> List[Dict]:
+        """Search several queries with one embedding call and one query call.
+
+        Documents returned by more than one query are kept once and ranked by
+        reciprocal rank fusion. Each result carries its 'id', fused 'score'
+        and the smallest 'distance' seen across the queries.
+        """
+        return self.search_recipes_bulk([queries], n_results=n_results, rrf_k=rrf_k)[0]
+    
+    def search_recipes_bulk(self,
+                            query_groups: List[List[str]],
+                            n_results: int = 3,
+                            batch_size: int = 256,
+                            rrf_k: int = RRF_K) -> List[List[Dict]]:
+        """Run the queries of many questions (e.g. a whole eval set) at once.
+
+        Identical query strings across groups are embedded and searched only
+        once. Returns one fused result list per group, as search_recipes_batch.
+        """
+        unique_queries = list(dict.fromkeys(q for group in query_groups for q in group))
+        rankings = {}
+        for start in range(0, len(unique_queries), batch_size):
+            batch = unique_queries[start:start + batch_size]
+            results = self.collection.query(
+                query_embeddings=self._embed_queries(batch),
+                n_results=n_results
+            )
+            for j, query in enumerate(batch):
+                rankings[query] = [
+                    (results['ids'][j][i],
+                     results['documents'][j][i],
+                     results['metadatas'][j][i],
+                     results['distances'][j][i])
+                    for i in range(len(results['ids'][j]))
+                ]
+        
+        return [self._fuse_rankings([rankings[q] for q in group], rrf_k)
+                for group in query_groups]
+    
+    def search(self,
+               query: str,
+               n_results: int = 3,
+               lexical_weight: float = 0.5,
+               candidates: Optional[int] = None) -> List[Dict]:
+        """Hybrid search: dense and BM25 n-gram scores fused in one call.
+
+        Character n-grams match Chinese dish names that the English embedding
+        model handles poorly, so a single query finds documents that used to
+        need a separate dish-name query. Results carry 'id', 'content',
+        'metadata', 'distance' and the fused 'score'.
+        """
+        return self.search_bulk([query], n_results=n_results, lexical_weight=lexical_weight,
+                                candidates=candidates)[0]
+    
+    def search_bulk(self,
+                    queries: List[str],
+                    n_results: int = 3,
+                    lexical_weight: float = 0.5,
+                    candidates: Optional[int] = None,
+                    batch_size: int = 256) -> List[List[Dict]]:
+        """search() for many queries, with one dense query call per batch.
+
+        Each side contributes its top ``candidates`` documents. Over their
+        union, BM25 scores are divided by the best one, squared L2 distances
+        of the (unit length) embeddings become cosine similarity, and the two
+        are mixed with ``lexical_weight``.
+        """
+        depth = candidates or max(4 * n_results, 10)
+        index = self.lexical_index
+        all_results = []
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            embeddings = self._embed_queries(batch)
+            dense = self.collection.query(query_embeddings=embeddings, n_results=depth)
+            lexical = [index.search(query, depth) for query in batch]
+            
+            # Documents only the lexical side found still need a distance
+            known = {doc_id for ids in dense['ids'] for doc_id in ids}
+            missing = list(dict.fromkeys(doc_id for hits in lexical for doc_id, _ in hits
+                                         if doc_id not in known))
+            extra = {}
+            if missing:
+                got = self.collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+                for i, doc_id in enumerate(got['ids']):
+                    extra[doc_id] = (got['documents'][i], got['metadatas'][i],
+                                     np.asarray(got['embeddings'][i], dtype=np.float32))
+            
+            for j, embedding in enumerate(embeddings):
+                pool = {}
+                for i, doc_id in enumerate(dense['ids'][j]):
+                    pool[doc_id] = [dense['documents'][j][i], dense['metadatas'][j][i],
+                                    dense['distances'][j][i], 0.0]
+                query_vector = np.asarray(embedding, dtype=np.float32)
+                for doc_id, bm25 in lexical[j]:
+                    if doc_id not in pool:
+                        if doc_id not in extra:
+                            continue  # deleted since the index was built
+                        content, metadata, vector = extra[doc_id]
+                        pool[doc_id] = [content, metadata, float(np.sum((vector - query_vector) ** 2)), 0.0]
+                    pool[doc_id][3] = bm25
+                all_results.append(self._fuse_scores(pool, lexical_weight)[:n_results])
+        return all_results
+    
+    def search_chunks(self,
+                      query: str,
+                      n_results: int = 4,
+                      aspect: Optional[str] = None,
+                      expand_parents: bool = False) -> List[Dict]:
+        """search() over the chunks of the stored documents (see search_chunks_bulk)"""
+        return self.search_chunks_bulk([query], n_results=n_results, aspects=[aspect],
+                                       expand_parents=expand_parents)[0]
+    
+    def search_chunks_bulk(self,
+                           queries: List[str],
+                           n_results: int = 4,
+                           aspects: Optional[List[Optional[str]]] = None,
+                           expand_parents: bool = False,
+                           aspect_boost: float = 0.1,
+                           lexical_weight: float = 0.5) -> List[List[Dict]]:
+        """Best chunks of many queries, found by hybrid search on the chunk collection.
+
+        Chunks tagged with the query's aspect (aspects[i], e.g. 'flavor')
+        get aspect_boost added to their score. Results carry 'parent_id' and
+        'aspects'. With expand_parents, the parent documents of the best
+        chunks are returned instead, best first, each with the matched
+        chunk texts under 'chunks'.
+        """
+        aspects = aspects or [None] * len(queries)
+        chunk_db = self.existing_chunk_db()
+        if chunk_db is None:
+            return [[] for _ in queries]
+        depth = 3 * n_results if expand_parents or any(aspects) else n_results
+        all_results = []
+        for results, aspect in zip(chunk_db.search_bulk(queries, n_results=depth,
+                                                        lexical_weight=lexical_weight), aspects):
+            for result in results:
+                result['parent_id'] = result['metadata'].get('parent_id')
+                result['aspects'] = chunk_aspects(result['metadata'])
+                if aspect and aspect in result['aspects']:
+                    result['score'] += aspect_boost
+            results.sort(key=lambda r: (-r['score'], r['distance']))
+            all_results.append(results if expand_parents else results[:n_results])
+        if expand_parents:
+            all_results = self._expand_parents(all_results, n_results)
+        return all_results
+    
+    def _expand_parents(self, all_results: List[List[Dict]], n_results: int) -> List[List[Dict]]:
+        """Replace ranked chunks by their first n_results distinct parents"""
+        parent_ids = list(dict.fromkeys(r['parent_id'] for results in all_results for r in results))
+        got = self.collection.get(ids=parent_ids, include=["documents", "metadatas"]) if parent_ids else \
+            {'ids': [], 'documents': [], 'metadatas': []}
+        parents = {doc_id: (got['documents'][i], got['metadatas'][i]) for i, doc_id in enumerate(got['ids'])}
+        expanded = []
+        for results in all_results:
+            by_parent = {}
+            for result in results:
+                parent_id = result['parent_id']
+                if parent_id not in parents:
+                    continue  # parent deleted since the chunk was written
+                if parent_id not in by_parent:
+                    if len(by_parent) == n_results:
+                        continue
+                    content, metadata = parents[parent_id]
+                    by_parent[parent_id] = {
+                        'id': parent_id,
+                        'content': content,
+                        'metadata': self._format_metadata(dict(metadata or {})),
+                        'distance': result['distance'],
+                        'score': result['score'],
+                        'chunks': []
+                    }
+                by_parent[parent_id]['chunks'].append(result['content'])
+            expanded.append(list(by_parent.values()))
+        return expanded
+    
+    def _fuse_scores(self, pool: Dict[str, List], lexical_weight: float) -> List[Dict]:
+        """Order id -> [content, metadata, distance, bm25] by the mixed score"""
+        if not pool:
+            return []
+        best_bm25 = max(entry[3] for entry in pool.values()) or 1.0
+        results = []
+        for doc_id, (content, metadata, distance, bm25) in pool.items():
+            # ||a - b||^2 = 2 - 2 cos(a, b) for unit vectors
+            similarity = min(max(1.0 - distance / 2.0, 0.0), 1.0)
+            results.append({
+                'id': doc_id,
+                'content': content,
+                'metadata': self._format_metadata(dict(metadata or {})),
+                'distance': distance,
+                'score': (1 - lexical_weight) * similarity + lexical_weight * bm25 / best_bm25
+            })
+        return sorted(results, key=lambda r: (-r['score'], r['distance']))
+    
+    def _fuse_rankings(self, rankings: List[List[Tuple]], rrf_k: int) -> List[Dict]:
+        """Dedupe documents by id and order them by reciprocal rank fusion"""
+        fused = {}
+        for ranking in rankings:
+            for rank, (doc_id, content, metadata, distance) in enumerate(ranking, 1):
+                result = fused.get(doc_id)
+                if result is None:
+                    result = fused[doc_id] = {
+                        'id': doc_id,
+                        'content': content,
+                        'metadata': self._format_metadata(dict(metadata)),
+                        'distance': distance,
+                        'score': 0.0
+                    }
+                result['score'] += 1.0 / (rrf_k + rank)
+                result['distance'] = min(result['distance'], distance)
+        
+        return sorted(fused.values(), key=lambda r: (-r['score'], r['distance']))
+    
+    def get_collection_stats(self) -> Dict:
+        """Get statistics about the collection"""
+        stats = {
+            "total_recipes": self.collection.count(),
+            "peek": self.collection.peek()
+        }
+        if hasattr(self.embedding_fn, "stats"):
+            stats["embedding_cache"] = self.embedding_fn.stats()
+        return stats
+    
+    def cache_stats(self) -> Dict:
+        """Hit-rate counters of the query caches"""
+        stats = {"query_embeddings": self._query_embeddings.stats()}
+        if self._results is not None:
+            stats["results"] = self._results.stats()
+        if hasattr(self.embedding_fn, "stats"):
+            stats["embedding_cache"] = self.embedding_fn.stats()
+        return stats
+    
+    def close(self):
+        """Drop the client and collection handles"""
+        self.collection = None
+        self.client = None
+
+
+class DishIndex:
+    """In-memory index from dish names to collection entries.
+
+    Entries are keyed by the exact ``dish_name`` metadata and, case
+    insensitively, by ``english_name`` and the comma-separated ``aliases``
+    field. While the index is cold, single dish-name lookups are answered
+    with a server-side ``where`` filter and memoized; the full index is built
+    once (in pages) when it is needed for alias lookups, listing, or after
+    ``build_after`` distinct cold lookups. The index is dropped whenever the
+    handle's version or the collection's change marker moves.
+    """
+
+    ALIAS_FIELDS = ("english_name", "aliases")
+
+    def __init__(self,
+                 db: "LocalRecipeDB",
+                 refresh_interval: float = 5.0,
+                 build_after: int = 64,
+                 page_size: int = 5000):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.build_after = build_after
+        self.page_size = page_size
+        self._lock = threading.RLock()
+        self._reset(None, None)
+
+    def _reset(self, version, marker):
+        self._version = version
+        self._marker = marker
+        self._checked_at = time.monotonic()
+        self._built = False
+        self._by_dish: Dict[str, List[Dict]] = {}
+        self._by_alias: Dict[str, List[Dict]] = {}
+
+    @staticmethod
+    def _normalize(name: str) -> str:
+        return name.strip().lower()
+
+    @staticmethod
+    def _to_entries(result: Dict) -> List[Dict]:
+        return [
+            {
+                'id': result['ids'][i],
+                'content': result['documents'][i],
+                'metadata': result['metadatas'][i]
+            }
+            for i in range(len(result['ids']))
+        ]
+
+    def _check_fresh(self):
+        """Drop the index if the collection changed since it was filled"""
+        now = time.monotonic()
+        if (self.db.version == self._version
+                and now - self._checked_at < self.refresh_interval):
+            return
+        marker = self.db.read_change_marker()
+        if self.db.version != self._version or marker != self._marker:
+            self._reset(self.db.version, marker)
+        self._checked_at = now
+
+    def _add_entry(self, entry: Dict):
+        meta = entry['metadata'] or {}
+        dish_name = meta.get('dish_name')
+        if dish_name:
+            self._by_dish.setdefault(dish_name, []).append(entry)
+        names = set()
+        for field in self.ALIAS_FIELDS:
+            value = meta.get(field)
+            if value:
+                names.update(self._normalize(v) for v in str(value).split(',') if v.strip())
+        for name in names:
+            self._by_alias.setdefault(name, []).append(entry)
+
+    def build(self):
+        """Load every entry once and index it"""
+        with self._lock:
+            self._check_fresh()
+            if self._built:
+                return
+            self._by_dish = {}
+            self._by_alias = {}
+            offset = 0
+            while True:
+                result = self.db.collection.get(limit=self.page_size, offset=offset)
+                for entry in self._to_entries(result):
+                    self._add_entry(entry)
+                if len(result['ids']) < self.page_size:
+                    break
+                offset += self.page_size
+            self._built = True
+
+    def lookup(self, dish_name: str) -> List[Dict]:
+        """Entries whose dish_name metadata equals dish_name"""
+        with self._lock:
+            self._check_fresh()
+            if not self._built and dish_name not in self._by_dish:
+                if len(self._by_dish) >= self.build_after:
+                    self.build()
+                else:
+                    result = self.db.collection.get(where={"dish_name": dish_name})
+                    self._by_dish[dish_name] = self._to_entries(result)
+            return list(self._by_dish.get(dish_name, []))
+
+    def lookup_alias(self, name: str) -> List[Dict]:
+        """Entries matching name as dish_name, english_name or alias"""
+        self.build()
+        with self._lock:
+            matches = self._by_dish.get(name)
+            if matches:
+                return list(matches)
+            return list(self._by_alias.get(self._normalize(name), []))
+
+    def dish_names(self) -> List[str]:
+        """All distinct dish names in the collection"""
+        self.build()
+        with self._lock:
+            return [name for name, entries in self._by_dish.items() if entries]
+
+
+class RecipeDBRegistry:
+    """Process-wide registry of long-lived LocalRecipeDB handles.
+
+    Handles are keyed by (absolute persist_dir, collection name, backend)
+    and created lazily on first use. All handles share one embedding model,
+    and one storage client and embedding cache per persist_dir, so the client
+    start-up and the ONNX model load are paid once per process instead of
+    once per lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handles: Dict[Tuple[str, str, str], LocalRecipeDB] = {}
+        self._clients: Dict[Tuple[str, str], object] = {}
+        self._embedding_fns: Dict[str, CachedEmbeddingFunction] = {}
+        self._base_embedding_fn = None
+
+    @staticmethod
+    def _key(persist_dir: str, collection_name: str, backend: str) -> Tuple[str, str, str]:
+        return (os.path.abspath(persist_dir), collection_name, backend)
+
+    def get(self,
+            persist_dir: str = "./recipe_db",
+            collection_name: str = DEFAULT_COLLECTION,
+            backend: str = DEFAULT_BACKEND) -> LocalRecipeDB:
+        """Return the shared handle for a collection, creating it on first use"""
+        key = self._key(persist_dir, collection_name, backend)
+        db = self._handles.get(key)
+        if db is not None:
+            return db
+        
+        with self._lock:
+            db = self._handles.get(key)
+            if db is None:
+                client = self._clients.get((key[0], backend))
+                if client is None:
+                    os.makedirs(key[0], exist_ok=True)
+                    client = make_client(key[0], backend)
+                    self._clients[(key[0], backend)] = client
+                db = LocalRecipeDB(
+                    persist_dir=key[0],
+                    collection_name=collection_name,
+                    client=client,
+                    embedding_fn=self._get_embedding_fn(key[0]),
+                    backend=backend
+                )
+                self._handles[key] = db
+        return db
+
+    def _get_embedding_fn(self, persist_dir: str) -> CachedEmbeddingFunction:
+        """One embedding cache per persist_dir, all sharing one model"""
+        embedding_fn = self._embedding_fns.get(persist_dir)
+        if embedding_fn is None:
+            if self._base_embedding_fn is None:
+                self._base_embedding_fn = embedding_functions.DefaultEmbeddingFunction()
+            embedding_fn = CachedEmbeddingFunction(
+                self._base_embedding_fn,
+                os.path.join(persist_dir, "embedding_cache")
+            )
+            self._embedding_fns[persist_dir] = embedding_fn
+        return embedding_fn
+
+    def close(self,
+              persist_dir: str = "./recipe_db",
+              collection_name: str = DEFAULT_COLLECTION,
+              backend: str = DEFAULT_BACKEND):
+        """Close one handle; the client is released once no handle uses it"""
+        key = self._key(persist_dir, collection_name, backend)
+        with self._lock:
+            db = self._handles.pop(key, None)
+            if db is not None:
+                db.close()
+            if not any(k[0] == key[0] and k[2] == backend for k in self._handles):
+                self._clients.pop((key[0], backend), None)
+            if not any(k[0] == key[0] for k in self._handles):
+                self._embedding_fns.pop(key[0], None)
+
+    def close_all(self):
+        """Close every handle and drop the shared clients and embedding model"""
+        with self._lock:
+            for db in self._handles.values():
+                db.close()
+            self._handles.clear()
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._embedding_fns.clear()
+            self._base_embedding_fn = None
+        chroma_clients = [c for c in clients if hasattr(c, "clear_system_cache")]
+        if chroma_clients:
+            # Chroma keeps its own per-path system cache; clear it so the
+            # next get() really starts a fresh client.
+            chroma_clients[0].clear_system_cache()
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+
+_registry = RecipeDBRegistry()
+
+def get_recipe_db(persist_dir: str = "./recipe_db",
+                  collection_name: str = DEFAULT_COLLECTION,
+                  backend: str = DEFAULT_BACKEND) -> LocalRecipeDB:
+    """Get the process-wide LocalRecipeDB handle for persist_dir/collection_name"""
+    return _registry.get(persist_dir, collection_name, backend)
+
+def close_recipe_db(persist_dir: str = "./recipe_db",
+                    collection_name: str = DEFAULT_COLLECTION,
+                    backend: str = DEFAULT_BACKEND):
+    """Close a handle previously returned by get_recipe_db()"""
+    _registry.close(persist_dir, collection_name, backend)
+
+def close_all_recipe_dbs():
+    """Close all handles held by the registry"""
+    _registry.close_all()
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # snapshots are written with zlib instead
+    zstandard = None
+
+MAGIC = b"RCPSNAP1"
+# 2: the chunk collection follows the entries as a second frame section
+FORMAT_VERSION = 2
+# Frame header: entries, crc32 of the payload, text bytes, vector bytes
+_FRAME = struct.Struct("<IIQQ")
+_HEADER_LEN = struct.Struct("<I")
+
+
+def _compressor(codec: str, level: Optional[int]):
+    if codec == "zstd":
+        compressor = zstandard.ZstdCompressor(level=level or 3)
+        return compressor.compress
+    return lambda data: zlib.compress(data, level or 6)
+
+def _decompressor(codec: str):
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("This snapshot is zstd-compressed; pip install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress
+    if codec == "zlib":
+        return zlib.decompress
+    raise ValueError(f"Unknown snapshot codec: {codec}")
+
+def _model_id(db) -> str:
+    fn = db.embedding_fn
+    return getattr(fn, "model_id", getattr(fn, "MODEL_NAME", type(fn).__name__))
+
+
+def _write_frames(f, collection, batch_size: int, dtype: str, compress, header: Dict) -> int:
+    """Write every entry of collection as frames plus the end frame;
+    returns the number of entries"""
+    entries = 0
+    offset = 0
+    while True:
+        page = collection.get(limit=batch_size, offset=offset,
+                              include=["documents", "metadatas", "embeddings"])
+        if not page["ids"]:
+            break
+        vectors = np.asarray(page["embeddings"], dtype=np.float32).astype(dtype)
+        if header["dim"] is None:
+            header["dim"] = int(vectors.shape[1])
+        text = compress(json.dumps({
+            "ids": page["ids"],
+            "documents": page["documents"],
+            "metadatas": page["metadatas"]
+        }, ensure_ascii=False).encode("utf-8"))
+        vector_bytes = vectors.tobytes()
+        crc = zlib.crc32(vector_bytes, zlib.crc32(text))
+        f.write(_FRAME.pack(len(page["ids"]), crc, len(text), len(vector_bytes)))
+        f.write(text)
+        f.write(vector_bytes)
+        entries += len(page["ids"])
+        offset += len(page["ids"])
+        if len(page["ids"]) < batch_size:
+            break
+    # An empty frame marks the end, so a truncated file is detected
+    f.write(_FRAME.pack(0, 0, 0, 0))
+    return entries
+
+def export_snapshot(db,
+                    path: str,
+                    batch_size: int = 1000,
+                    dtype: str = "float16",
+                    level: Optional[int] = None) -> Dict:
+    """Write every entry of a LocalRecipeDB, embeddings included, to one file.
+
+    The file is a JSON header followed by frames of ``batch_size`` entries:
+    ids, documents and metadata as compressed JSON (zstd, or zlib when
+    zstandard is not installed) and the vectors as raw ``dtype`` rows. Pages
+    are read from the collection and written one at a time, so memory stays
+    at one frame; the file is renamed into place once complete. When the
+    store has sentence chunks, they follow as a second section of frames.
+    """
+    codec = "zstd" if zstandard is not None else "zlib"
+    compress = _compressor(codec, level)
+    collection = db.collection
+    chunk_db = db.existing_chunk_db()
+    header = {
+        "format_version": FORMAT_VERSION,
+        "collection": db.collection_name,
+        "count": collection.count(),
+        "chunk_count": chunk_db.collection.count() if chunk_db is not None else None,
+        "dim": None,
+        "dtype": dtype,
+        "codec": codec,
+        "embedding_model": _model_id(db),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+    start = time.perf_counter()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        # The dimension is known after the first page; the header is
+        # rewritten with it, so reserve room for the longest version
+        f.write(MAGIC)
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        reserved = len(header_bytes) + 32
+        f.write(_HEADER_LEN.pack(reserved))
+        f.write(header_bytes.ljust(reserved))
+
+        entries = _write_frames(f, collection, batch_size, dtype, compress, header)
+        chunks = None
+        if chunk_db is not None:
+            chunks = _write_frames(f, chunk_db.collection, batch_size, dtype, compress, header)
+
+        header["count"] = entries
+        header["chunk_count"] = chunks
+        f.seek(len(MAGIC) + _HEADER_LEN.size)
+        f.write(json.dumps(header, ensure_ascii=False).encode("utf-8").ljust(reserved))
+    os.replace(tmp_path, path)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "entries": entries,
+        "chunks": chunks,
+        "bytes": os.path.getsize(path),
+        "seconds": elapsed,
+        "codec": codec
+    }
+    print(f"Exported {entries} entries{f' and {chunks} chunks' if chunks is not None else ''} to {path} "
+          f"({stats['bytes'] / 2 ** 20:.1f} MB, {codec}, {elapsed:.1f}s)")
+    return stats
+
+def read_snapshot_header(f) -> Dict:
+    """Header of an open snapshot file, leaving it positioned at the first frame"""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a recipe snapshot")
+    (length,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+    header = json.loads(f.read(length).decode("utf-8"))
+    if header["format_version"] > FORMAT_VERSION:
+        raise ValueError(f"Snapshot format {header['format_version']} is newer than this reader")
+    return header
+
+def read_snapshot(path: str) -> Iterator[Tuple[Dict, Dict]]:
+    """Yield (header, frame) for each frame; a frame has ids, documents,
+    metadatas, float32 embeddings and its section ("entries" or "chunks")"""
+    with open(path, "rb") as f:
+        header = read_snapshot_header(f)
+        decompress = _decompressor(header["codec"])
+        dtype = np.dtype(header["dtype"])
+        sections = ["entries"]
+        if header.get("chunk_count") is not None:
+            sections.append("chunks")
+        section = 0
+        while True:
+            frame_header = f.read(_FRAME.size)
+            if len(frame_header) < _FRAME.size:
+                raise ValueError(f"{path} is truncated")
+            n, crc, text_len, vector_len = _FRAME.unpack(frame_header)
+            if n == 0:
+                section += 1
+                if section == len(sections):
+                    return
+                continue
+            text = f.read(text_len)
+            vector_bytes = f.read(vector_len)
+            if len(text) < text_len or len(vector_bytes) < vector_len:
+                raise ValueError(f"{path} is truncated")
+            if zlib.crc32(vector_bytes, zlib.crc32(text)) != crc:
+                raise ValueError(f"{path} is corrupt")
+            frame = json.loads(decompress(text).decode("utf-8"))
+            frame["embeddings"] = np.frombuffer(vector_bytes, dtype=dtype).reshape(n, header["dim"]).astype(np.float32)
+            frame["section"] = sections[section]
+            yield header, frame
+
+def import_snapshot(db, path: str, check_model: bool = True) -> Dict:
+    """Bulk load a snapshot into a LocalRecipeDB without running the model.
+
+    Entries are upserted frame by frame with their stored embeddings, so
+    loading twice leaves one copy. The snapshot's embedding model must match
+    the handle's, or queries would be compared against foreign vectors;
+    pass check_model=False to load anyway.
+
+    Chunks in the snapshot go to the chunk collection as they are. A
+    snapshot without chunks (or from format 1) loaded into a store that
+    chunks gets its entries chunked afterwards, which does run the model.
+    """
+    start = time.perf_counter()
+    entries = 0
+    chunks = 0
+    has_chunks = False
+    checked = False
+    for header, frame in read_snapshot(path):
+        if not checked and check_model and header["embedding_model"] != _model_id(db):
+            raise ValueError(f"Snapshot was embedded with {header['embedding_model']}, "
+                             f"this database uses {_model_id(db)}")
+        checked = True
+        has_chunks = header.get("chunk_count") is not None
+        if frame["section"] == "chunks":
+            db.chunk_db.upsert_embedded(frame["ids"], frame["documents"], frame["metadatas"],
+                                        frame["embeddings"].tolist())
+            chunks += len(frame["ids"])
+        else:
+            db.upsert_embedded(frame["ids"], frame["documents"], frame["metadatas"],
+                               frame["embeddings"].tolist())
+            entries += len(frame["ids"])
+    if not has_chunks and entries and (db.chunker is not None or db.existing_chunk_db() is not None):
+        chunks = db.rebuild_chunks()["chunks"]
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "entries": entries,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "docs_per_sec": entries / elapsed if elapsed > 0 else 0.0
+    }
+    print(f"Imported {entries} entries and {chunks} chunks from {path} in {elapsed:.1f}s "
+          f"({stats['docs_per_sec']:.0f} docs/sec)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a recipe collection snapshot")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("snapshot", help="Snapshot file")
+    parser.add_argument("--persist_dir", default="./recipe_db")
+    parser.add_argument("--backend", default=None, help="Storage backend (see recipe_db.BACKENDS)")
+    parser.add_argument("--batch_size", type=int, default=1000)
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "wikipedia"))
+    from recipe_db import DEFAULT_BACKEND, get_recipe_db
+
+    db = get_recipe_db(args.persist_dir, backend=args.backend or DEFAULT_BACKEND)
+    if args.command == "export":
+        export_snapshot(db, args.snapshot, batch_size=args.batch_size, dtype=args.dtype)
+    else:
+        import_snapshot(db, args.snapshot)
+
+if __name__ == "__main__":
+    main()
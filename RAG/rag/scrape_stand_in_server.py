@@ -0,0 +1,53 @@
+import argparse
+import asyncio
+import os
+import random
+
+from aiohttp import web
+
+from async_scraper import ORIGINAL_HOST_HEADER, page_key
+
+
+def make_app(pages_dir: str,
+             latency: float = 0.0,
+             jitter: float = 0.0,
+             error_rate: float = 0.0) -> web.Application:
+    """Serves pages recorded with AsyncScraper(record_dir=...) / --record_dir.
+
+    The page of a request is <pages_dir>/<host>/<page_key>, where host is
+    the X-Original-Host header the scraper sends with rewritten requests.
+    Each response is delayed by latency plus up to jitter seconds, and a
+    fraction error_rate of them are 503s, to exercise retries.
+    """
+
+    async def serve(request: web.Request) -> web.Response:
+        delay = latency + random.uniform(0, jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if random.random() < error_rate:
+            return web.Response(status=503, text="stand-in error")
+        host = request.headers.get(ORIGINAL_HOST_HEADER, request.host.split(':')[0])
+        path = os.path.join(pages_dir, host, page_key(request.rel_url))
+        if not os.path.exists(path):
+            return web.Response(status=404, text=f"not recorded: {host}{request.rel_url}")
+        with open(path, 'r', encoding='utf-8') as f:
+            return web.Response(text=f.read(), content_type='text/html')
+
+    app = web.Application()
+    app.router.add_route('GET', '/{tail:.*}', serve)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the recipe sites, serving recorded pages")
+    parser.add_argument("--pages_dir", required=True)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Up to this many more seconds")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    web.run_app(make_app(args.pages_dir, args.latency, args.jitter, args.error_rate),
+                host='127.0.0.1', port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import json
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional
+
+_REGEX_SYNTAX = set('\\.^$*+?{}[]()|')
+_QUANTIFIERS = set('*+?{')
+
+# Keywords and capture patterns of every question aspect
+ASPECT_PATTERNS = {
+    'cuisine_type': {
+        'keywords': ['cuisine', '菜系', 'traditional', 'origin'],
+        'patterns': [
+            r'Cuisine Type: ([^\.]+)',
+            r'From its origins in ([^\.]+)',
+        ]
+    },
+    'flavor': {
+        'keywords': ['spicy', 'sweet', 'sour', 'taste', 'flavor', '口味', '味道'],
+        'patterns': [
+            r'is a ([^,]+), ([^,]+) Chinese dish',
+            r'flavors? include[s]? ([^\.]+)',
+        ]
+    },
+    'region': {
+        'keywords': ['region', 'province', 'origins', '地区', '产地'],
+        'patterns': [
+            r'From its origins in ([^\.]+)',
+            r'popular in ([^\.]+)',
+        ]
+    },
+    'present': {
+        'keywords': ['made with', 'served', 'presentation', '外形', '样式'],
+        'patterns': [
+            r'made with ([^\.]+)',
+            r'served with ([^\.]+)',
+        ]
+    },
+    'cooking_skills': {
+        'keywords': ['stir-fried', 'cooked', 'preparation', '烹饪', '制作'],
+        'patterns': [
+            r'is a [^,]*, ([^,]*-[^,]* dish)',
+            r'prepared by ([^\.]+)',
+        ]
+    },
+    'main_ingredient': {
+        'keywords': ['made with', 'ingredients', 'contains', '主料', '配料'],
+        'patterns': [
+            r'made with ([^\.]+)',
+            r'containing ([^\.]+)',
+        ]
+    }
+}
+
+
+def literal_prefix(pattern: str) -> str:
+    """Leading characters every match of the pattern starts with"""
+    prefix = ""
+    for i, char in enumerate(pattern):
+        if char in _REGEX_SYNTAX:
+            if char in _QUANTIFIERS and prefix:
+                prefix = prefix[:-1]  # the quantified char is optional
+            break
+        prefix += char
+    return prefix
+
+
+# FoodieQA question types -> the aspect that answers them
+QUESTION_TYPE_ASPECTS = {
+    'cuisine_type': 'cuisine_type',
+    'flavor': 'flavor',
+    'region-2': 'region',
+    'present': 'present',
+    'cooking-skills': 'cooking_skills',
+    'main-ingredient': 'main_ingredient'
+}
+
+# Snippets of each aspect are stored at ingest time under aspect_<name>
+ASPECT_METADATA_PREFIX = "aspect_"
+
+
+class AspectExtractor:
+    """Extracts the snippets of every aspect from a document in one pass.
+
+    Gives exactly what ChromaInspector.extract_info used to give, aspect by
+    aspect, but the capture patterns are compiled once (and shared between
+    aspects that use the same one), and keyword occurrences of all aspects
+    are found by a single scan of the lowercased text. The scan is one regex
+    of every keyword inside a lookahead, longest first, so it reports a match
+    at each position; keywords that are a prefix of the reported one (e.g.
+    'origin' inside 'origins') are added from a precomputed table.
+
+    Capture patterns that start with a literal are not searched one by one
+    either: a second scan finds the positions where any of those literals
+    starts, and each pattern is only tried there.
+    """
+
+    def __init__(self, aspect_patterns: Optional[Dict] = None):
+        self.aspect_patterns = aspect_patterns or ASPECT_PATTERNS
+        self.aspects = list(self.aspect_patterns)
+
+        self._compiled: Dict[str, re.Pattern] = {}
+        for spec in self.aspect_patterns.values():
+            for pattern in spec['patterns']:
+                if pattern not in self._compiled:
+                    self._compiled[pattern] = re.compile(pattern, re.IGNORECASE)
+
+        # Patterns grouped by literal prefix; the rest are searched in full
+        by_prefix: Dict[str, List[str]] = {}
+        self._unanchored = []
+        for pattern in self._compiled:
+            prefix = literal_prefix(pattern)
+            if prefix:
+                by_prefix.setdefault(prefix.lower(), []).append(pattern)
+            else:
+                self._unanchored.append(pattern)
+        self._prefix_patterns = by_prefix
+        self._prefix_order = sorted(by_prefix, key=len, reverse=True)
+        self._prefix_scan = None
+        if by_prefix:
+            # One group per prefix: the matched text cannot be used to tell
+            # them apart, since IGNORECASE also folds e.g. 'ſ' to 's'
+            first_chars = ''.join(sorted({re.escape(p[0]) for p in by_prefix}))
+            self._prefix_scan = re.compile(
+                '(?=[' + first_chars + '])(?=' + '|'.join('(' + re.escape(p) + ')' for p in self._prefix_order) + ')',
+                re.IGNORECASE)
+        # A position can start several prefixes when one is a prefix of another
+        self._prefix_groups = {p: [q for q in by_prefix if p.startswith(q)] for p in by_prefix}
+
+        self._keywords = {aspect: [k.lower() for k in spec['keywords']]
+                          for aspect, spec in self.aspect_patterns.items()}
+        all_keywords = sorted({k for ks in self._keywords.values() for k in ks}, key=len, reverse=True)
+        self._prefixes = {k: [p for p in all_keywords if k.startswith(p)] for k in all_keywords}
+        self._keyword_scan = None
+        # The scan attributes matches to sentences by start position, which
+        # only works for non-empty keywords without a '.'
+        if all_keywords and all(k and '.' not in k for k in all_keywords):
+            # The leading character class lets the scan skip positions
+            # that cannot start any keyword
+            first_chars = ''.join(sorted({re.escape(k[0]) for k in all_keywords}))
+            self._keyword_scan = re.compile(
+                '(?=[' + first_chars + '])(?=(' + '|'.join(re.escape(k) for k in all_keywords) + '))')
+
+    def _sentence_keywords(self, content: str, sentences: List[tuple]) -> Optional[List[set]]:
+        """Keywords occurring in each (start, end) sentence span, or None
+        if lowercasing changes the text length and positions cannot be mapped"""
+        lowered = content.lower()
+        if self._keyword_scan is None or len(lowered) != len(content):
+            return None
+        starts = [start for start, _ in sentences]
+        found = [set() for _ in sentences]
+        for match in self._keyword_scan.finditer(lowered):
+            pos = match.start()
+            i = bisect_right(starts, pos) - 1
+            # Keywords contain no '.', so one starting in a sentence ends there too
+            if i >= 0 and pos < sentences[i][1]:
+                found[i].update(self._prefixes[match.group(1)])
+        return found
+
+    def _pattern_hits(self, content: str, patterns: List[str]) -> Dict[str, List[str]]:
+        """Captured group 1 of every match of each pattern, as re.finditer gives them"""
+        wanted = set(patterns)
+        hits = {pattern: [] for pattern in patterns}
+        for pattern in self._unanchored:
+            if pattern in wanted:
+                hits[pattern] = [m.group(1).strip() for m in self._compiled[pattern].finditer(content)]
+        if self._prefix_scan is None:
+            return hits
+
+        # finditer tries every position left to right, resuming after each
+        # match; a match can only begin where the pattern's prefix does
+        resume = {pattern: 0 for pattern in patterns}
+        for scan in self._prefix_scan.finditer(content):
+            pos = scan.start()
+            for prefix in self._prefix_groups[self._prefix_order[scan.lastindex - 1]]:
+                for pattern in self._prefix_patterns[prefix]:
+                    if pattern not in wanted or pos < resume[pattern]:
+                        continue
+                    match = self._compiled[pattern].match(content, pos)
+                    if match:
+                        hits[pattern].append(match.group(1).strip())
+                        # finditer moves one past an empty match
+                        resume[pattern] = match.end() if match.end() > pos else pos + 1
+        return hits
+
+    def extract_all(self, content: str, aspects: Optional[List[str]] = None) -> Dict[str, List[str]]:
+        """Map each aspect to its snippets, as extract_info would return them"""
+        aspects = aspects or self.aspects
+
+        pattern_hits = self._pattern_hits(
+            content, list(dict.fromkeys(p for a in aspects for p in self.aspect_patterns[a]['patterns'])))
+
+        # Sentence spans of content.split('.'), skipping the blank ones
+        sentences = []
+        start = 0
+        for piece in content.split('.'):
+            end = start + len(piece)
+            if piece.strip():
+                sentences.append((start, end))
+            start = end + 1
+        keywords_in = self._sentence_keywords(content, sentences)
+        if keywords_in is not None:
+            # Only sentences with some keyword can contribute
+            candidates = [i for i, present in enumerate(keywords_in) if present]
+        else:
+            candidates = range(len(sentences))
+        texts = {}
+
+        results = {}
+        for aspect in aspects:
+            # Filled in the same order as extract_info, so listing the set
+            # gives the same order too
+            info = set()
+            for pattern in self.aspect_patterns[aspect]['patterns']:
+                info.update(pattern_hits[pattern])
+
+            keywords = self._keywords[aspect]
+            for i in candidates:
+                sentence = texts.get(i)
+                if sentence is None:
+                    start, end = sentences[i]
+                    sentence = texts[i] = content[start:end].strip()
+                if keywords_in is not None:
+                    present = keywords_in[i]
+                    matched = [k for k in keywords if k in present]
+                else:
+                    lowered = sentence.lower()
+                    matched = [k for k in keywords if k in lowered]
+                if not matched:
+                    continue
+                if (sentence.startswith('Title:') or
+                        sentence.startswith('Chinese Name:') or
+                        'pinyin:' in sentence):
+                    continue
+                clauses = sentence.split(',')
+                for keyword in matched:
+                    for clause in clauses:
+                        if keyword in clause.lower():
+                            info.add(clause.strip())
+                            break
+            results[aspect] = list(info)
+        return results
+
+    def extract(self, content: str, aspect: str) -> List[str]:
+        """Snippets of a single aspect"""
+        return self.extract_all(content, [aspect])[aspect]
+
+
+_default_extractor = None
+
+def get_aspect_extractor() -> AspectExtractor:
+    """Shared extractor over ASPECT_PATTERNS"""
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = AspectExtractor()
+    return _default_extractor
+
+def aspect_metadata(content: str, extractor: Optional[AspectExtractor] = None) -> Dict[str, str]:
+    """Per-aspect snippets as metadata fields, each a JSON list of strings"""
+    extractor = extractor or get_aspect_extractor()
+    return {ASPECT_METADATA_PREFIX + aspect: json.dumps(snippets, ensure_ascii=False)
+            for aspect, snippets in extractor.extract_all(content).items()}
+
+def read_aspect(metadata: Optional[Dict], aspect: str) -> Optional[List[str]]:
+    """Snippets stored for an aspect, or None if the entry was not enriched"""
+    value = (metadata or {}).get(ASPECT_METADATA_PREFIX + aspect)
+    if value is None:
+        return None
+    return json.loads(value)
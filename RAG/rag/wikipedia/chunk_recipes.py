@@ -0,0 +1,22 @@
+import argparse
+
+from recipe_db import get_recipe_db
+from recipe_chunks import DEFAULT_CHUNK_CHARS, RecipeChunker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill sentence chunks of existing recipe entries")
+    parser.add_argument("--persist_dir", default="./recipe_db")
+    parser.add_argument("--chunk_chars", type=int, default=DEFAULT_CHUNK_CHARS)
+    parser.add_argument("--force", action="store_true",
+                        help="Re-chunk entries that already have chunks")
+    args = parser.parse_args()
+
+    db = get_recipe_db(args.persist_dir)
+    db.chunker = RecipeChunker(args.chunk_chars)
+    stats = db.rebuild_chunks(force=args.force)
+    print(f"Chunked {stats['documents']} entries into {stats['chunks']} chunks, "
+          f"{stats['skipped']} already had chunks")
+
+if __name__ == "__main__":
+    main()
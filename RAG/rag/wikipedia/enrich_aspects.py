@@ -0,0 +1,50 @@
+import argparse
+from typing import Dict
+
+from recipe_db import get_recipe_db
+from aspect_extractor import ASPECT_METADATA_PREFIX, AspectExtractor, aspect_metadata
+
+
+def enrich_aspects(persist_dir: str = "./recipe_db", page_size: int = 500, force: bool = False) -> Dict:
+    """Store the aspect snippets of every entry that does not have them yet"""
+    db = get_recipe_db(persist_dir)
+    extractor = AspectExtractor()
+    marker = ASPECT_METADATA_PREFIX + extractor.aspects[0]
+    updated = skipped = 0
+
+    # Read every page before writing so updates do not shift the offsets
+    entries = []
+    offset = 0
+    while True:
+        result = db.collection.get(limit=page_size, offset=offset)
+        entries.extend(zip(result['ids'], result['documents'], result['metadatas']))
+        if len(result['ids']) < page_size:
+            break
+        offset += page_size
+
+    for start in range(0, len(entries), page_size):
+        ids, metadatas = [], []
+        for doc_id, content, metadata in entries[start:start + page_size]:
+            if not force and marker in (metadata or {}):
+                skipped += 1
+                continue
+            ids.append(doc_id)
+            metadatas.append(aspect_metadata(content or "", extractor))
+        if ids:
+            db.update_metadata(ids, metadatas)
+            updated += len(ids)
+
+    return {'updated': updated, 'skipped': skipped}
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill aspect snippets into existing recipe entries")
+    parser.add_argument("--persist_dir", default="./recipe_db")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-extract entries that already have aspect metadata")
+    args = parser.parse_args()
+
+    stats = enrich_aspects(args.persist_dir, force=args.force)
+    print(f"Enriched {stats['updated']} entries, {stats['skipped']} already had aspects")
+
+if __name__ == "__main__":
+    main()
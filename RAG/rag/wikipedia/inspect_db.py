@@ -1,10 +1,15 @@
-from recipe_db import LocalRecipeDB
+from recipe_db import get_recipe_db
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from recipe_snapshot import export_snapshot
+from aspect_extractor import get_aspect_extractor, read_aspect
 import json
 from typing import Dict, List
 
 class ChromaInspector:
-    def __init__(self):
-        self.db = LocalRecipeDB()
+    def __init__(self, persist_dir: str = "./recipe_db"):
+        self.db = get_recipe_db(persist_dir)
     
     def get_all_entries(self) -> List[Dict]:
         """Retrieve all entries from the database"""
@@ -57,10 +62,10 @@ class ChromaInspector:
             print(f"  {content_preview}")
             print("\n" + "="*50)
 
-    def get_dish_entries(self, food_name: str) -> List[Dict]:
+    def get_dish_entries(self, food_name: str, match_aliases: bool = False) -> List[Dict]:
         """Search the database for entries matching a specific food name."""
-        entries = self.get_all_entries()
-        matches = [entry for entry in entries if entry['metadata'].get('dish_name') == food_name]
+        index = self.db.dish_index
+        matches = index.lookup_alias(food_name) if match_aliases else index.lookup(food_name)
         print(matches)
         
         if matches:
@@ -80,6 +85,18 @@ class ChromaInspector:
         
         return matches
     
+    def get_dish_aspect(self, food_name: str, aspect: str) -> List[str]:
+        """Snippets of one aspect of a dish, from the ingest-time metadata if present"""
+        entries = self.db.dish_index.lookup(food_name)
+        if not entries:
+            return []
+        entry = entries[0]
+        snippets = read_aspect(entry['metadata'], aspect)
+        if snippets is None:
+            # Entry stored before aspects were extracted at ingest time
+            snippets = get_aspect_extractor().extract(entry['content'], aspect)
+        return snippets
+    
     def export_to_json(self, filename: str = "recipe_db_dump_zh.json"):
         """Export the entire database to a JSON file"""
         entries = self.get_all_entries()
@@ -88,6 +105,10 @@ class ChromaInspector:
             json.dump(entries, f, ensure_ascii=False, indent=2)
         
         print(f"\nDatabase exported to {filename}")
+    
+    def export_snapshot(self, filename: str = "recipe_db.snapshot"):
+        """Export entries with their embeddings to a binary snapshot (see recipe_snapshot.py)"""
+        return export_snapshot(self.db, filename)
 
 if __name__ == "__main__":
     inspector = ChromaInspector()
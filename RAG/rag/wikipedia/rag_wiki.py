@@ -1,11 +1,12 @@
-from recipe_db import LocalRecipeDB
+from recipe_db import get_recipe_db
+from aspect_extractor import ASPECT_PATTERNS, get_aspect_extractor, read_aspect
 import json
 from typing import Dict, List
 import re
 
 class ChromaInspector:
-    def __init__(self):
-        self.db = LocalRecipeDB()
+    def __init__(self, persist_dir: str = "./recipe_db"):
+        self.db = get_recipe_db(persist_dir)
         self.question_types = {
             'cuisine_type': "菜系 cuisine traditional origin",
             'flavor': "taste flavor characteristics 口味 味道",
@@ -15,58 +16,15 @@ class ChromaInspector:
             'main_ingredient': "ingredients components 主料 配料"
         }
         
-        # Move patterns definition into __init__
-        self.patterns = {
-            'cuisine_type': {
-                'keywords': ['cuisine', '菜系', 'traditional', 'origin'],
-                'patterns': [
-                    r'Cuisine Type: ([^\.]+)',
-                    r'From its origins in ([^\.]+)',
-                ]
-            },
-            'flavor': {
-                'keywords': ['spicy', 'sweet', 'sour', 'taste', 'flavor', '口味', '味道'],
-                'patterns': [
-                    r'is a ([^,]+), ([^,]+) Chinese dish',
-                    r'flavors? include[s]? ([^\.]+)',
-                ]
-            },
-            'region': {
-                'keywords': ['region', 'province', 'origins', '地区', '产地'],
-                'patterns': [
-                    r'From its origins in ([^\.]+)',
-                    r'popular in ([^\.]+)',
-                ]
-            },
-            'present': {
-                'keywords': ['made with', 'served', 'presentation', '外形', '样式'],
-                'patterns': [
-                    r'made with ([^\.]+)',
-                    r'served with ([^\.]+)',
-                ]
-            },
-            'cooking_skills': {
-                'keywords': ['stir-fried', 'cooked', 'preparation', '烹饪', '制作'],
-                'patterns': [
-                    r'is a [^,]*, ([^,]*-[^,]* dish)',
-                    r'prepared by ([^\.]+)',
-                ]
-            },
-            'main_ingredient': {
-                'keywords': ['made with', 'ingredients', 'contains', '主料', '配料'],
-                'patterns': [
-                    r'made with ([^\.]+)',
-                    r'containing ([^\.]+)',
-                ]
-            }
-        }
+        self.patterns = ASPECT_PATTERNS
+        self.extractor = get_aspect_extractor()
 
     
-    def get_dish_entries(self, dish_name: str) -> List[Dict]:
+    def get_dish_entries(self, dish_name: str, match_aliases: bool = False) -> List[Dict]:
         """Get all entries for a specific dish"""
-        entries = self.get_all_entries()
-        return [entry for entry in entries 
-                if entry['metadata'].get('dish_name') == dish_name]
+        if match_aliases:
+            return self.db.dish_index.lookup_alias(dish_name)
+        return self.db.dish_index.lookup(dish_name)
     
     
     def inspect_dish(self, dish_name: str):
@@ -85,9 +43,14 @@ class ChromaInspector:
             print(f"English Name: {entry['metadata'].get('english_name', 'Not specified')}")
             
             print("\nAspect Analysis:")
+            aspect_info = None
             for aspect in self.patterns.keys():
                 print(f"\n{aspect.upper()}:")
-                info = self.extract_info(entry['content'], aspect)
+                info = read_aspect(entry['metadata'], aspect)
+                if info is None:
+                    if aspect_info is None:
+                        aspect_info = self.extract_all_info(entry['content'])
+                    info = aspect_info[aspect]
                 if info:
                     for i, text in enumerate(info, 1):
                         # Clean up the output
@@ -101,35 +64,11 @@ class ChromaInspector:
                     print("No specific information found")
     def extract_info(self, content: str, aspect: str) -> List[str]:
         """Extract relevant information for a specific aspect"""
-        info = set()  # Use set to avoid duplicates from the start
-        patterns = self.patterns[aspect]['patterns']
-        
-        # Try each pattern
-        for pattern in patterns:
-            matches = re.finditer(pattern, content, re.IGNORECASE)
-            for match in matches:
-                info.add(match.group(1).strip())
-        
-        # Find relevant sentences containing keywords
-        keywords = self.patterns[aspect]['keywords']
-        sentences = [s.strip() for s in content.split('.') if s.strip()]
-        for sentence in sentences:
-            if any(keyword.lower() in sentence.lower() for keyword in keywords):
-                # Don't add full metadata block or repetitive content
-                if not (sentence.startswith('Title:') or 
-                    sentence.startswith('Chinese Name:') or 
-                    'pinyin:' in sentence):
-                    # Extract just the relevant part if it's a long sentence
-                    for keyword in keywords:
-                        if keyword.lower() in sentence.lower():
-                            # Find the relevant clause containing the keyword
-                            clauses = sentence.split(',')
-                            relevant_clauses = [c.strip() for c in clauses 
-                                            if keyword.lower() in c.lower()]
-                            if relevant_clauses:
-                                info.add(relevant_clauses[0])
-        
-        return list(info)
+        return self.extractor.extract(content, aspect)
+    
+    def extract_all_info(self, content: str) -> Dict[str, List[str]]:
+        """Extract the information of every aspect in one pass over the content"""
+        return self.extractor.extract_all(content)
                 
     def get_all_entries(self) -> List[Dict]:
         """Retrieve all entries from the database"""
@@ -149,12 +88,7 @@ class ChromaInspector:
 
     def list_dishes(self):
         """List all unique dish names in the database"""
-        entries = self.get_all_entries()
-        dishes = set()
-        for entry in entries:
-            if 'dish_name' in entry['metadata']:
-                dishes.add(entry['metadata']['dish_name'])
-        return sorted(list(dishes))
+        return sorted(self.db.dish_index.dish_names())
 
 if __name__ == "__main__":
     inspector = ChromaInspector()
@@ -1,4 +1,10 @@
+import argparse
 from wiki_recipe_scraper import WikiRecipeScraper
+from incremental_refresh import DEFAULT_TTL_DAYS
+from async_scraper import add_engine_args, engine_from_args
+from http_cache import add_cache_args, cache_from_args
+from work_queue import add_queue_args, queue_from_args
+from async_scraper import dish_jobs
 
 
 dishes_by_cuisine = {
@@ -45,9 +51,29 @@ dishes_by_cuisine = {
 }
 
 def main():
-    scraper = WikiRecipeScraper()
-    scraper.clear_database()
-    scraper.scrape_and_store_recipes(dishes_by_cuisine)
+    parser = argparse.ArgumentParser(description="Scrape Wikipedia pages of the dishes into the recipe DB")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only scrape dishes that are missing or older than --ttl_days instead of rebuilding")
+    parser.add_argument("--ttl_days", type=float, default=DEFAULT_TTL_DAYS)
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete stored dishes that are no longer in dishes_by_cuisine")
+    parser.add_argument("--summary", default="refresh_summary_wikipedia.json")
+    add_engine_args(parser, rate=1.0)
+    add_cache_args(parser)
+    add_queue_args(parser)
+    args = parser.parse_args()
+
+    scraper = WikiRecipeScraper(http=cache_from_args(args))
+    if args.incremental:
+        scraper.refresh_recipes(dishes_by_cuisine, ttl_days=args.ttl_days,
+                                prune=args.prune, summary_path=args.summary)
+        return
+    queue, resumed = queue_from_args(args, 'wikipedia', dish_jobs(dishes_by_cuisine))
+    if not resumed:
+        # A fresh run rebuilds the database; a resumed one keeps what was stored
+        scraper.clear_database()
+    scraper.scrape_queue(queue, engine=engine_from_args(
+        args, headers={'User-Agent': 'dl_project recipe scraper (aiohttp)'}, cache=scraper.http))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,116 +1,28 @@
 import requests
 from bs4 import BeautifulSoup
-import time
 from typing import Dict, Optional, List
-from recipe_db import LocalRecipeDB
+from recipe_db import get_recipe_db
+from aspect_extractor import aspect_metadata
+from incremental_refresh import DEFAULT_TTL_DAYS, refresh_recipe_db
+from dish_aliases import DISH_TRANSLATIONS
+from work_queue import NothingScraped, WorkItem, WorkQueue, process_queue, process_queue_async
+from async_scraper import AsyncScraper
+from http_cache import HttpCache, get_http_cache, install_wikipedia_cache
 import wikipedia
+import json
 import re
 
+WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
+
 class WikiRecipeScraper:
-    def __init__(self):
-        self.db = LocalRecipeDB()
+    def __init__(self, http: Optional[HttpCache] = None):
+        self.db = get_recipe_db()
         wikipedia.set_lang('en')
+        self.http = http or get_http_cache()
+        install_wikipedia_cache(self.http)
         
         # Dictionary of Chinese dish names to English translations
-        self.dish_translations = {
-            # Xinjiang cuisine
-            "烤羊肉串": ["Chunar", "Chinese lamb skewers", "Xinjiang kebab", "Yang rou chuan"],
-            "馕": ["Nang bread", "Uyghur naan", "Xinjiang naan"],
-            "羊肉抓饭": ["Uyghur polo", "Xinjiang pilaf", "Lamb pilaf"],
-            "过油肉拌面": ["Yourou banmian", "Oil-mixed noodles with meat", "pulled noodles with fried lamb and vegetables", "Uyghur Laghman"],
-            "菠菜面": ["Spinach noodles", "Xinjiang spinach noodles"],
-            "拉条子": ["Latiaozi", "Hand-pulled noodles", "Laghman"],
-            "大盘鸡": ["Dapanji", "Big plate chicken"],
-            "干煸炒面": ["Ganbian chaomian", "Dry-fried noodles"],
-            "新疆架子肉": ["Jiazi meat", "Xinjiang rack of lamb"], # no related link
-            "丁丁炒面": ["Dingding chaomian", "Chopped noodles"], # no related link
-
-            # Sichuan cuisine
-            "辣子鸡丁": ["Laziji", "Chongqing Chicken", "Sichuan spicy diced chicken"],
-            "青椒肉丝": ["Qingjiao rousi", "Shredded pork with green peppers"], 
-            "啤酒鸭": ["Beer duck", "Pijiu ya"], # no related page
-            "水煮肉片": ["Shuizhu beef", "Water-boiled beef"],
-            "四川火锅": ["Sichuan hotpot", "Sichuan huoguo"],
-            "宫保鸡丁": ["Kung Pao chicken", "Gongbao chicken"],
-            "酸菜鱼": ["Fish with pickled mustard greens"],
-            "辣椒炒肉": ["Stir-fried pork with chili"], # no related page
-            "麻辣烫": ["Malatang"],
-            "毛血旺": ["Mao xue wang"],
-            "冒菜": ["Maocai", "Boiled meat in spicy soup"],
-            "口水鸡": ["Mouth-watering chicken", "Saliva chicken", "Kou shui ji"], # no related link        
-            "回锅肉": ["Twice-cooked pork", "Hui guo rou"],
-            "四川冰粉": ["bingfen"],
-            "重庆火锅": ["Chongqing hotpot"],
-
-            # Northwest cuisine
-            "水煮鱼": ["Shuizhu"],
-            "米皮": ["Liangpi", "Rice skin noodles"],
-            "酿皮": ["Liangpi", "Niang pi", "Cold skin noodles"], 
-            "糖醋丸子": ["Sweet and sour meatballs"], # no related page 
-            "酱牛肉": ["Braised beef", "Jiang niu rou"], # no related page
-            "手抓羊肉": ["Hand-pulled lamb", "Shou zhua yang rou"], # no related page
-            "猪皮冻": ["Pork jelly", "Pork skin jelly"],
-            "面皮/凉皮": ["Liang pi", "Cold rice noodles"],
-
-            # Guizhou cuisine
-            "凯里酸汤鱼": ["Sour soup fish"],
-            "豆腐圆子": ["Tofu balls", "Doufu yuanzi"], # no related page
-            "荷叶粉蒸肉": ["Lotus leaf steamed pork"], # no related page
-            "水城烙锅": ["Shuicheng lao guo", "Water town pot"], # no related page
-            "辣子鸡": ["laziji", "Spicy chicken"],
-            "丝娃娃": ["Si wa wa", "Guizhou lettuce wraps"],
-
-            # Jiangsu cuisine
-            "毛式红烧肉": ["Mao-style red braised pork"],
-            "盐水鸭": ["Nanjing salted duck"],
-            "无锡小笼包": ["Wuxi xiaolongbao", "Wuxi soup dumplings"],
-            "松鼠鱼": ["Squirrel fish", "Song shu yu"],
-            "青团": ["Qingtuan", "Green rice balls"],
-            "太湖银鱼": ["Lake Tai silverfish"], # no related page
-            "响油鳝糊": ["Crispy eel paste"], # no related page
-            "阳春面": ["Yang chun noodles"],
-            "蟹黄汤包": ["Crab roe soup dumplings"], # no related page
-
-            # Cantonese cuisine
-            "鸡蛋肠粉": ["Egg cheung fun", "Rice noodle rolls with egg"],
-            "红米肠粉": ["Red rice cheung fun"], # no related page
-            "叉烧包": ["Char siu bao", "BBQ pork bun"],
-            "黑椒牛仔骨": ["Black pepper short ribs"], # no related page
-            "虾饺": ["Har gow", "Shrimp dumplings"],
-            "煲仔饭": ["Claypot rice", "Bo zai fan"],
-            "咖喱牛腩牛筋面": ["Curry beef brisket noodles"], # no related page
-            "鱼丸粉": ["Fish ball", "Fish ball noodles"],
-            "脆皮烧鹅": ["Roast goose"], #
-            "清蒸鲈鱼": ["Steamed bass"], # no related page
-            "干炒牛河": ["Beef chow fun"],
-            "陈皮牛肉丸": ["Steamed meatballs", "chenpi", "Dried tangerine peel beef balls"], # added steamed meatballs, chenpi, no related page
-
-            # Other regional cuisines
-            "臭鳜鱼": ["Stinky mandarin fish"], # no related page
-            "猪血丸子": ["Pork blood balls"], # no related page
-            "剁椒鱼头": ["Chopped chili fish head"], # no related page
-            "桂花糖藕": ["Osmanthus lotus root"], # no related food
-            "梅菜扣肉": ["Mei cai kou rou", "Preserved vegetable pork"], # no related page
-            "红烧牛肉": ["Red braised beef"], # no related page
-            "荔枝肉": ["Lychee pork"],
-            "姜母鸭": ["Ginger mother duck"], # no related page
-            "同安封肉": ["Tong'an wrapped pork"], 
-            "白切鸡": ["White cut chicken", "Bai qie ji"],
-            "西湖醋鱼": ["West Lake vinegar fish"],
-            "黄鱼烧年糕": ["Yellow croaker with rice cakes"], # no related pages
-            "龙井虾仁": ["Longjing shrimp", "Dragon well shrimp"],
-            "扬州炒饭": ["Yangzhou fried rice"],
-            "椒麻鸡": ["Chinese Pepper chicken"], # no related page
-            "油爆虾": ["chili shrimp", "Deep-fried prawns"],
-            "锅包肉": ["Guo bao rou", "Northeastern sweet and sour pork"],
-            "拉皮": ["Liangpi", "La pi", "Mung bean sheets"],
-            "大碴子粥": ["Da cha zi zhou", "Corn porridge"], # no related page
-            "内蒙烤全羊": ["Khorkhog", "Inner Mongolian whole roasted lamb"],
-            "鸭血粉丝汤": ["Duck blood vermicelli soup"],
-            "酒酿圆子": ["Tangyuan", "Rice wine sweet rice balls"], 
-            "客家酿豆腐": ["Hakka stuffed tofu"],
-            "北京烤鸭": ["Peking duck", "Beijing roast duck"]
-        }
+        self.dish_translations = dict(DISH_TRANSLATIONS)
         
     def clean_text(self, text: str) -> str:
         """Clean Wikipedia text by removing references and extra whitespace"""
@@ -118,125 +30,212 @@ class WikiRecipeScraper:
         text = re.sub(r'\s+', ' ', text)
         return text.strip()
     
+    def search_terms(self, dish_name: str, cuisine_type: str) -> List[tuple]:
+        """(translation, search term) pairs to try, in order"""
+        translations = self.dish_translations.get(dish_name, [dish_name])
+        return [(term, search_term)
+                for term in translations
+                for search_term in [
+                    term,
+                    f"{term} dish",
+                    f"{term} Chinese cuisine",
+                    f"{term} {cuisine_type}",
+                ]]
+    
+    def build_recipe_info(self, title: str, summary: str, url: str,
+                          dish_name: str, cuisine_type: str, used_term: str) -> Dict:
+        return {
+            'title': title,
+            'summary': self.clean_text(summary),
+            'url': url,
+            'cuisine_type': cuisine_type,
+            'chinese_name': dish_name,
+            'english_name': used_term
+        }
+    
     def search_wiki_page(self, dish_name: str, cuisine_type: str) -> Optional[Dict]:
         """Search for a dish on Wikipedia and extract relevant information"""
         try:
-            translations = self.dish_translations.get(dish_name, [dish_name])
-            # translations = [dish_name]
-            
             # Try each translation
             page = None
             used_term = None
             
-            for term in translations:
-                search_terms = [
-                    term,
-                    f"{term} dish",
-                    f"{term} Chinese cuisine",
-                    f"{term} {cuisine_type}",
-                ]
-                
-                for search_term in search_terms:
+            for term, search_term in self.search_terms(dish_name, cuisine_type):
+                try:
+                    print(f"  Trying search term: {search_term}")
+                    search_results = wikipedia.search(search_term, results=1)
+                    if search_results:
+                        page = wikipedia.page(search_results[0], auto_suggest=False)
+                        used_term = term
+                        break
+                except wikipedia.exceptions.DisambiguationError as e:
+                    # Try the first option in disambiguation
                     try:
-                        print(f"  Trying search term: {search_term}")
-                        search_results = wikipedia.search(search_term, results=1)
-                        if search_results:
-                            page = wikipedia.page(search_results[0], auto_suggest=False)
-                            used_term = term
-                            break
-                    except wikipedia.exceptions.DisambiguationError as e:
-                        # Try the first option in disambiguation
-                        try:
-                            page = wikipedia.page(e.options[0], auto_suggest=False)
-                            used_term = term
-                            break
-                        except:
-                            continue
+                        page = wikipedia.page(e.options[0], auto_suggest=False)
+                        used_term = term
+                        break
                     except:
                         continue
+                except:
+                    continue
                 
-                if page:
-                    break
-                    
             if not page:
                 return None
                 
-            # Extract content
-            summary = self.clean_text(page.summary)
-            
-            # Structure the information
-            recipe_info = {
-                'title': page.title,
-                'summary': summary,
-                'url': page.url,
-                'cuisine_type': cuisine_type,
-                'chinese_name': dish_name,
-                'english_name': used_term
-            }
-            
-            return recipe_info
+            return self.build_recipe_info(page.title, page.summary, page.url,
+                                          dish_name, cuisine_type, used_term)
             
         except Exception as e:
             print(f"  Error processing {dish_name}: {str(e)}")
             return None
     
+    async def _wiki_query(self, fetch, **params) -> Dict:
+        params.update(format='json', formatversion='2')
+        return json.loads(await fetch(WIKI_API_URL, params))
+    
+    async def _wiki_page_async(self, fetch, title: str) -> Optional[Dict]:
+        """Intro, url and disambiguation flag of a page (what wikipedia.page gives)"""
+        data = await self._wiki_query(fetch, action='query', titles=title, redirects='1',
+                                      prop='extracts|info|pageprops', exintro='1', explaintext='1',
+                                      inprop='url', ppprop='disambiguation')
+        pages = data.get('query', {}).get('pages', [])
+        if not pages or pages[0].get('missing') or pages[0].get('invalid'):
+            return None
+        return pages[0]
+    
+    async def search_wiki_page_async(self, dish_name: str, cuisine_type: str, fetch) -> Optional[Dict]:
+        """search_wiki_page over the MediaWiki API with an AsyncScraper fetch.
+        A disambiguation page is replaced by the first page it links to."""
+        for term, search_term in self.search_terms(dish_name, cuisine_type):
+            data = await self._wiki_query(fetch, action='query', list='search', srsearch=search_term,
+                                          srlimit='1', srprop='')
+            results = data.get('query', {}).get('search', [])
+            if not results:
+                continue
+            page = await self._wiki_page_async(fetch, results[0]['title'])
+            if page is not None and 'disambiguation' in page.get('pageprops', {}):
+                links = await self._wiki_query(fetch, action='query', titles=page['title'], prop='links',
+                                               plnamespace='0', pllimit='1')
+                link_pages = links.get('query', {}).get('pages', [])
+                options = link_pages[0].get('links', []) if link_pages else []
+                page = await self._wiki_page_async(fetch, options[0]['title']) if options else None
+            if page is not None:
+                return self.build_recipe_info(page['title'], page.get('extract', ''), page['fullurl'],
+                                              dish_name, cuisine_type, term)
+        return None
+    
     def clear_database(self):
         """Clear all entries from the database"""
         try:
-            self.db.client.delete_collection("chinese_recipes")
-            self.db.collection = self.db.client.create_collection(
-                name="chinese_recipes",
-                embedding_function=self.db.embedding_fn,
-                metadata={"description": "Chinese recipe database"}
-            )
+            self.db.clear()
             print("Database cleared successfully")
         except Exception as e:
             print(f"Error clearing database: {str(e)}")
     
-    def scrape_and_store_recipes(self, dishes_by_cuisine: Dict[str, List[str]]):
+    def scrape_dish(self, dish: str, cuisine_type: str) -> List[Dict]:
+        """Recipes (add_recipes items) of one dish, empty if no page was found"""
+        return self.recipe_items(dish, cuisine_type, self.search_wiki_page(dish, cuisine_type))
+    
+    async def scrape_dish_async(self, dish: str, cuisine_type: str, fetch) -> List[Dict]:
+        """scrape_dish with an AsyncScraper fetch"""
+        return self.recipe_items(dish, cuisine_type,
+                                 await self.search_wiki_page_async(dish, cuisine_type, fetch))
+    
+    def recipe_items(self, dish: str, cuisine_type: str, recipe_info: Optional[Dict]) -> List[Dict]:
+        if not recipe_info:
+            return []
+        
+        content = (
+            f"Title: {recipe_info['title']}\n"
+            f"Chinese Name: {recipe_info['chinese_name']}\n"
+            f"English Name: {recipe_info['english_name']}\n"
+            f"Cuisine Type: {recipe_info['cuisine_type']}\n\n"
+            f"{recipe_info['summary']}"
+        )
+        
+        metadata = {
+            'dish_name': dish,
+            'english_name': recipe_info['english_name'],
+            'aliases': self.dish_translations.get(dish, []),
+            'cuisine_type': cuisine_type,
+            'source_url': recipe_info['url']
+        }
+        # Aspect snippets are extracted once here instead of per question
+        metadata.update(aspect_metadata(content))
+        print(f"✓ Scraped {dish} ({recipe_info['english_name']})")
+        return [{'content': content, 'metadata': metadata, 'source': 'wikipedia'}]
+    
+    def refresh_recipes(self,
+                        dishes_by_cuisine: Dict[str, List[str]],
+                        ttl_days: float = DEFAULT_TTL_DAYS,
+                        prune: bool = False,
+                        summary_path: Optional[str] = None) -> Dict:
+        """Scrape only dishes that are missing or older than ttl_days (see incremental_refresh.py)"""
+        return refresh_recipe_db(self.db, dishes_by_cuisine, self.scrape_dish, 'wikipedia',
+                                 ttl_days=ttl_days, prune=prune,
+                                 pause=lambda: self.http.pause(1),  # Be nice to Wikipedia's servers
+                                 summary_path=summary_path)
+    
+    def scrape_and_store_recipes(self, dishes_by_cuisine: Dict[str, List[str]], batch_size: int = 32):
         """Scrape Wikipedia for each dish and store in the database"""
-        total_processed = 0
-        total_failed = 0
+        counts = {'processed': 0, 'failed': 0}
         
-        for cuisine_type, dishes in dishes_by_cuisine.items():
-            print(f"\nProcessing {cuisine_type}...")
-            
-            for dish in dishes:
-                print(f"\nSearching for: {dish}")
-                recipe_info = self.search_wiki_page(dish, cuisine_type)
+        def scraped_recipes():
+            for cuisine_type, dishes in dishes_by_cuisine.items():
+                print(f"\nProcessing {cuisine_type}...")
                 
-                if recipe_info:
-                    # Store in database
-                    content = (
-                        f"Title: {recipe_info['title']}\n"
-                        f"Chinese Name: {recipe_info['chinese_name']}\n"
-                        f"English Name: {recipe_info['english_name']}\n"
-                        f"Cuisine Type: {recipe_info['cuisine_type']}\n\n"
-                        f"{recipe_info['summary']}"
-                    )
+                for dish in dishes:
+                    print(f"\nSearching for: {dish}")
+                    recipes = self.scrape_dish(dish, cuisine_type)
                     
-                    metadata = {
-                        'dish_name': dish,
-                        'english_name': recipe_info['english_name'],
-                        'cuisine_type': cuisine_type,
-                        'source_url': recipe_info['url']
-                    }
+                    if recipes:
+                        yield from recipes
+                        counts['processed'] += 1
+                    else:
+                        counts['failed'] += 1
+                        print(f"✗ Failed to find information for {dish}")
                     
-                    self.db.add_recipe(content=content, metadata=metadata, source='wikipedia')
-                    total_processed += 1
-                    print(f"✓ Successfully stored {dish} ({recipe_info['english_name']})")
-                else:
-                    total_failed += 1
-                    print(f"✗ Failed to find information for {dish}")
-                
-                # Be nice to Wikipedia's servers
-                time.sleep(1)
+                    # Be nice to Wikipedia's servers
+                    self.http.pause(1)
+        
+        # Recipes are stored in chunks as they are scraped
+        self.db.add_recipes(scraped_recipes(), batch_size=batch_size)
+        total_processed = counts['processed']
+        total_failed = counts['failed']
         
         print(f"\nProcessing complete!")
         print(f"Successfully processed: {total_processed}")
         print(f"Failed to process: {total_failed}")
         
-        # Print database stats
+        self.print_database_stats()
+
+    def scrape_queue(self, queue: WorkQueue, engine: Optional[AsyncScraper] = None):
+        """Scrape the dishes of a work queue until it has nothing left for this
+        process. A dish is done once its recipes are in the database, so an
+        interrupted run resumes where it stopped, and several processes can
+        share the queue."""
+        def store(item: WorkItem, recipes: List[Dict]):
+            if not recipes:
+                raise NothingScraped(f"No Wikipedia page found for {item.dish}")
+            self.db.add_recipes(recipes)
+        
+        if engine is None:
+            process_queue(queue,
+                          lambda item: store(item, self.scrape_dish(item.dish, item.cuisine_type)),
+                          pause=lambda: self.http.pause(1))
+        else:
+            process_queue_async(queue, engine,
+                                lambda item, fetch: self.scrape_dish_async(item.dish, item.cuisine_type, fetch),
+                                store)
+        queue.print_summary()
+        self.print_database_stats()
+    
+    def print_database_stats(self):
         stats = self.db.get_collection_stats()
         print(f"\nDatabase stats:")
-        print(f"Total recipes in database: {stats['total_recipes']}")
\ No newline at end of file
+        print(f"Total recipes in database: {stats['total_recipes']}")
+        self.http.print_stats()
+        if 'embedding_cache' in stats:
+            cache = stats['embedding_cache']
+            print(f"Embedding cache: {cache['hits']} hits, {cache['misses']} misses "
+                  f"({cache['hit_rate']:.1%} hit rate)")
@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import psutil
+except ImportError:  # liveness falls back to os.kill(pid, 0) outside Windows
+    psutil = None
+
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrape_queue.sqlite")
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_LEASE_SECONDS = 900.0
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+WorkItem = namedtuple("WorkItem", ["cuisine_type", "dish", "attempts", "worker"])
+
+
+class NothingScraped(Exception):
+    """Raised by a handler when a dish yields nothing, so it is retried"""
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+def _worker_is_dead(worker: str) -> bool:
+    """Whether a worker id names a process of this host that no longer runs
+    (a recycled pid makes it look alive, leaving its dishes to the lease)"""
+    host, _, rest = (worker or "").partition(":")
+    pid = rest.partition(":")[0]
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    if psutil is not None:
+        return not psutil.pid_exists(int(pid))
+    if os.name == "nt":
+        return False  # os.kill would terminate the process; leave it to the lease
+    try:
+        os.kill(int(pid), 0)  # signal 0 only checks that the process exists
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class WorkQueue:
+    """Durable per-dish work queue of a scraper, in SQLite.
+
+    Each dish is pending, in_flight, done or failed, with its attempts and
+    last error. claim() takes the first claimable dish in enqueue order
+    inside an IMMEDIATE transaction, so several processes can share a
+    queue. A claim is a lease: an in_flight dish whose worker died is
+    claimable again once lease_seconds have passed, or right away via
+    release_dead_workers() when the worker ran on this host. Only the worker
+    holding a dish can complete, fail or release it. A failed dish is
+    retried after backoff * 2^(attempts - 1) seconds, at most max_backoff,
+    until it has had max_attempts attempts. Re-running a scraper therefore
+    continues where it stopped; reset() starts over.
+    """
+
+    def __init__(self,
+                 name: str,
+                 path: str = DEFAULT_QUEUE_PATH,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 backoff: float = 30.0,
+                 max_backoff: float = 600.0,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        self.name = name
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        # sqlite3 connections are per thread (AsyncScraper stores in its own thread)
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS items (
+                                queue TEXT NOT NULL,
+                                dish TEXT NOT NULL,
+                                cuisine_type TEXT NOT NULL,
+                                state TEXT NOT NULL,
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                last_error TEXT,
+                                not_before REAL NOT NULL DEFAULT 0,
+                                lease_until REAL,
+                                worker TEXT,
+                                updated_at REAL NOT NULL,
+                                PRIMARY KEY (queue, dish))""")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction, taking the database lock up front"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def enqueue(self, jobs: Iterable[Tuple[str, str]]) -> int:
+        """Add (cuisine_type, dish) jobs not already queued; returns how many were new"""
+        now = time.time()
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO items (queue, dish, cuisine_type, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(self.name, dish, cuisine_type, PENDING, now) for cuisine_type, dish in jobs])
+            return conn.total_changes - before
+
+    def reset(self):
+        """Forget every dish of this queue"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM items WHERE queue = ?", (self.name,))
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM items WHERE queue = ?", (self.name,)).fetchone()[0]
+
+    def claim(self, worker: str) -> Optional[WorkItem]:
+        """Atomically take the next claimable dish, None if there is none right now"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                """SELECT dish, cuisine_type, attempts FROM items
+                   WHERE queue = ? AND (
+                       state = ?
+                       OR (state = ? AND attempts < ? AND not_before <= ?)
+                       OR (state = ? AND lease_until < ?))
+                   ORDER BY rowid LIMIT 1""",
+                (self.name, PENDING, FAILED, self.max_attempts, now, IN_FLIGHT, now)).fetchone()
+            if row is None:
+                return None
+            dish, cuisine_type, attempts = row
+            conn.execute(
+                """UPDATE items SET state = ?, attempts = attempts + 1, lease_until = ?, worker = ?, updated_at = ?
+                   WHERE queue = ? AND dish = ?""",
+                (IN_FLIGHT, now + self.lease_seconds, worker, now, self.name, dish))
+        return WorkItem(cuisine_type, dish, attempts + 1, worker)
+
+    def claimed(self, worker: str) -> Iterator[WorkItem]:
+        """Claim dishes one at a time until none is claimable right now"""
+        while True:
+            item = self.claim(worker)
+            if item is None:
+                return
+            yield item
+
+    def _finish(self, item: WorkItem, state: str, error: Optional[str], not_before: float) -> bool:
+        """Record the outcome of a claim; False (and nothing changed) if the
+        lease expired and another worker took the dish over"""
+        with self._transaction() as conn:
+            updated = conn.execute(
+                """UPDATE items SET state = ?, last_error = ?, not_before = ?, lease_until = NULL,
+                                    worker = NULL, updated_at = ?
+                   WHERE queue = ? AND dish = ? AND state = ? AND worker = ?""",
+                (state, error, not_before, time.time(), self.name, item.dish, IN_FLIGHT, item.worker)).rowcount
+        if not updated:
+            print(f"✗ {item.dish}: lease lost to another worker, its result is left to that worker")
+        return bool(updated)
+
+    def complete(self, item: WorkItem) -> bool:
+        return self._finish(item, DONE, None, 0)
+
+    def fail(self, item: WorkItem, error) -> bool:
+        """Record a failed attempt; the dish is retried after a capped backoff"""
+        delay = min(self.max_backoff, self.backoff * 2 ** (item.attempts - 1))
+        return self._finish(item, FAILED,
+                            f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error),
+                            time.time() + delay)
+
+    def release(self, item: WorkItem):
+        """Put back a dish whose attempt was interrupted, without counting it"""
+        with self._transaction() as conn:
+            conn.execute(
+                """UPDATE items SET state = ?, attempts = MAX(attempts - 1, 0), lease_until = NULL, worker = NULL,
+                                    updated_at = ?
+                   WHERE queue = ? AND dish = ? AND state = ? AND worker = ?""",
+                (PENDING, time.time(), self.name, item.dish, IN_FLIGHT, item.worker))
+
+    def release_in_flight(self, worker: Optional[str] = None) -> int:
+        """Put back the in_flight dishes of a worker (of every worker if None),
+        e.g. after a crash when no other process is using the queue"""
+        query = """UPDATE items SET state = ?, attempts = MAX(attempts - 1, 0), lease_until = NULL, worker = NULL,
+                                    updated_at = ?
+                   WHERE queue = ? AND state = ?"""
+        params = [PENDING, time.time(), self.name, IN_FLIGHT]
+        if worker is not None:
+            query += " AND worker = ?"
+            params.append(worker)
+        with self._transaction() as conn:
+            return conn.execute(query, params).rowcount
+
+    def release_dead_workers(self) -> int:
+        """Put back the in_flight dishes of workers of this host whose process
+        has exited (e.g. killed), instead of waiting out their lease"""
+        workers = [row[0] for row in self._conn().execute(
+            "SELECT DISTINCT worker FROM items WHERE queue = ? AND state = ?", (self.name, IN_FLIGHT))]
+        return sum(self.release_in_flight(worker) for worker in workers if _worker_is_dead(worker))
+
+    def counts(self) -> Dict[str, int]:
+        """Number of dishes per state; 'retryable' of the failed ones will be retried"""
+        counts = {PENDING: 0, IN_FLIGHT: 0, DONE: 0, FAILED: 0}
+        for state, n in self._conn().execute(
+                "SELECT state, COUNT(*) FROM items WHERE queue = ? GROUP BY state", (self.name,)):
+            counts[state] = n
+        counts["retryable"] = self._conn().execute(
+            "SELECT COUNT(*) FROM items WHERE queue = ? AND state = ? AND attempts < ?",
+            (self.name, FAILED, self.max_attempts)).fetchone()[0]
+        return counts
+
+    def wait_time(self) -> Optional[float]:
+        """Seconds until a dish can be claimed, None if this process has nothing
+        left to wait for (dishes in flight elsewhere are left to their workers)"""
+        now = time.time()
+        conn = self._conn()
+        if conn.execute(
+                """SELECT 1 FROM items WHERE queue = ? AND (state = ? OR (state = ? AND lease_until < ?)) LIMIT 1""",
+                (self.name, PENDING, IN_FLIGHT, now)).fetchone():
+            return 0.0
+        row = conn.execute("SELECT MIN(not_before) FROM items WHERE queue = ? AND state = ? AND attempts < ?",
+                           (self.name, FAILED, self.max_attempts)).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - now)
+
+    def is_drained(self) -> bool:
+        """Nothing pending, in flight or to be retried"""
+        counts = self.counts()
+        return counts[PENDING] == 0 and counts[IN_FLIGHT] == 0 and counts["retryable"] == 0
+
+    def failures(self) -> List[Tuple[str, str, int, str]]:
+        """(cuisine_type, dish, attempts, last_error) of dishes that ran out of attempts"""
+        return self._conn().execute(
+            """SELECT cuisine_type, dish, attempts, last_error FROM items
+               WHERE queue = ? AND state = ? AND attempts >= ? ORDER BY rowid""",
+            (self.name, FAILED, self.max_attempts)).fetchall()
+
+    def print_summary(self):
+        counts = self.counts()
+        print(f"\nWork queue '{self.name}': {counts[DONE]} done, {counts[PENDING]} pending, "
+              f"{counts[IN_FLIGHT]} in flight, {counts[FAILED]} failed ({counts['retryable']} to retry)")
+        for cuisine_type, dish, attempts, error in self.failures():
+            print(f"- {dish} ({cuisine_type}) after {attempts} attempts: {error}")
+
+
+def process_queue(queue: WorkQueue,
+                  handle: Callable[[WorkItem], None],
+                  pause: Optional[Callable[[], None]] = None,
+                  worker: Optional[str] = None):
+    """Serially claim and handle dishes until the queue has nothing left for
+    this process, waiting out retry backoffs. handle raises to fail a dish.
+    On Ctrl-C the current dish is put back before re-raising."""
+    worker = worker or new_worker_id()
+    while True:
+        item = queue.claim(worker)
+        if item is None:
+            wait = queue.wait_time()
+            if wait is None:
+                return
+            print(f"Waiting {wait:.0f}s to retry failed dishes...")
+            time.sleep(wait)
+            continue
+        print(f"\n[{item.cuisine_type}] {item.dish} (attempt {item.attempts})")
+        try:
+            handle(item)
+        except KeyboardInterrupt:
+            queue.release(item)
+            raise
+        except Exception as e:
+            queue.fail(item, e)
+            print(f"✗ {item.dish}: {type(e).__name__}: {e}")
+        else:
+            queue.complete(item)
+        if pause is not None:
+            pause()
+
+def process_queue_async(queue: WorkQueue,
+                        engine,
+                        scrape: Callable,
+                        store: Callable[[WorkItem, object], None],
+                        worker: Optional[str] = None):
+    """process_queue on an AsyncScraper: its workers claim dishes, scrape(item,
+    fetch) them and store(item, result) them; a dish is done once stored.
+    Rounds repeat until nothing is left, waiting out retry backoffs. On
+    Ctrl-C the dishes this process holds are put back."""
+    worker = worker or new_worker_id()
+
+    def store_and_complete(item: WorkItem, result):
+        store(item, result)
+        queue.complete(item)
+
+    try:
+        while True:
+            stats = engine.run(queue.claimed(worker), scrape, store_and_complete, fail=queue.fail)
+            if stats["jobs"]:
+                print(f"Round: {stats['succeeded']}/{stats['jobs']} dishes in {stats['seconds']:.1f}s "
+                      f"({stats['requests']} requests, {stats['cached']} cached, {stats['retries']} retries)")
+            wait = queue.wait_time()
+            if wait is None:
+                return
+            if wait > 0:
+                print(f"Waiting {wait:.0f}s to retry failed dishes...")
+                time.sleep(wait)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        queue.release_in_flight(worker)
+        raise
+
+
+def add_queue_args(parser: argparse.ArgumentParser):
+    """Work queue flags of the scraper scripts"""
+    parser.add_argument("--queue_path", default=DEFAULT_QUEUE_PATH,
+                        help="SQLite work queue; re-running continues where the last run stopped")
+    parser.add_argument("--reset_queue", action="store_true", help="Start over from the first dish")
+    parser.add_argument("--release_in_flight", action="store_true",
+                        help="Put back dishes left in flight by a crashed run (only if no other process uses the queue)")
+    parser.add_argument("--max_attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+
+def queue_from_args(args: argparse.Namespace, name: str, jobs: Iterable[Tuple[str, str]]) -> Tuple[WorkQueue, bool]:
+    """The scraper's work queue with the jobs added, and whether it resumes an
+    earlier run. A queue the last run drained is started over."""
+    jobs = list(jobs)
+    queue = WorkQueue(name, args.queue_path, max_attempts=args.max_attempts)
+    if args.reset_queue:
+        queue.reset()
+    if args.release_in_flight:
+        print(f"Released {queue.release_in_flight()} in-flight dishes")
+    released = queue.release_dead_workers()
+    if released:
+        print(f"Released {released} dishes left in flight by exited workers")
+    resumed = len(queue) > 0
+    added = queue.enqueue(jobs)
+    if resumed and queue.is_drained():
+        counts = queue.counts()
+        print(f"Work queue '{name}' was finished by an earlier run ({counts[DONE]} done, "
+              f"{counts[FAILED]} failed); starting over")
+        queue.reset()
+        queue.enqueue(jobs)
+        resumed = False
+    if resumed:
+        counts = queue.counts()
+        print(f"Resuming work queue '{name}': {counts[DONE]} dishes done, {counts[PENDING]} pending "
+              f"({added} new), {counts['retryable']} to retry")
+    return queue, resumed
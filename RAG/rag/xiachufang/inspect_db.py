@@ -1,10 +1,10 @@
-from recipe_db import LocalRecipeDB
+from recipe_db import get_recipe_db
 import json
 from typing import Dict, List
 
 class ChromaInspector:
-    def __init__(self):
-        self.db = LocalRecipeDB()
+    def __init__(self, persist_dir: str = "./recipe_db"):
+        self.db = get_recipe_db(persist_dir)
     
     def get_all_entries(self) -> List[Dict]:
         """Retrieve all entries from the database"""
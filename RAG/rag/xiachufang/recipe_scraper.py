@@ -1,14 +1,59 @@
 import requests
 from bs4 import BeautifulSoup
 from typing import Dict, Optional, List
-from recipe_db import LocalRecipeDB
-import time
+from recipe_db import get_recipe_db
+from incremental_refresh import DEFAULT_TTL_DAYS, refresh_recipe_db
+from work_queue import NothingScraped, WorkItem, WorkQueue, process_queue, process_queue_async
+from async_scraper import AsyncScraper, add_engine_args, engine_from_args, dish_jobs
+from http_cache import HttpCache, add_cache_args, cache_from_args, get_http_cache
+from work_queue import add_queue_args, queue_from_args
+from html_extract import DEFAULT_HTML_BACKEND, HTML_BACKENDS, TextSpans, parse_html
+import asyncio
+import argparse
 import random
 import logging
 from urllib.parse import quote
 
+def extract_page_text(html: str, backend: str = DEFAULT_HTML_BACKEND) -> str:
+    """Text of every heading, paragraph, div and list item of a page, deduplicated.
+    See html_extract.py for the backends; "bs4" is the original extraction."""
+    soup = parse_html(html, backend)
+    
+    # Extract all text nodes while preserving structure
+    content_parts = []
+    
+    if backend == 'bs4':
+        # Helper function to extract text from elements
+        def extract_text(element):
+            if element.string and element.string.strip():
+                return element.string.strip()
+            return ' '.join(text.strip() for text in element.stripped_strings)
+    else:
+        # Nested divs share text, so it is indexed once instead of per element
+        spans = TextSpans(soup, strip=True)
+        
+        def extract_text(element):
+            if element.string and element.string.strip():
+                return element.string.strip()
+            return spans.join(element)
+    
+    # Get all elements that might contain recipe content
+    for element in soup.find_all(['h1', 'h2', 'h3', 'p', 'div', 'li']):
+        text = extract_text(element)
+        if text and len(text) > 1:  # Ignore single characters
+            content_parts.append(text)
+    
+    # Remove duplicates while preserving order
+    seen = set()
+    content_parts = [x for x in content_parts if x not in seen and not seen.add(x)]
+    
+    # Join with newlines
+    return '\n'.join(content_parts)
+
 class XiachufangScraper:
-    def __init__(self):
+    def __init__(self, http: Optional[HttpCache] = None, html_backend: str = DEFAULT_HTML_BACKEND):
+        self.http = http or get_http_cache()
+        self.html_backend = html_backend
         self.base_url = "https://m.xiachufang.com"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -18,7 +63,7 @@ class XiachufangScraper:
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1'
         }
-        self.db = LocalRecipeDB()
+        self.db = get_recipe_db()
         self.setup_logging()
 
     def setup_logging(self):
@@ -32,99 +77,86 @@ class XiachufangScraper:
         """Extract all text content from a recipe page."""
         try:
             # Add longer timeout and verify=False for testing
-            response = requests.get(url, headers=self.headers, timeout=20, verify=False)
+            response = self.http.get(url, headers=self.headers, timeout=20, verify=False)
             response.raise_for_status()
             
             # Save HTML content for debugging
             with open('last_recipe_page.html', 'w', encoding='utf-8') as f:
                 f.write(response.text)
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract all text nodes while preserving structure
-            content_parts = []
-            
-            # Helper function to extract text from elements
-            def extract_text(element):
-                if element.string and element.string.strip():
-                    return element.string.strip()
-                return ' '.join(text.strip() for text in element.stripped_strings)
-            
-            # Get all elements that might contain recipe content
-            for element in soup.find_all(['h1', 'h2', 'h3', 'p', 'div', 'li']):
-                text = extract_text(element)
-                if text and len(text) > 1:  # Ignore single characters
-                    content_parts.append(text)
-            
-            # Remove duplicates while preserving order
-            seen = set()
-            content_parts = [x for x in content_parts if x not in seen and not seen.add(x)]
-            
-            # Join with newlines
-            content = '\n'.join(content_parts)
-            
-            # Log the extracted content
-            logging.info(f"Extracted content length: {len(content)}")
-            logging.debug(f"Extracted content: {content[:500]}...")
-            
-            return content if len(content) > 20 else None  # Only return if we have substantial content
+            return self.parse_recipe_content(response.text)
             
         except Exception as e:
             logging.error(f"Error extracting recipe content from {url}: {str(e)}")
             return None
 
+    def parse_recipe_content(self, html: str) -> Optional[str]:
+        """All text content of a recipe page, None if there is too little"""
+        content = extract_page_text(html, self.html_backend)
+        
+        # Log the extracted content
+        logging.info(f"Extracted content length: {len(content)}")
+        logging.debug(f"Extracted content: {content[:500]}...")
+        
+        return content if len(content) > 20 else None  # Only return if we have substantial content
+
+    def search_url(self, dish_name: str) -> str:
+        return f"{self.base_url}/search/?keyword={quote(dish_name)}&cat=1001"
+
+    def parse_search_links(self, html: str) -> List[str]:
+        """URLs of the top 3 recipes on a search page"""
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Try different selectors for recipe links
+        recipe_links = []
+        selectors = [
+            'a.recipe-96-horizon',
+            'div.recipe-item a',
+            'a[href*="/recipe/"]',
+            '.recipe-card a',
+            '.recipe-link'
+        ]
+        
+        for selector in selectors:
+            links = soup.select(selector)
+            logging.info(f"Selector '{selector}' found {len(links)} links")
+            recipe_links.extend(links)
+        
+        # Remove duplicates while preserving order
+        seen_urls = set()
+        unique_links = []
+        for link in recipe_links:
+            url = link.get('href', '')
+            if url and url not in seen_urls:
+                seen_urls.add(url)
+                unique_links.append(link)
+        
+        recipe_links = unique_links[:3]  # Take top 3
+        return [self.base_url + link['href'] if link['href'].startswith('/') else link['href']
+                for link in recipe_links]
+
     def search_recipe(self, dish_name: str) -> List[Dict]:
         """Search for a specific dish and return top 3 recipes."""
-        encoded_name = quote(dish_name)
-        search_url = f"{self.base_url}/search/?keyword={encoded_name}&cat=1001"
+        search_url = self.search_url(dish_name)
         
         try:
             logging.info(f"Searching for dish: {dish_name}")
             logging.info(f"Search URL: {search_url}")
             
             # Add longer timeout and verify=False for testing
-            response = requests.get(search_url, headers=self.headers, timeout=20, verify=False)
+            response = self.http.get(search_url, headers=self.headers, timeout=20, verify=False)
             response.raise_for_status()
             
             # Save search page HTML for debugging
             with open('last_search_page.html', 'w', encoding='utf-8') as f:
                 f.write(response.text)
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Try different selectors for recipe links
-            recipe_links = []
-            selectors = [
-                'a.recipe-96-horizon',
-                'div.recipe-item a',
-                'a[href*="/recipe/"]',
-                '.recipe-card a',
-                '.recipe-link'
-            ]
-            
-            for selector in selectors:
-                links = soup.select(selector)
-                logging.info(f"Selector '{selector}' found {len(links)} links")
-                recipe_links.extend(links)
-            
-            # Remove duplicates while preserving order
-            seen_urls = set()
-            unique_links = []
-            for link in recipe_links:
-                url = link.get('href', '')
-                if url and url not in seen_urls:
-                    seen_urls.add(url)
-                    unique_links.append(link)
-            
-            recipe_links = unique_links[:3]  # Take top 3
-            
             recipes = []
-            for link in recipe_links:
-                recipe_url = self.base_url + link['href'] if link['href'].startswith('/') else link['href']
+            for recipe_url in self.parse_search_links(response.text):
                 logging.info(f"Processing recipe URL: {recipe_url}")
                 
                 # Add longer delay
-                time.sleep(random.uniform(3, 5))
+                self.http.pause(random.uniform(3, 5))
                 
                 recipe_content = self.extract_recipe_content(recipe_url)
                 if recipe_content:
@@ -139,59 +171,147 @@ class XiachufangScraper:
             logging.error(f"Error searching for {dish_name}: {str(e)}")
             return []
 
-    def scrape_and_store_recipes(self, dishes_by_cuisine: Dict[str, List[str]]):
+    async def search_recipe_async(self, dish_name: str, fetch) -> List[Dict]:
+        """search_recipe with an AsyncScraper fetch; the recipe pages are
+        fetched concurrently, paced by the engine's rate limit"""
+        links = self.parse_search_links(await fetch(self.search_url(dish_name)))
+        pages = await asyncio.gather(*(fetch(url) for url in links), return_exceptions=True)
+        recipes = []
+        for url, html in zip(links, pages):
+            if isinstance(html, Exception):
+                logging.error(f"Error extracting recipe content from {url}: {str(html)}")
+                continue
+            content = self.parse_recipe_content(html)
+            if content:
+                recipes.append({'url': url, 'content': content})
+        return recipes
+
+    def scrape_dish(self, dish: str, cuisine_type: str) -> List[Dict]:
+        """Top recipes (add_recipes items) of one dish"""
+        return self.recipe_items(dish, cuisine_type, self.search_recipe(dish))
+
+    async def scrape_dish_async(self, dish: str, cuisine_type: str, fetch) -> List[Dict]:
+        """scrape_dish with an AsyncScraper fetch"""
+        return self.recipe_items(dish, cuisine_type, await self.search_recipe_async(dish, fetch))
+
+    def recipe_items(self, dish: str, cuisine_type: str, recipes: List[Dict]) -> List[Dict]:
+        items = []
+        for i, recipe in enumerate(recipes, 1):
+            if recipe['content']:
+                metadata = {
+                    'dish_name': dish,
+                    'cuisine_type': cuisine_type,
+                    'source_url': recipe['url'],
+                    'recipe_number': i
+                }
+                
+                items.append({'content': recipe['content'], 'metadata': metadata, 'source': 'xiachufang'})
+                print(f"✓ Scraped recipe {i} for {dish}")
+            else:
+                print(f"✗ Failed to extract content for recipe {i} of {dish}")
+        return items
+
+    def refresh_recipes(self,
+                        dishes_by_cuisine: Dict[str, List[str]],
+                        ttl_days: float = DEFAULT_TTL_DAYS,
+                        prune: bool = False,
+                        summary_path: Optional[str] = None) -> Dict:
+        """Scrape only dishes that are missing or older than ttl_days (see incremental_refresh.py)"""
+        return refresh_recipe_db(self.db, dishes_by_cuisine, self.scrape_dish, 'xiachufang',
+                                 ttl_days=ttl_days, prune=prune,
+                                 pause=lambda: self.http.pause(random.uniform(5, 8)),
+                                 summary_path=summary_path)
+
+    def scrape_and_store_recipes(self, dishes_by_cuisine: Dict[str, List[str]], batch_size: int = 32):
         """Scrape Xiachufang for each dish and store in the database"""
-        total_processed = 0
-        total_failed = 0
+        counts = {'processed': 0, 'failed': 0}
         
-        for cuisine_type, dishes in dishes_by_cuisine.items():
-            print(f"\nProcessing {cuisine_type}...")
-            
-            for dish in dishes:
-                print(f"\nSearching for: {dish}")
-                recipes = self.search_recipe(dish)
-                
-                for i, recipe in enumerate(recipes, 1):
-                    if recipe['content']:
-                        metadata = {
-                            'dish_name': dish,
-                            'cuisine_type': cuisine_type,
-                            'source_url': recipe['url'],
-                            'recipe_number': i
-                        }
-                        
-                        self.db.add_recipe(
-                            content=recipe['content'],
-                            metadata=metadata,
-                            source='xiachufang'
-                        )
-                        total_processed += 1
-                        print(f"✓ Successfully stored recipe {i} for {dish}")
-                    else:
-                        print(f"✗ Failed to extract content for recipe {i} of {dish}")
-                
-                if not recipes:
-                    total_failed += 1
-                    print(f"✗ Failed to find recipes for {dish}")
+        def scraped_recipes():
+            for cuisine_type, dishes in dishes_by_cuisine.items():
+                print(f"\nProcessing {cuisine_type}...")
                 
-                # Add longer delay between dishes
-                time.sleep(random.uniform(5, 8))
+                for dish in dishes:
+                    print(f"\nSearching for: {dish}")
+                    recipes = self.scrape_dish(dish, cuisine_type)
+                    yield from recipes
+                    counts['processed'] += len(recipes)
+                    
+                    if not recipes:
+                        counts['failed'] += 1
+                        print(f"✗ Failed to find recipes for {dish}")
+                    
+                    # Add longer delay between dishes
+                    self.http.pause(random.uniform(5, 8))
+        
+        # Recipes are stored in chunks as they are scraped
+        self.db.add_recipes(scraped_recipes(), batch_size=batch_size)
+        total_processed = counts['processed']
+        total_failed = counts['failed']
         
         print(f"\nProcessing complete!")
         print(f"Successfully processed: {total_processed}")
         print(f"Failed to process: {total_failed}")
         
+        self.print_database_stats()
+
+    def scrape_queue(self, queue: WorkQueue, engine: Optional[AsyncScraper] = None):
+        """Scrape the dishes of a work queue until it has nothing left for this
+        process. A dish is done once its recipes are in the database, so an
+        interrupted run resumes where it stopped, and several processes can
+        share the queue."""
+        def store(item: WorkItem, recipes: List[Dict]):
+            if not recipes:
+                raise NothingScraped(f"No Xiachufang recipes found for {item.dish}")
+            self.db.add_recipes(recipes)
+        
+        if engine is None:
+            process_queue(queue,
+                          lambda item: store(item, self.scrape_dish(item.dish, item.cuisine_type)),
+                          pause=lambda: self.http.pause(random.uniform(5, 8)))
+        else:
+            process_queue_async(queue, engine,
+                                lambda item, fetch: self.scrape_dish_async(item.dish, item.cuisine_type, fetch),
+                                store)
+        queue.print_summary()
+        self.print_database_stats()
+    
+    def print_database_stats(self):
         stats = self.db.get_collection_stats()
         print(f"\nDatabase stats:")
         print(f"Total recipes in database: {stats['total_recipes']}")
+        self.http.print_stats()
+        if 'embedding_cache' in stats:
+            cache = stats['embedding_cache']
+            print(f"Embedding cache: {cache['hits']} hits, {cache['misses']} misses "
+                  f"({cache['hit_rate']:.1%} hit rate)")
 
 def main():
+    parser = argparse.ArgumentParser(description="Scrape Xiachufang recipes of the dishes into the recipe DB")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only scrape dishes that are missing or older than --ttl_days")
+    parser.add_argument("--ttl_days", type=float, default=DEFAULT_TTL_DAYS)
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete stored dishes that are no longer in the dish list")
+    parser.add_argument("--summary", default="refresh_summary_xiachufang.json")
+    add_engine_args(parser, rate=0.25)
+    add_cache_args(parser)
+    parser.add_argument("--html_backend", choices=sorted(HTML_BACKENDS), default=DEFAULT_HTML_BACKEND)
+    add_queue_args(parser)
+    args = parser.parse_args()
+
     dishes_data = {
         "浙江菜": ["黄鱼烧年糕"]  # Test with one dish first
     }
     
-    scraper = XiachufangScraper()
-    scraper.scrape_and_store_recipes(dishes_data)
+    scraper = XiachufangScraper(http=cache_from_args(args), html_backend=args.html_backend)
+    if args.incremental:
+        scraper.refresh_recipes(dishes_data, ttl_days=args.ttl_days,
+                                prune=args.prune, summary_path=args.summary)
+        return
+    # aiohttp picks its own Accept-Encoding (brotli needs an extra package)
+    headers = {k: v for k, v in scraper.headers.items() if k != 'Accept-Encoding'}
+    queue, _ = queue_from_args(args, 'xiachufang', dish_jobs(dishes_data))
+    scraper.scrape_queue(queue, engine=engine_from_args(args, headers=headers, verify_ssl=False, cache=scraper.http))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file